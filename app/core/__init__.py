@@ -1,17 +1,24 @@
-from .scheduler import TaskScheduler
-from .shutdown_manager import shutdown_manager, get_shutdown_manager
-from .config import settings
-from .database import get_db, initialize_database, create_dev_engine, create_prod_engine
-from .lifespan import lifespan
+import importlib
 
-__all__ = [
-  'shutdown_manager',
-  'TaskScheduler', 
-  'get_shutdown_manager',
-  'settings',
-  'get_db',
-  'lifespan',
-  'initialize_database',
-  'create_dev_engine',
-  'create_prod_engine'
-  ]
\ No newline at end of file
+# Exports are resolved on first access so that importing a single submodule
+# (e.g. app.core.config) does not pull in the scheduler, the ORM and the routers.
+_EXPORTS = {
+  'shutdown_manager': 'app.core.shutdown_manager',
+  'TaskScheduler': 'app.core.scheduler',
+  'get_shutdown_manager': 'app.core.shutdown_manager',
+  'settings': 'app.core.config',
+  'get_db': 'app.core.database',
+  'lifespan': 'app.core.lifespan',
+  'initialize_database': 'app.core.database',
+  'create_dev_engine': 'app.core.database',
+  'create_prod_engine': 'app.core.database'
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+  if name not in _EXPORTS:
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+  value = getattr(importlib.import_module(_EXPORTS[name]), name)
+  globals()[name] = value
+  return value
@@ -0,0 +1,246 @@
+"""
+Cold storage for old images.
+
+The archiver packs images older than ARCHIVE_AFTER_HOURS into pack files
+of up to ARCHIVE_PACK_MAX_BYTES: each image is one zlib member (or stored
+raw when zlib does not shrink it) appended to the pack, and a JSON index
+next to it lists every member's offset and length. The ``Image`` row keeps
+the same pointer (``archive_key``, ``archive_offset``, ``archive_length``,
+``archive_codec``) and drops its inline base64 and its file, so reading an
+archived image is one ranged read of ``archive_length`` bytes.
+
+Packs are written through an ``ArchiveBackend``; only local disk exists
+today, an object store backend implements the same three methods with
+ranged GETs.
+"""
+import base64
+import datetime
+import json
+import os
+import uuid
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional
+import logging
+
+from app.core.config import settings
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+images_archived = counter("images_archived_total", "Images moved into archive packs")
+archive_bytes = counter("image_archive_bytes_total", "Bytes written to archive packs", ["kind"])
+
+CODEC_ZLIB = "zlib"
+CODEC_RAW = "raw"
+INDEX_SUFFIX = ".idx.json"
+
+
+class ArchiveBackend:
+    """Where pack files live"""
+
+    def put(self, key: str, local_path: str):
+        """Move a finished local file into the store under ``key``"""
+        raise NotImplementedError
+
+    def read_range(self, key: str, offset: int, length: int) -> bytes:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class LocalArchiveBackend(ArchiveBackend):
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        # keys are generated here, never taken from requests
+        return os.path.join(self.directory, os.path.basename(key))
+
+    def put(self, key: str, local_path: str):
+        os.makedirs(self.directory, exist_ok=True)
+        os.replace(local_path, self._path(key))
+
+    def read_range(self, key: str, offset: int, length: int) -> bytes:
+        with open(self._path(key), "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        if len(data) != length:
+            raise IOError(f"Archive {key} is truncated at offset {offset}")
+        return data
+
+    def delete(self, key: str):
+        path = self._path(key)
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def get_archive_backend() -> ArchiveBackend:
+    if settings.ARCHIVE_BACKEND != "local":
+        raise ValueError(f"Unsupported ARCHIVE_BACKEND '{settings.ARCHIVE_BACKEND}'")
+    return LocalArchiveBackend(settings.ARCHIVE_DIR)
+
+
+@dataclass
+class PackedImage:
+    id: int
+    task_id: Optional[str]
+    offset: int
+    length: int
+    size: int
+    codec: str
+    content_type: str
+
+
+def decode_image_data(image_data: str) -> bytes:
+    """Bytes of an inline image stored as base64 or a data URL"""
+    if image_data.startswith("data:"):
+        image_data = image_data.split(",", 1)[1]
+    return base64.b64decode(image_data)
+
+
+def encode_member(raw: bytes):
+    compressed = zlib.compress(raw, 6)
+    if len(compressed) < len(raw):
+        return compressed, CODEC_ZLIB
+    return raw, CODEC_RAW
+
+
+def decode_member(data: bytes, codec: str) -> bytes:
+    return zlib.decompress(data) if codec == CODEC_ZLIB else data
+
+
+class PackWriter:
+    """Appends images to a local pack file, then hands it to the backend"""
+
+    def __init__(self, staging_dir: str):
+        os.makedirs(staging_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        self.key = f"images-{stamp}-{uuid.uuid4().hex[:8]}.pack"
+        self.staging_dir = staging_dir
+        self._path = os.path.join(staging_dir, f"{self.key}.part")
+        self._file = open(self._path, "wb")
+        self.size = 0
+        self.entries: List[PackedImage] = []
+
+    def add(self, image_id: int, task_id: Optional[str], raw: bytes, content_type: Optional[str]) -> PackedImage:
+        member, codec = encode_member(raw)
+        self._file.write(member)
+        entry = PackedImage(image_id, task_id, self.size, len(member), len(raw), codec, content_type or "image/png")
+        self.entries.append(entry)
+        self.size += len(member)
+        archive_bytes.labels("raw").inc(len(raw))
+        archive_bytes.labels("packed").inc(len(member))
+        return entry
+
+    def finish(self, backend: ArchiveBackend):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        index_path = os.path.join(self.staging_dir, f"{self.key}{INDEX_SUFFIX}.part")
+        with open(index_path, "w") as f:
+            json.dump({"key": self.key, "images": [entry.__dict__ for entry in self.entries]}, f)
+        backend.put(f"{self.key}{INDEX_SUFFIX}", index_path)
+        backend.put(self.key, self._path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+
+def read_archived_image(key: str, offset: int, length: int, codec: str) -> bytes:
+    return decode_member(get_archive_backend().read_range(key, offset, length), codec)
+
+
+def archived_data_url(image_id: int, db) -> Optional[str]:
+    """An archived image as a data URL, for stream clients that expect the image inline"""
+    from app.events.db_events import get_image_location
+
+    image = get_image_location(image_id, db)
+    if image is None or not image.archive_key:
+        return None
+    raw = read_archived_image(image.archive_key, image.archive_offset, image.archive_length, image.archive_codec)
+    return f"data:{image.content_type or 'image/png'};base64,{base64.b64encode(raw).decode('ascii')}"
+
+
+def archive_images(cutoff: datetime.datetime, db) -> int:
+    """Pack images created before ``cutoff`` into one pack file; returns how many were archived.
+
+    Rows are pointed at the pack and their payloads dropped in one commit,
+    after the pack is stored; their files are deleted after that commit.
+    """
+    from sqlalchemy import or_, update
+    from app.core.image_store import image_store
+    from app.models.db_models import Image
+
+    candidates = (
+        db.query(Image.id, Image.task_id, Image.image_path, Image.content_type)
+        .filter(
+            Image.archive_key.is_(None),
+            Image.created_at < cutoff,
+            or_(Image.image_path.isnot(None), Image.image_data.isnot(None))
+        )
+        .order_by(Image.id)
+        .limit(settings.ARCHIVE_BATCH_SIZE)
+        .all()
+    )
+    if not candidates:
+        return 0
+
+    backend = get_archive_backend()
+    writer = PackWriter(os.path.join(settings.ARCHIVE_DIR, "staging"))
+    archived_files = []
+    try:
+        for image_id, task_id, image_path, content_type in candidates:
+            if image_path and image_store.exists(image_path):
+                with open(image_path, "rb") as f:
+                    raw = f.read()
+                archived_files.append(image_path)
+            else:
+                # one payload at a time, the LONGTEXT column is never loaded for the whole batch
+                image_data = db.query(Image.image_data).filter(Image.id == image_id).scalar()
+                if not image_data:
+                    continue
+                raw = decode_image_data(image_data)
+            writer.add(image_id, task_id, raw, content_type)
+            if writer.size >= settings.ARCHIVE_PACK_MAX_BYTES:
+                break
+
+        if not writer.entries:
+            writer.abort()
+            return 0
+        writer.finish(backend)
+    except Exception:
+        writer.abort()
+        raise
+
+    archived_at = datetime.datetime.now()
+    try:
+        db.execute(update(Image), [
+            {
+                "id": entry.id,
+                "archive_key": writer.key,
+                "archive_offset": entry.offset,
+                "archive_length": entry.length,
+                "archive_codec": entry.codec,
+                "archived_at": archived_at,
+                "image_data": None,
+                "image_path": None
+            }
+            for entry in writer.entries
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        backend.delete(writer.key)
+        backend.delete(f"{writer.key}{INDEX_SUFFIX}")
+        raise
+
+    for path in archived_files:
+        image_store.delete(path)
+    images_archived.inc(len(writer.entries))
+    logger.info(f"🧊 Archived {len(writer.entries)} images into {writer.key} ({writer.size} bytes)")
+    return len(writer.entries)
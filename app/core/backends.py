@@ -0,0 +1,216 @@
+"""
+Pool of Space backends with latency-aware balancing.
+
+Each /generate picks the available backend with the lowest
+``(in_flight + 1) * ewma_latency`` score, so idle backends win and, among
+equally busy ones, the faster one wins. A backend is unavailable while it is
+ejected (failed health checks) or its circuit breaker is open. Tasks stay
+pinned to the backend they were submitted to via ``Task.backend_url``.
+"""
+import asyncio
+from collections import OrderedDict
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+import logging
+
+from app.core.config import settings
+from app.core.metrics import gauge
+from app.core.resilience import OPEN, get_breaker
+from app.schemas.errors import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+in_flight_gauge = gauge("space_backend_in_flight", "Generations in flight per backend", ["backend"])
+latency_gauge = gauge("space_backend_latency_ewma_seconds", "EWMA latency per backend", ["backend"])
+ejected_gauge = gauge("space_backend_ejected", "1 while a backend is ejected from rotation", ["backend"])
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        self.ewma_latency: Optional[float] = None
+        self.health_failures = 0
+        self.ejected_until = 0.0
+        self.recent_models: "OrderedDict[str, float]" = OrderedDict()
+
+    @property
+    def ejected(self) -> bool:
+        return time.monotonic() < self.ejected_until
+
+    @property
+    def available(self) -> bool:
+        return not self.ejected and get_breaker(self.url).state != OPEN
+
+    @property
+    def has_slot(self) -> bool:
+        return self.in_flight < settings.BACKEND_MAX_IN_FLIGHT
+
+    def is_warm(self, model: Optional[str]) -> bool:
+        return model in self.recent_models
+
+    def mark_model(self, model: Optional[str]):
+        """Remember ``model`` as loaded, evicting the least recently served beyond BACKEND_WARM_MODELS"""
+        self.recent_models[model] = time.monotonic()
+        self.recent_models.move_to_end(model)
+        while len(self.recent_models) > settings.BACKEND_WARM_MODELS:
+            self.recent_models.popitem(last=False)
+
+    def score(self, default_latency: float) -> float:
+        latency = self.ewma_latency if self.ewma_latency is not None else default_latency
+        return (self.in_flight + 1) * latency
+
+    def as_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "ewma_latency": round(self.ewma_latency, 4) if self.ewma_latency is not None else None,
+            "ejected": self.ejected,
+            "circuit": get_breaker(self.url).state,
+            "warm_models": list(self.recent_models)
+        }
+
+
+class BackendPool:
+    def __init__(self, urls: List[str]):
+        self.backends: Dict[str, Backend] = {}
+        for url in urls:
+            backend = Backend(url)
+            self.backends[backend.url] = backend
+        self._assignments: Dict[str, tuple] = {}
+        self._release_listeners: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def get(self, url: Optional[str]) -> Backend:
+        """Backend a task is pinned to; tasks from before the pool fall back to the default Space"""
+        url = (url or settings.HF_SPACE_URL).rstrip("/")
+        with self._lock:
+            if url not in self.backends:
+                # pinned to a backend that was removed from the config: keep it reachable, out of rotation
+                return Backend(url)
+            return self.backends[url]
+
+    def choose(self) -> Backend:
+        with self._lock:
+            self._expire_assignments()
+            candidates = [b for b in self.backends.values() if b.available]
+        if not candidates:
+            raise CircuitOpenError("No healthy Space backend available", retry_after=settings.SPACE_BREAKER_RESET_TIMEOUT)
+        return self.best(candidates)
+
+    def free_backends(self) -> List[Backend]:
+        """Available backends with a free generation slot in this worker"""
+        with self._lock:
+            self._expire_assignments()
+            return [b for b in self.backends.values() if b.available and b.has_slot]
+
+    def has_available(self) -> bool:
+        return any(b.available for b in self.backends.values())
+
+    def best(self, candidates: List[Backend]) -> Backend:
+        known = [b.ewma_latency for b in candidates if b.ewma_latency is not None]
+        default_latency = min(known) if known else 1.0
+        return min(candidates, key=lambda b: b.score(default_latency))
+
+    def backend_of(self, task_id: str) -> Optional[Backend]:
+        assignment = self._assignments.get(task_id)
+        return assignment[0] if assignment else None
+
+    def add_release_listener(self, listener: Callable[[], None]):
+        self._release_listeners.append(listener)
+
+    def assign(self, task_id: str, backend: Backend):
+        with self._lock:
+            if task_id in self._assignments:
+                return
+            self._assignments[task_id] = (backend, time.monotonic())
+            backend.in_flight += 1
+        in_flight_gauge.labels(backend.url).set(backend.in_flight)
+
+    def release(self, task_id: str):
+        with self._lock:
+            assignment = self._assignments.pop(task_id, None)
+            if assignment is None:
+                return
+            backend, _ = assignment
+            backend.in_flight = max(backend.in_flight - 1, 0)
+        in_flight_gauge.labels(backend.url).set(backend.in_flight)
+        for listener in self._release_listeners:
+            listener()
+
+    def _expire_assignments(self):
+        """Drop assignments whose completion was never seen by this worker"""
+        cutoff = time.monotonic() - settings.BACKEND_ASSIGNMENT_TTL
+        for task_id, (backend, assigned_at) in list(self._assignments.items()):
+            if assigned_at < cutoff:
+                del self._assignments[task_id]
+                backend.in_flight = max(backend.in_flight - 1, 0)
+
+    def record_latency(self, backend: Backend, seconds: float):
+        alpha = settings.BACKEND_EWMA_ALPHA
+        with self._lock:
+            if backend.ewma_latency is None:
+                backend.ewma_latency = seconds
+            else:
+                backend.ewma_latency = alpha * seconds + (1 - alpha) * backend.ewma_latency
+        latency_gauge.labels(backend.url).set(backend.ewma_latency)
+
+    def record_health(self, backend: Backend, healthy: bool):
+        with self._lock:
+            if healthy:
+                was_ejected = backend.ejected_until > 0
+                backend.health_failures = 0
+                backend.ejected_until = 0.0
+            else:
+                was_ejected = False
+                backend.health_failures += 1
+                if backend.health_failures >= settings.BACKEND_EJECT_AFTER_FAILURES:
+                    backend.ejected_until = time.monotonic() + settings.BACKEND_EJECT_SECONDS
+
+        if healthy and was_ejected:
+            logger.info(f"✅ Backend {backend.url} back in rotation")
+        elif not healthy and backend.ejected:
+            logger.warning(f"⚠️ Backend {backend.url} ejected after {backend.health_failures} failed health checks")
+        ejected_gauge.labels(backend.url).set(1 if backend.ejected else 0)
+
+    def snapshot(self) -> list:
+        return [backend.as_dict() for backend in self.backends.values()]
+
+    async def check_health(self):
+        """Probe every backend's /health once, ejecting or reinstating it"""
+        from app.core.http_client import get_upstream_session, space_headers
+        from app.core.resilience import call_space_async
+
+        session = get_upstream_session()
+
+        async def probe(backend: Backend):
+            started = time.monotonic()
+            try:
+                response = await call_space_async(
+                    "health",
+                    lambda: session.get(f"{backend.url}/health", headers=space_headers(), timeout=settings.SPACE_HEALTH_TIMEOUT),
+                    idempotent=False,
+                    breaker=backend.url
+                )
+                async with response:
+                    healthy = response.status == 200
+            except Exception as e:
+                logger.debug(f"Health check failed for {backend.url}: {e}")
+                healthy = False
+            if healthy:
+                self.record_latency(backend, time.monotonic() - started)
+            self.record_health(backend, healthy)
+
+        await asyncio.gather(*(probe(b) for b in list(self.backends.values())))
+
+    async def run_health_checks(self):
+        while True:
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"❌ Backend health check round failed: {e}")
+            await asyncio.sleep(settings.BACKEND_HEALTH_INTERVAL)
+
+
+backend_pool = BackendPool(settings.space_urls)
@@ -1,8 +1,11 @@
 import os
+from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 from typing import Optional, List
 from pydantic import Field, validator, computed_field
 
+load_dotenv()
+
 
 class Settings(BaseSettings):
     # ===== Application Settings =====
@@ -60,9 +63,18 @@ class Settings(BaseSettings):
         else:
             return os.getenv("DB_DRIVER", "ODBC Driver 17 for SQL Server")
     
+    DB_AUTO_MIGRATE: bool = Field(
+        default=False,
+        description="Apply pending migrations on startup instead of only checking the schema revision"
+    )
+    
     # ===== API Keys =====
     HF_TOKEN: str = os.getenv("HF_TOKEN", "")
     HF_SPACE_URL: str = os.getenv("HF_SPACE_URL", "https://microieva-generator.hf.space")
+    HF_SPACE_URLS: str = Field(
+        default="",
+        description="Comma-separated generation backends; defaults to HF_SPACE_URL"
+    )
     
     GROQ_API_KEY: Optional[str] = Field(
         default=None, 
@@ -141,9 +153,124 @@ class Settings(BaseSettings):
     RATE_LIMIT_WINDOW: int = Field(default=60, description="Rate limit window in seconds")
 
     REQUEST_TIMEOUT: int = Field(default=300, description="Timeout for external API requests in seconds")
+
+    # ===== Space Resilience =====
+    SPACE_HEALTH_TIMEOUT: int = Field(default=10, description="Timeout for Space health checks in seconds")
+    SPACE_RETRY_ATTEMPTS: int = Field(default=3, description="Attempts for idempotent Space calls")
+    SPACE_RETRY_BACKOFF_BASE: float = Field(default=0.5, description="Base of the jittered exponential backoff in seconds")
+    SPACE_RETRY_BACKOFF_MAX: float = Field(default=5.0, description="Max backoff between retries in seconds")
+    SPACE_BREAKER_FAILURE_THRESHOLD: int = Field(default=5, description="Consecutive failures that open the circuit")
+    SPACE_BREAKER_RESET_TIMEOUT: float = Field(default=30.0, description="Seconds the circuit stays open before a probe")
+
+    # ===== Backend Pool =====
+    BACKEND_HEALTH_INTERVAL: float = Field(default=15.0, description="Seconds between backend health checks")
+    BACKEND_EJECT_AFTER_FAILURES: int = Field(default=2, description="Failed health checks before a backend is ejected")
+    BACKEND_EJECT_SECONDS: float = Field(default=60.0, description="Seconds an ejected backend stays out of rotation")
+    BACKEND_EWMA_ALPHA: float = Field(default=0.3, description="Weight of the newest sample in the backend latency EWMA")
+    BACKEND_MAX_IN_FLIGHT: int = Field(default=2, description="Generations a worker keeps in flight per backend; the rest wait in the dispatch queue")
+    BACKEND_WARM_MODELS: int = Field(default=1, description="Most recently served models counted as loaded on a backend")
+    BACKEND_ASSIGNMENT_TTL: float = Field(default=3600.0, description="Seconds a task counts as in flight without a seen completion")
+
+    # ===== Dispatch Queue =====
+    DISPATCH_LOOKAHEAD: int = Field(default=8, description="Queued jobs scanned for one whose model is warm on a free backend")
+    DISPATCH_MAX_SKIPS: int = Field(default=4, description="Times the oldest queued job may be overtaken by same-model jobs")
+    DISPATCH_WAIT_TIMEOUT: float = Field(default=600.0, description="Seconds a stream waits for its queued task to be dispatched")
+    BATCH_MAX_SIZE: int = Field(default=16, description="Max generation requests accepted by one POST /generate/batch")
+
+    # ===== Stall Watchdog and Reaper =====
+    STREAM_IDLE_TIMEOUT: float = Field(default=120.0, description="Seconds without a message after which an upstream stream is aborted")
+    STREAM_WATCHDOG_INTERVAL: float = Field(default=10.0, description="Seconds between stall watchdog sweeps")
+    REAPER_INTERVAL: int = Field(default=60, description="Seconds between reaper runs over stale task rows")
+    TASK_PENDING_TTL: int = Field(default=900, description="Seconds after creation a task may stay pending before it is failed")
+    TASK_PROCESSING_TTL: int = Field(default=600, description="Seconds without a progress update a processing task may stay before it is failed")
+    REAPER_BATCH_SIZE: int = Field(default=500, description="Rows failed per UPDATE by the reaper")
+
+    # ===== Task History =====
+    TASK_HISTORY_INTERVAL: int = Field(default=60, description="Seconds between moves of finished tasks to tasks_history")
+    TASK_HISTORY_AFTER: int = Field(default=300, description="Seconds a finished task stays in tasks_active before it is moved")
+    TASK_HISTORY_BATCH_SIZE: int = Field(default=500, description="Tasks moved to tasks_history per transaction")
+
+    # ===== Task Statistics =====
+    STATS_BUCKET_SECONDS: int = Field(default=3600, description="Width of the /tasks/stats time buckets; must divide a day")
+    STATS_RETENTION_DAYS: int = Field(default=30, description="Days of task statistics buckets kept by the midnight cleanup")
+
+    # ===== Image Archive =====
+    ARCHIVE_ENABLED: bool = Field(default=True, description="Move old images into packed archive files")
+    ARCHIVE_BACKEND: str = Field(default="local", description="Where archive packs are stored; only local is supported")
+    ARCHIVE_DIR: str = Field(default="./data/archive", description="Directory of archive packs for the local backend")
+    ARCHIVE_AFTER_HOURS: int = Field(default=24, description="Age after which images are archived")
+    ARCHIVE_INTERVAL: int = Field(default=3600, description="Seconds between archiver runs")
+    ARCHIVE_BATCH_SIZE: int = Field(default=200, description="Max images packed into one archive file per pass")
+    ARCHIVE_PACK_MAX_BYTES: int = Field(default=64 * 1024 * 1024, description="Archive files are closed once they reach this size")
+
+    # ===== Image Search =====
+    SEARCH_BACKEND: str = Field(default="auto", description="Prompt search: mysql (FULLTEXT), sqlite (FTS5 sidecar) or auto by database")
+    SEARCH_INDEX_PATH: str = Field(default="./data/search/images.db", description="SQLite FTS5 sidecar of the sqlite search backend")
+
+    # ===== Similar Images =====
+    SIMILARITY_ENABLED: bool = Field(default=True, description="Compute a perceptual hash for every new image")
+    SIMILAR_MAX_DISTANCE: int = Field(default=10, description="Default Hamming distance (of 64 bits) for /images/{id}/similar")
+    DUPLICATE_MAX_DISTANCE: int = Field(default=4, description="Hamming distance under which a new image is recorded as a duplicate")
+    SIMILARITY_INDEX_TTL: int = Field(default=600, description="Seconds between full reloads of the in-memory hash index")
+    SIMILARITY_BACKFILL_INTERVAL: int = Field(default=300, description="Seconds between runs hashing images saved without a hash")
+    SIMILARITY_BACKFILL_BATCH: int = Field(default=200, description="Images read per query by the hash backfill")
+
+    # ===== Image Export =====
+    EXPORT_FETCH_SIZE: int = Field(default=32, description="Rows fetched per round trip from the server-side cursor of /images/export")
+    EXPORT_CHUNK_BYTES: int = Field(default=256 * 1024, description="/images/export output is sent in chunks of about this size")
+
+    # ===== Bulk Deletion =====
+    DELETE_BATCH_SIZE: int = Field(default=500, description="Tasks deleted per transaction by a deletion job")
+    DELETE_BATCH_PAUSE: float = Field(default=0.05, description="Seconds a deletion job waits between batches")
+    DELETE_JOB_INTERVAL: int = Field(default=30, description="Seconds between checks for deletion jobs to run")
+    DELETE_JOB_STALE_AFTER: int = Field(default=120, description="Seconds without progress after which a running deletion job is taken over")
+
+    # ===== Graceful Drain =====
+    DRAIN_TIMEOUT: float = Field(default=25.0, description="Seconds accepted work may run after SIGTERM before it is failed")
+    DRAIN_WEBHOOK_TIMEOUT: float = Field(default=5.0, description="Seconds spent delivering queued webhooks after the drain")
+
+    # ===== Webhooks =====
+    PUBLIC_BASE_URL: str = Field(default="http://localhost:8000", description="External base URL of this API, used for image links in webhook payloads")
+    WEBHOOK_SECRET: Optional[str] = Field(default=None, description="HMAC key for webhook signatures, defaults to SECRET_KEY")
+    WEBHOOK_CONCURRENCY: int = Field(default=4, description="Webhook deliveries in flight per worker")
+    WEBHOOK_QUEUE_SIZE: int = Field(default=1000, description="Pending webhook deliveries held in memory per worker")
+    WEBHOOK_MAX_ATTEMPTS: int = Field(default=5, description="Delivery attempts before a webhook is marked failed")
+    WEBHOOK_BACKOFF_MAX: float = Field(default=60.0, description="Max seconds between webhook delivery attempts")
+    WEBHOOK_TIMEOUT: float = Field(default=10.0, description="Seconds to wait for a webhook receiver")
+    WEBHOOK_ALLOW_PRIVATE_TARGETS: bool = Field(default=False, description="Deliver webhooks to loopback, private and link-local addresses (local development only)")
+    WEBHOOK_DELIVERIES_TOKEN: Optional[str] = Field(default=None, description="Token required in X-Webhooks-Token by /webhooks/deliveries; the route answers 403 without it")
+    WEBHOOK_STALE_AFTER: int = Field(default=900, description="Seconds after which a pending delivery abandoned by its worker is sent again")
+    WEBHOOK_REDELIVERY_INTERVAL: int = Field(default=300, description="Seconds between passes over abandoned webhook deliveries")
+
+    # ===== Query Instrumentation =====
+    DB_QUERY_STATS_ENABLED: bool = Field(default=True, description="Time SQL statements and count them per request and per task")
+    DB_SLOW_QUERY_THRESHOLD: float = Field(default=0.2, description="Seconds after which a statement is logged as slow")
+    DB_N_PLUS_ONE_THRESHOLD: int = Field(default=10, description="Repeats of one SELECT within a request that are logged as a possible N+1")
+
+    # ===== Event Loop Monitor =====
+    LOOP_LAG_INTERVAL: float = Field(default=0.25, description="Seconds between event loop lag measurements")
+    LOOP_BLOCK_THRESHOLD: float = Field(default=0.5, description="Seconds the event loop may be blocked before its stack is logged")
+
+    # ===== Profiling =====
+    PROFILING_ENABLED: bool = Field(default=False, description="Install /debug/profile and the per-request X-Profile-Token profiler")
+    PROFILING_TOKEN: Optional[str] = Field(default=None, description="Token required in X-Profile-Token; profiling stays off without it")
+    PROFILE_SAMPLE_INTERVAL: float = Field(default=0.005, description="Seconds between stack samples")
+    PROFILE_MAX_SECONDS: float = Field(default=60.0, description="Longest profile /debug/profile will take")
+
+    # ===== Upstream Connection Pool =====
+    UPSTREAM_POOL_SIZE: int = Field(default=100, description="Max pooled connections to the Space per worker")
+    UPSTREAM_DNS_CACHE_TTL: int = Field(default=300, description="Seconds resolved Space addresses are cached")
+    UPSTREAM_KEEPALIVE_TIMEOUT: int = Field(default=60, description="Seconds idle upstream connections are kept open")
+
+    # ===== Warm-up =====
+    WARMUP_DB_CONNECTIONS: int = Field(default=4, description="Pooled DB connections opened before the worker is ready")
+    WARMUP_UPSTREAM_CONNECTIONS: int = Field(default=2, description="Keep-alive Space connections opened before the worker is ready")
+    WARMUP_TIMEOUT: float = Field(default=30.0, description="Max seconds spent on each warm-up step")
     
     # ===== Logging Settings =====
-    LOG_LEVEL: str = Field(default="INFO", description="Logging level")
+    LOG_LEVEL: str = Field(default="INFO", description="Root logging level, optionally followed by per-module levels: INFO,app.events.ingestion=DEBUG")
+    LOG_FORMAT: str = Field(default="json", description="Log output format: json or console")
+    LOG_PROGRESS_SAMPLE_STEP: int = Field(default=10, description="Percent of progress between logged progress events of a task")
     LOG_FILE: str = Field(default="./data/logs/app.log", description="Log file path")
     
     # ===== Validation and computed properties =====
@@ -174,6 +301,12 @@ class Settings(BaseSettings):
             f"?driver={self.DB_DRIVER.replace(' ', '+')}"
         )
     
+    @property
+    def space_urls(self) -> List[str]:
+        """Configured generation backends, in order"""
+        urls = [url.strip().rstrip("/") for url in self.HF_SPACE_URLS.split(",") if url.strip()]
+        return urls or [self.HF_SPACE_URL.rstrip("/")]
+    
     @property
     def is_production(self) -> bool:
         """Check if running in production environment."""
@@ -0,0 +1,306 @@
+"""
+Local dispatch queue in front of the backend pool.
+
+/generate enqueues a job and returns; the dispatcher submits jobs to the
+Space as backends free up a slot. Switching a backend to another model costs
+a model load that dwarfs inference, so within the first DISPATCH_LOOKAHEAD
+jobs the dispatcher prefers one whose model is already warm on a free
+backend, grouping same-model jobs. The oldest job can be overtaken at most
+DISPATCH_MAX_SKIPS times before it is dispatched regardless.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from app.core.backends import Backend, BackendPool, backend_pool
+from app.core.config import settings
+from app.core.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+queue_length = gauge("dispatch_queue_length", "Jobs waiting in the local dispatch queue")
+model_switches = counter("space_model_switches_total", "Dispatches that needed a model load on the backend", ["backend"])
+model_load_seconds = histogram(
+    "space_model_load_seconds",
+    "Estimated model load time of switched dispatches (wall time minus inference time)",
+    ["backend"],
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 300)
+)
+
+
+@dataclass
+class Job:
+    task_id: str
+    model: Optional[str]
+    payload: dict
+    enqueued_at: float = field(default_factory=time.monotonic)
+    skips: int = 0
+    backend_url: Optional[str] = None
+    error: Optional[str] = None
+    cancelled: bool = False
+    dispatched: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+@dataclass
+class RunningJob:
+    backend: Backend
+    model: Optional[str]
+    dispatched_at: float
+    switched: bool
+
+
+class Dispatcher:
+    def __init__(self, pool: BackendPool):
+        self.pool = pool
+        self._queue: "OrderedDict[str, Job]" = OrderedDict()
+        self._dispatching: Dict[str, Job] = {}
+        self._running: Dict[str, RunningJob] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dispatch_tasks = set()
+        self.switches = 0
+        self.load_seconds = 0.0
+        pool.add_release_listener(self.notify)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def notify(self):
+        """Wake the dispatch loop; safe to call from any thread"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def submit(self, task_id: str, model: Optional[str], payload: dict):
+        """Enqueue a job from a threadpool route"""
+        if self._loop is None:
+            raise RuntimeError("Dispatcher is not running")
+        self._loop.call_soon_threadsafe(self._enqueue, Job(task_id, model, payload))
+
+    def submit_many(self, jobs: List[Tuple[str, Optional[str], dict]]):
+        """Enqueue ``(task_id, model, payload)`` jobs in one loop callback.
+
+        They are dispatched concurrently as slots allow, and same-model
+        members of a batch are grouped by the affinity selection.
+        """
+        if self._loop is None:
+            raise RuntimeError("Dispatcher is not running")
+        self._loop.call_soon_threadsafe(self._enqueue, *(Job(*job) for job in jobs))
+
+    def _enqueue(self, *jobs: Job):
+        for job in jobs:
+            self._queue[job.task_id] = job
+        queue_length.set(len(self._queue))
+        self._wakeup.set()
+
+    def pending_job(self, task_id: str) -> Optional[Job]:
+        """Job of a task that this worker has not finished dispatching yet"""
+        return self._queue.get(task_id) or self._dispatching.get(task_id)
+
+    def cancel(self, task_id: str) -> bool:
+        """Cancel a job this worker has not submitted yet; False if it is not held here.
+
+        Queued jobs are dropped without any Space call. A job whose submit is
+        in flight is cancelled upstream by ``_dispatch`` once the submit returns.
+        """
+        job = self._queue.pop(task_id, None)
+        if job is not None:
+            queue_length.set(len(self._queue))
+            job.cancelled = True
+            job.dispatched.set()
+            logger.info(f"🛑 Removed task {task_id} from the dispatch queue")
+            return True
+
+        job = self._dispatching.get(task_id)
+        if job is not None:
+            job.cancelled = True
+            return True
+        return False
+
+    def abort_all(self, error: str) -> List[str]:
+        """Fail every job not yet dispatched, for a drain that ran out of time.
+
+        Queued jobs are dropped; jobs whose submit is in flight are cancelled
+        upstream once it returns. Returns their task ids; the caller updates the rows.
+        """
+        aborted = []
+        for job in list(self._queue.values()) + list(self._dispatching.values()):
+            job.error = error
+            job.cancelled = True
+            aborted.append(job.task_id)
+        for job in self._queue.values():
+            job.dispatched.set()
+        self._queue.clear()
+        queue_length.set(0)
+        return aborted
+
+    def has_work(self) -> bool:
+        return bool(self._queue or self._dispatching)
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        for position, queued_id in enumerate(self._queue):
+            if queued_id == task_id:
+                return position
+        return None
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while True:
+                selection = self._select()
+                if selection is None:
+                    break
+                job, backend = selection
+                del self._queue[job.task_id]
+                self._dispatching[job.task_id] = job
+                queue_length.set(len(self._queue))
+                # take the slot now so the next selection sees it
+                self.pool.assign(job.task_id, backend)
+                dispatch = asyncio.create_task(self._dispatch(job, backend))
+                self._dispatch_tasks.add(dispatch)
+                dispatch.add_done_callback(self._dispatch_tasks.discard)
+
+    def _select(self):
+        if not self._queue:
+            return None
+        free = self.pool.free_backends()
+        if not free:
+            return None
+
+        window = list(islice(self._queue.values(), settings.DISPATCH_LOOKAHEAD))
+        head = window[0]
+
+        if head.skips < settings.DISPATCH_MAX_SKIPS:
+            for index, job in enumerate(window):
+                warm = [b for b in free if b.is_warm(job.model)]
+                if warm:
+                    for overtaken in window[:index]:
+                        overtaken.skips += 1
+                    return job, self.pool.best(warm)
+
+        warm = [b for b in free if b.is_warm(head.model)]
+        return head, self.pool.best(warm or free)
+
+    async def _dispatch(self, job: Job, backend: Backend):
+        from app.core.http_client import get_upstream_session, space_headers
+        from app.core.resilience import call_space_async
+        from app.events.db_events import get_task_status, run_in_own_session, update_task_in_db_async
+        from app.events.ingestion import ingestion
+        from app.events.webhooks import webhooks
+        import aiohttp
+
+        switched = bool(backend.recent_models) and not backend.is_warm(job.model)
+        started = time.monotonic()
+
+        try:
+            # the task may have been cancelled through another worker, or
+            # failed by the reaper, while it was queued here
+            if await run_in_own_session(get_task_status, job.task_id) != "pending":
+                self.pool.release(job.task_id)
+                return
+
+            session = get_upstream_session()
+            response = await call_space_async(
+                "generate",
+                lambda: session.post(
+                    f"{backend.url}/generate",
+                    json=job.payload,
+                    headers=space_headers(**{"Content-Type": "application/json"}),
+                    timeout=aiohttp.ClientTimeout(total=settings.REQUEST_TIMEOUT)
+                ),
+                idempotent=False,
+                breaker=backend.url
+            )
+            async with response:
+                if response.status != 200:
+                    raise RuntimeError(f"Space API returned status code {response.status}")
+
+            if job.cancelled:
+                self.pool.release(job.task_id)
+                await self.cancel_upstream(job.task_id, backend)
+                return
+
+            self.pool.record_latency(backend, time.monotonic() - started)
+            backend.mark_model(job.model)
+            if switched:
+                self.switches += 1
+                model_switches.labels(backend.url).inc()
+            self._running[job.task_id] = RunningJob(backend, job.model, started, switched)
+
+            job.backend_url = backend.url
+            await update_task_in_db_async(job.task_id, {"backend_url": backend.url})
+            ingestion.start(job.task_id, backend)
+            logger.info(f"📤 Dispatched task {job.task_id} ({job.model}) to {backend.url}")
+
+        except Exception as e:
+            logger.error(f"❌ Failed to dispatch task {job.task_id} to {backend.url}: {e}")
+            job.error = str(e)
+            self.pool.release(job.task_id)
+            await update_task_in_db_async(job.task_id, {"status": "failed"})
+            webhooks.notify(job.task_id)
+
+        finally:
+            self._dispatching.pop(job.task_id, None)
+            job.dispatched.set()
+
+    async def cancel_upstream(self, task_id: str, backend: Backend) -> bool:
+        """Ask the backend to stop a running generation"""
+        from app.core.http_client import get_upstream_session, space_headers
+        from app.core.resilience import call_space_async
+        import aiohttp
+
+        try:
+            session = get_upstream_session()
+            response = await call_space_async(
+                "cancel",
+                lambda: session.post(
+                    f"{backend.url}/cancel-generation/{task_id}",
+                    headers=space_headers(),
+                    timeout=aiohttp.ClientTimeout(total=10)
+                ),
+                breaker=backend.url
+            )
+            async with response:
+                if response.status != 200:
+                    logger.warning(f"⚠️ Space did not cancel task {task_id}: status code {response.status}")
+                    return False
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error cancelling task {task_id} on {backend.url}: {e}")
+            return False
+
+    def record_completion(self, task_id: str, inference_seconds: Optional[float]):
+        """Attribute wall time beyond inference to the model load of switched jobs"""
+        running = self._running.pop(task_id, None)
+        if running is None or not running.switched or inference_seconds is None:
+            return
+        load = max(time.monotonic() - running.dispatched_at - float(inference_seconds), 0.0)
+        self.load_seconds += load
+        model_load_seconds.labels(running.backend.url).observe(load)
+
+    def forget(self, task_id: str):
+        self._running.pop(task_id, None)
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": len(self._queue),
+            "dispatching": len(self._dispatching),
+            "running": len(self._running),
+            "model_switches": self.switches,
+            "model_load_seconds": round(self.load_seconds, 3)
+        }
+
+
+dispatcher = Dispatcher(backend_pool)
@@ -0,0 +1,135 @@
+"""
+Graceful drain for rolling deploys.
+
+SIGTERM starts the drain next to uvicorn's own shutdown: /generate answers
+503 and /ready reports the drain, while work already accepted here carries
+on. Queued jobs are still dispatched and ingested tasks keep streaming to
+their clients, so uvicorn's wait for open connections ends as they finish.
+Streams following tasks of other workers end with ``reconnect`` so clients
+resume elsewhere. Whatever is still queued or running after DRAIN_TIMEOUT
+is failed, and cancelled on the Space, instead of waiting for the reaper.
+"""
+import asyncio
+import signal
+import threading
+import time
+from typing import Optional
+import logging
+
+from app.core.config import settings
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+aborted_tasks = counter("drain_aborted_tasks_total", "Tasks failed because a drain ran out of time")
+
+DRAIN_POLL_INTERVAL = 0.5
+# time given to aborted ingestions to record the failure and cancel upstream
+ABORT_GRACE = 5.0
+DRAIN_ERROR = "Worker shut down before the generation finished"
+
+
+class Drainer:
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.aborted = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.started_at is not None
+
+    def begin(self):
+        """Stop accepting generations and start waiting for in-flight work; idempotent"""
+        if self.draining:
+            return
+        self.started_at = time.monotonic()
+        logger.info(f"🚰 Draining, accepted work has {settings.DRAIN_TIMEOUT}s to finish")
+        self._task = asyncio.create_task(self._run())
+
+    async def wait(self):
+        """Drain (if no signal started it) and wait until it is done"""
+        self.begin()
+        await asyncio.shield(self._task)
+
+    def install_signal_handler(self):
+        """Begin the drain on SIGTERM, then let the previous handler run.
+
+        Called from the lifespan, after uvicorn installed its handlers; those
+        are driven by the loop's wakeup fd and keep working underneath.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle_sigterm(signum, frame):
+            loop.call_soon_threadsafe(self.begin)
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signal.SIGTERM, handle_sigterm)
+
+    async def _run(self):
+        from app.core.dispatcher import dispatcher
+        from app.events.ingestion import ingestion
+
+        deadline = self.started_at + settings.DRAIN_TIMEOUT
+        try:
+            while dispatcher.has_work() or ingestion.task_ids():
+                if time.monotonic() >= deadline:
+                    await self._abort()
+                    break
+                await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        except Exception as e:
+            logger.error(f"❌ Drain failed: {e}")
+        finally:
+            self.finished_at = time.monotonic()
+            logger.info(f"✅ Drain finished in {self.finished_at - self.started_at:.1f}s, {self.aborted} task(s) aborted")
+
+    async def _abort(self):
+        from app.core.dispatcher import dispatcher
+        from app.events.db_events import fail_tasks_in_db, run_in_own_session
+        from app.events.ingestion import ingestion
+        from app.events.streams import DRAINED, upstream_streams
+        from app.events.webhooks import webhooks
+
+        not_dispatched = dispatcher.abort_all(DRAIN_ERROR)
+        if not_dispatched:
+            await run_in_own_session(fail_tasks_in_db, not_dispatched)
+            for task_id in not_dispatched:
+                webhooks.notify(task_id)
+
+        ingesting = ingestion.task_ids()
+        for task_id in ingesting:
+            upstream_streams.close(task_id, DRAINED)
+
+        self.aborted = len(not_dispatched) + len(ingesting)
+        aborted_tasks.inc(self.aborted)
+        logger.warning(f"⚠️ Drain timed out, aborted {len(not_dispatched)} queued and {len(ingesting)} running task(s)")
+
+        if not await ingestion.wait(ABORT_GRACE):
+            logger.warning("⚠️ Some ingestions did not stop after the drain timed out")
+
+    def as_dict(self) -> dict:
+        from app.core.dispatcher import dispatcher
+        from app.events.ingestion import ingestion
+
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        snapshot = dispatcher.snapshot()
+        return {
+            "draining": self.draining,
+            "done": self.finished_at is not None,
+            "elapsed_seconds": elapsed,
+            "timeout_seconds": settings.DRAIN_TIMEOUT,
+            "queued": snapshot["queued"],
+            "dispatching": snapshot["dispatching"],
+            **ingestion.snapshot(),
+            "aborted": self.aborted
+        }
+
+
+drainer = Drainer()
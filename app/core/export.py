@@ -0,0 +1,241 @@
+"""
+Streaming export of the gallery.
+
+``export_archive`` is a generator of archive bytes: it reads image rows
+through a server-side cursor, EXPORT_FETCH_SIZE rows per round trip, and
+writes each image as one entry of a ZIP or tar as soon as it is read. The
+JSONL manifest of prompts and metadata is spooled to a temporary file on
+the way and appended as the last entry, so memory stays at one fetch of
+rows plus EXPORT_CHUNK_BYTES of output whatever the size of the export.
+
+ZIP entries are written with data descriptors, since the output cannot be
+seeked back into; images are stored as is, the manifest is deflated. Tar
+output is plain ustar/pax blocks written here from ``TarInfo`` headers.
+"""
+import datetime
+import tarfile
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from typing import Iterator, Optional
+import logging
+
+import orjson
+
+from app.core.config import settings
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+image_exports = counter("image_exports_total", "Gallery exports by format and outcome", ["format", "outcome"])
+images_exported = counter("images_exported_total", "Images written into gallery exports")
+
+FORMATS = {
+    "zip": ("application/zip", "zip"),
+    "tar": ("application/x-tar", "tar"),
+}
+MANIFEST_NAME = "manifest.jsonl"
+MANIFEST_SPOOL_BYTES = 1024 * 1024
+COPY_CHUNK_BYTES = 64 * 1024
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/gif": "gif"}
+
+
+@dataclass
+class ExportFilters:
+    model: Optional[str] = None
+    task_id: Optional[str] = None
+    created_after: Optional[datetime.datetime] = None
+    created_before: Optional[datetime.datetime] = None
+
+
+class _Sink:
+    """Write-only, unseekable file object collecting the output until it is drained"""
+
+    def __init__(self):
+        self._parts = []
+        self.pending = 0
+        self.written = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self.pending += len(data)
+        self.written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        self.pending = 0
+        return data
+
+
+class ZipExportWriter:
+    def __init__(self, sink: _Sink):
+        self._zip = zipfile.ZipFile(sink, "w", allowZip64=True)
+
+    def open(self, name: str, size: int, modified: datetime.datetime, compress: bool = False):
+        info = zipfile.ZipInfo(name, date_time=_zip_time(modified))
+        info.file_size = size
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        return self._zip.open(info, "w")
+
+    def finish(self):
+        self._zip.close()
+
+
+class _TarEntry:
+    def __init__(self, sink: _Sink, size: int):
+        self._sink = sink
+        self._size = size
+        self._written = 0
+
+    def write(self, data: bytes):
+        self._written += len(data)
+        self._sink.write(data)
+
+    def close(self):
+        if self._written != self._size:
+            raise IOError(f"Tar entry declared {self._size} bytes, got {self._written}")
+        self._sink.write(tarfile.NUL * (-self._size % tarfile.BLOCKSIZE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+
+
+class TarExportWriter:
+    def __init__(self, sink: _Sink):
+        self._sink = sink
+
+    def open(self, name: str, size: int, modified: datetime.datetime, compress: bool = False):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(modified.timestamp())
+        info.mode = 0o644
+        self._sink.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+        return _TarEntry(self._sink, size)
+
+    def finish(self):
+        self._sink.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+        self._sink.write(tarfile.NUL * (-self._sink.written % tarfile.RECORDSIZE))
+
+
+def _zip_time(modified: datetime.datetime) -> tuple:
+    # ZIP timestamps start in 1980
+    return max(modified.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+def _extension(content_type: Optional[str]) -> str:
+    return EXTENSIONS.get(content_type or "", "png")
+
+
+def _image_bytes(row):
+    """``(bytes, content type)`` of an exported row, from its archive pack, file or inline data"""
+    from app.core.archive import decode_image_data, read_archived_image
+    from app.core.image_store import image_store
+
+    if row.archive_key:
+        raw = read_archived_image(row.archive_key, row.archive_offset, row.archive_length, row.archive_codec)
+        return raw, row.content_type or "image/png"
+    if row.image_path and image_store.exists(row.image_path):
+        with open(row.image_path, "rb") as f:
+            return f.read(), row.content_type or "image/png"
+    if row.image_data:
+        content_type = row.content_type
+        if row.image_data.startswith("data:"):
+            content_type = row.image_data[5:].split(";", 1)[0] or content_type
+        return decode_image_data(row.image_data), content_type or "image/png"
+    return None, None
+
+
+def export_query(filters: ExportFilters, db):
+    from app.models.db_models import Image
+
+    query = db.query(
+        Image.id, Image.task_id, Image.prompt, Image.model_used, Image.created_at, Image.content_type,
+        Image.image_path, Image.image_data, Image.archive_key, Image.archive_offset,
+        Image.archive_length, Image.archive_codec
+    )
+    if filters.model:
+        query = query.filter(Image.model_used == filters.model)
+    if filters.task_id:
+        query = query.filter(Image.task_id == filters.task_id)
+    if filters.created_after:
+        query = query.filter(Image.created_at >= filters.created_after)
+    if filters.created_before:
+        query = query.filter(Image.created_at < filters.created_before)
+    return query.order_by(Image.id)
+
+
+def export_archive(export_format: str, filters: ExportFilters) -> Iterator[bytes]:
+    """Archive bytes of every image matching ``filters``, then the manifest.
+
+    Blocking; iterate it in a worker thread. Closing the generator early
+    closes its cursor and session and drops the rest of the export.
+    """
+    from app.core.database import get_session
+
+    sink = _Sink()
+    writer = ZipExportWriter(sink) if export_format == "zip" else TarExportWriter(sink)
+    manifest = tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_BYTES)
+    db = get_session()
+    exported = skipped = 0
+    finished = False
+    try:
+        rows = export_query(filters, db).execution_options(stream_results=True).yield_per(settings.EXPORT_FETCH_SIZE)
+        for row in rows:
+            try:
+                raw, content_type = _image_bytes(row)
+            except Exception as e:
+                logger.warning(f"⚠️ Image {row.id} could not be read for export: {e}")
+                raw = None
+            if raw is None:
+                skipped += 1
+                continue
+
+            name = f"images/{row.id}.{_extension(content_type)}"
+            modified = row.created_at or datetime.datetime.now()
+            with writer.open(name, len(raw), modified) as entry:
+                entry.write(raw)
+            manifest.write(orjson.dumps({
+                "id": row.id,
+                "task_id": row.task_id,
+                "file": name,
+                "prompt": row.prompt,
+                "model_used": row.model_used,
+                "content_type": content_type,
+                "size": len(raw),
+                "created_at": row.created_at
+            }) + b"\n")
+            exported += 1
+            if sink.pending >= settings.EXPORT_CHUNK_BYTES:
+                yield sink.drain()
+
+        size = manifest.tell()
+        manifest.seek(0)
+        with writer.open(MANIFEST_NAME, size, datetime.datetime.now(), compress=True) as entry:
+            while True:
+                chunk = manifest.read(COPY_CHUNK_BYTES)
+                if not chunk:
+                    break
+                entry.write(chunk)
+                if sink.pending >= settings.EXPORT_CHUNK_BYTES:
+                    yield sink.drain()
+        writer.finish()
+        yield sink.drain()
+        finished = True
+    finally:
+        manifest.close()
+        db.close()
+        images_exported.inc(exported)
+        image_exports.labels(export_format, "completed" if finished else "aborted").inc()
+        logger.info(
+            f"📦 Export {'finished' if finished else 'aborted'}: {exported} images, "
+            f"{skipped} skipped, {sink.written} bytes"
+        )
@@ -0,0 +1,48 @@
+"""
+Shared connection pool for calls to the Space.
+
+One aiohttp session serves the dispatcher, the stream ingestion and the
+webhooks. It keeps connections alive between calls so only the first
+request per connection pays for DNS, TCP and TLS.
+"""
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_async_session = None
+
+
+def space_headers(accept: str = "application/json", **extra) -> dict:
+    headers = {
+        "Authorization": f"Bearer {settings.HF_TOKEN}",
+        "Accept": accept
+    }
+    headers.update(extra)
+    return headers
+
+
+def get_upstream_session():
+    """aiohttp session bound to the running event loop, created on first use"""
+    global _async_session
+    import aiohttp
+
+    if _async_session is None or _async_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.UPSTREAM_POOL_SIZE,
+            ttl_dns_cache=settings.UPSTREAM_DNS_CACHE_TTL,
+            use_dns_cache=True,
+            keepalive_timeout=settings.UPSTREAM_KEEPALIVE_TIMEOUT
+        )
+        _async_session = aiohttp.ClientSession(connector=connector)
+    return _async_session
+
+
+async def close_upstream_sessions():
+    global _async_session
+
+    if _async_session is not None and not _async_session.closed:
+        await _async_session.close()
+        logger.info("🔌 Upstream async session closed")
+    _async_session = None
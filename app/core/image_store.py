@@ -0,0 +1,153 @@
+import base64
+import os
+from dataclasses import dataclass
+from typing import Optional
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DATA_URL_PREFIX_LIMIT = 64
+DEFAULT_CONTENT_TYPE = "image/png"
+
+_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+}
+
+
+@dataclass
+class StoredImage:
+    path: str
+    content_type: str
+    size: int
+
+
+class ImageWriter:
+    """Decodes a base64 (or data URL) payload in chunks straight into a file.
+
+    Only the undecoded tail of the last segment (< 4 chars) and the data URL
+    header are held in memory, so the cost per image is bounded by the size
+    of the segments that are written, not by the size of the image.
+    """
+
+    def __init__(self, task_id: str, directory: str):
+        self.task_id = task_id
+        self.directory = directory
+        self.content_type = DEFAULT_CONTENT_TYPE
+        self.size = 0
+        self._header = b""
+        self._header_done = False
+        self._carry = b""
+        self._escape = b""
+        self._tmp_path = os.path.join(directory, f"{task_id}.part")
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, segment: bytes):
+        if not segment:
+            return
+
+        # JSON encoders may escape "/" as "\/"; a backslash ending a segment waits for the next one
+        segment, self._escape = self._escape + segment, b""
+        if segment.endswith(b"\\"):
+            segment, self._escape = segment[:-1], b"\\"
+        if b"\\" in segment:
+            segment = segment.replace(b"\\/", b"/")
+
+        if not self._header_done:
+            segment = self._consume_header(segment)
+            if not segment:
+                return
+
+        data = self._carry + segment
+        usable = len(data) - (len(data) % 4)
+        if usable:
+            decoded = base64.b64decode(data[:usable])
+            self._file.write(decoded)
+            self.size += len(decoded)
+        self._carry = data[usable:]
+
+    def _consume_header(self, segment: bytes) -> bytes:
+        self._header += segment
+        comma = self._header.find(b",")
+
+        if comma == -1:
+            if not self._header.startswith(b"data:"[:len(self._header)]) or len(self._header) > DATA_URL_PREFIX_LIMIT:
+                # plain base64 without a data URL header
+                segment, self._header = self._header, b""
+                self._header_done = True
+                return segment
+            return b""
+
+        header, segment = self._header[:comma], self._header[comma + 1:]
+        if header.startswith(b"data:"):
+            content_type = header[5:].split(b";", 1)[0].decode("ascii", errors="ignore")
+            self.content_type = content_type or DEFAULT_CONTENT_TYPE
+        self._header = b""
+        self._header_done = True
+        return segment
+
+    def close(self) -> StoredImage:
+        if self._header:
+            tail, self._header = self._header, b""
+            self._header_done = True
+            self.write(tail)
+
+        if self._carry:
+            padded = self._carry + b"=" * (-len(self._carry) % 4)
+            decoded = base64.b64decode(padded)
+            self._file.write(decoded)
+            self.size += len(decoded)
+            self._carry = b""
+
+        self._file.close()
+
+        extension = _EXTENSIONS.get(self.content_type, "bin")
+        final_path = os.path.join(self.directory, f"{self.task_id}.{extension}")
+        os.replace(self._tmp_path, final_path)
+
+        return StoredImage(path=final_path, content_type=self.content_type, size=self.size)
+
+    def abort(self):
+        try:
+            self._file.close()
+        finally:
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+
+
+class ImageStore:
+    """Local disk store for generated images"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.GENERATED_IMAGES_DIR
+
+    def open_writer(self, task_id: str) -> ImageWriter:
+        os.makedirs(self.directory, exist_ok=True)
+        return ImageWriter(task_id, self.directory)
+
+    def iter_base64(self, path: str, chunk_size: int = 48 * 1024):
+        """Base64 of a stored file in chunks; ``chunk_size`` is a multiple of 3 so chunks concatenate"""
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield base64.b64encode(chunk).decode("ascii")
+
+    def exists(self, path: Optional[str]) -> bool:
+        return bool(path) and os.path.isfile(path)
+
+    def delete(self, path: Optional[str]) -> bool:
+        try:
+            if path and os.path.isfile(path):
+                os.remove(path)
+                return True
+        except OSError as e:
+            logger.error(f"❌ Failed to delete image file {path}: {e}")
+        return False
+
+
+image_store = ImageStore()
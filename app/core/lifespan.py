@@ -1,9 +1,7 @@
-import os
-import sys
+import asyncio
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 import logging
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 
 logger = logging.getLogger(__name__)
@@ -13,8 +11,22 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Application starting up...")
     from app.core.shutdown_manager import shutdown_manager 
     from app.core.scheduler import TaskScheduler
-    from app.events.cleanup import db_weekly_cleanup, midnight_cleanup 
-    from app.core.database import initialize_database
+    from app.events.cleanup import (
+        archive_old_images, db_weekly_cleanup, hash_missing_images, midnight_cleanup, move_tasks_to_history,
+        process_deletion_jobs, reap_stale_tasks, redeliver_stale_webhooks
+    )
+    from app.events.streams import upstream_streams
+    from app.core.database import dispose_engine, initialize_database
+    from app.core.config import settings
+    from app.core.drain import drainer
+    from app.core.loop_monitor import loop_monitor
+    from app.core.warmup import warm_up
+    from app.core.http_client import close_upstream_sessions
+    from app.core.backends import backend_pool
+    from app.core.dispatcher import dispatcher
+    from app.events.ingestion import ingestion
+    from app.events.webhooks import webhooks
+    from app.core.logging_setup import stop_logging
 
     app.state.scheduler = TaskScheduler() 
 
@@ -22,15 +34,45 @@ async def lifespan(app: FastAPI):
 
     app.state.scheduler.start_midnight_scheduler(app, midnight_cleanup)
     app.state.scheduler.start_weekly_scheduler(app, db_weekly_cleanup)
+    app.state.scheduler.start_reaper_scheduler(app, reap_stale_tasks)
+    app.state.scheduler.start_history_scheduler(app, move_tasks_to_history)
+    app.state.scheduler.start_deletion_scheduler(app, process_deletion_jobs)
+    app.state.scheduler.start_webhook_scheduler(app, redeliver_stale_webhooks)
+    if settings.ARCHIVE_ENABLED:
+        app.state.scheduler.start_archive_scheduler(app, archive_old_images)
+    if settings.SIMILARITY_ENABLED:
+        app.state.scheduler.start_similarity_scheduler(app, hash_missing_images)
+
+    # Runs in the background so /health answers while /ready waits for it
+    app.state.warmup = asyncio.create_task(warm_up())
+    app.state.backend_health = asyncio.create_task(backend_pool.run_health_checks())
+    app.state.stream_watchdog = asyncio.create_task(upstream_streams.run_watchdog())
+    loop_monitor.start()
+    dispatcher.start()
+    webhooks.start()
+    drainer.install_signal_handler()
     
     logger.info("✅ Application startup complete")
     
     yield  
 
-    # logger.info("🛑 Application shutting down...")
-    # if hasattr(app.state, 'scheduler'):
-    #     app.state.scheduler.shutdown_scheduler()
-    
-    # await shutdown_manager.run_cleanup()
-    
-    # logger.info("✅ Application shutdown complete")
\ No newline at end of file
+    logger.info("🛑 Application shutting down...")
+    # uvicorn has stopped accepting connections; let accepted work finish first
+    await drainer.wait()
+    await webhooks.flush(settings.DRAIN_WEBHOOK_TIMEOUT)
+    app.state.scheduler.shutdown_scheduler()
+
+    if not app.state.warmup.done():
+        app.state.warmup.cancel()
+    app.state.backend_health.cancel()
+    app.state.stream_watchdog.cancel()
+    await dispatcher.stop()
+    await ingestion.stop()
+    await webhooks.stop()
+    await loop_monitor.stop()
+    await close_upstream_sessions()
+    dispose_engine()
+    await shutdown_manager.run_cleanup()
+
+    logger.info("✅ Application shutdown complete")
+    stop_logging()
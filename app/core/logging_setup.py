@@ -0,0 +1,150 @@
+"""
+Structured, non-blocking logging.
+
+Records from structlog and from plain ``logging`` loggers are put on an
+in-memory queue by the handler on the calling thread; a QueueListener
+thread renders them (JSON by default) and writes them to stdout, so the
+event loop never waits on stdout.
+
+LOG_LEVEL is the root level, optionally followed by per-module levels:
+``INFO,app.events.ingestion=DEBUG,sqlalchemy.engine=WARNING``.
+Context bound with ``bind_task`` (such as ``task_id``) is added to every
+record logged in that task or thread, including from ``asyncio.to_thread``.
+"""
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Dict, Optional, Tuple
+
+import structlog
+
+from app.core.config import settings
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _PassthroughQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records untouched; formatting happens on the listener thread.
+
+    The stock ``prepare`` formats the record on the caller and flattens its
+    message to a string, which would lose structlog's event dict.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_levels(spec: str) -> Tuple[int, Dict[str, int]]:
+    """``"INFO,app.events=DEBUG"`` -> (INFO, {"app.events": DEBUG})"""
+    root = logging.INFO
+    modules = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, level = part.rpartition("=")
+        level_value = logging.getLevelName(level.strip().upper())
+        if not isinstance(level_value, int):
+            raise ValueError(f"Unknown log level '{level}' in LOG_LEVEL")
+        if name:
+            modules[name.strip()] = level_value
+        else:
+            root = level_value
+    return root, modules
+
+
+def setup_logging():
+    global _listener
+    if _listener is not None:
+        return
+
+    shared_processors = [
+        structlog.contextvars.merge_contextvars,
+        structlog.stdlib.add_logger_name,
+        structlog.stdlib.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+    ]
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            *shared_processors,
+            structlog.processors.StackInfoRenderer(),
+            # the traceback is only available on the logging thread
+            structlog.processors.format_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    renderer = (
+        structlog.dev.ConsoleRenderer(colors=False)
+        if settings.LOG_FORMAT == "console"
+        else structlog.processors.JSONRenderer(ensure_ascii=False)
+    )
+    formatter = structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=shared_processors,
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            renderer,
+        ],
+    )
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=False)
+    _listener.start()
+
+    root_level, module_levels = parse_levels(settings.LOG_LEVEL)
+    root = logging.getLogger()
+    root.handlers = [_PassthroughQueueHandler(records)]
+    root.setLevel(root_level)
+    for name, level in module_levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    # uvicorn installs its own stdout handlers; route its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+
+def stop_logging():
+    """Flush queued records and write any later ones directly; called on shutdown"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().handlers = list(_listener.handlers)
+        _listener = None
+
+
+def get_logger(name: str):
+    return structlog.stdlib.get_logger(name)
+
+
+def bind_task(task_id: str):
+    """Add ``task_id`` to every record logged from the current task or thread"""
+    structlog.contextvars.bind_contextvars(task_id=task_id)
+
+
+class ProgressSampler:
+    """Lets through one progress record per ``step`` percent for each task"""
+
+    def __init__(self, step: int):
+        self.step = max(int(step), 1)
+        self._last: Dict[str, int] = {}
+
+    def sample(self, task_id: str, progress) -> bool:
+        bucket = int(progress or 0) // self.step
+        if self._last.get(task_id) == bucket:
+            return False
+        self._last[task_id] = bucket
+        return True
+
+    def forget(self, task_id: str):
+        self._last.pop(task_id, None)
@@ -0,0 +1,120 @@
+"""
+Event loop lag monitor.
+
+A coroutine sleeps LOOP_LAG_INTERVAL seconds at a time and records how
+late it wakes up in ``event_loop_lag_seconds``; every stream on the worker
+sees the same delay. A watchdog thread checks that coroutine's heartbeat:
+once the loop has not come round for LOOP_BLOCK_THRESHOLD seconds it
+captures the loop thread's stack with ``sys._current_frames()``, which is
+the stack of whatever is blocking, and logs it once per stall with the
+route and task id found in the frames' locals.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.core.config import settings
+from app.core.logging_setup import get_logger
+from app.core.metrics import counter, histogram
+
+logger = get_logger(__name__)
+
+loop_lag_seconds = histogram(
+    "event_loop_lag_seconds",
+    "Delay of event loop callbacks past their scheduled time",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+loop_blocked_total = counter("event_loop_blocked_total", "Stalls of the event loop longer than LOOP_BLOCK_THRESHOLD")
+
+
+def blocking_context(frame) -> dict:
+    """Route and task id of a stack, read from the locals of its frames (innermost first)"""
+    context = {}
+    while frame is not None and len(context) < 2:
+        local_vars = frame.f_locals
+        task_id = local_vars.get("task_id")
+        if "task_id" not in context and isinstance(task_id, str):
+            context["task_id"] = task_id
+        scope = local_vars.get("scope")
+        if "route" not in context and isinstance(scope, dict) and scope.get("type") == "http":
+            context["route"] = f"{scope.get('method')} {scope.get('path')}"
+        frame = frame.f_back
+    return context
+
+
+class LoopLagMonitor:
+    def __init__(self):
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _measure(self):
+        interval = settings.LOOP_LAG_INTERVAL
+        while True:
+            scheduled = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(now - scheduled, 0.0)
+            self.max_lag = max(self.max_lag, lag)
+            loop_lag_seconds.observe(lag)
+
+    def _watch(self):
+        threshold = settings.LOOP_BLOCK_THRESHOLD
+        reported_beat = None
+        while not self._stop.wait(settings.LOOP_LAG_INTERVAL):
+            beat = self._heartbeat
+            blocked_for = time.monotonic() - beat - settings.LOOP_LAG_INTERVAL
+            if blocked_for < threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            try:
+                self._report(blocked_for)
+            except Exception as e:
+                logger.error(f"❌ Could not capture the blocked event loop: {e}")
+
+    def _report(self, blocked_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        self.stalls += 1
+        loop_blocked_total.inc()
+        current = asyncio.current_task(self._loop)
+        logger.warning(
+            "⚠️ Event loop blocked",
+            blocked_seconds=round(blocked_for, 3),
+            asyncio_task=current.get_name() if current is not None else None,
+            stack="".join(traceback.format_stack(frame)),
+            **blocking_context(frame)
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "max_lag_seconds": round(self.max_lag, 4),
+            "stalls": self.stalls
+        }
+
+
+loop_monitor = LoopLagMonitor()
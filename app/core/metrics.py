@@ -0,0 +1,65 @@
+"""
+Prometheus metrics, created on first use.
+
+prometheus_client is only imported when a metric is first touched, so
+modules can declare metrics at import time without paying for the client.
+Set PROMETHEUS_MULTIPROC_DIR to aggregate over all uvicorn workers.
+"""
+import os
+import threading
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+class LazyMetric:
+    def __init__(self, kind: str, name: str, documentation: str, labelnames=(), **kwargs):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.kwargs = kwargs
+
+    def _metric(self):
+        metric = _metrics.get(self.name)
+        if metric is None:
+            with _lock:
+                metric = _metrics.get(self.name)
+                if metric is None:
+                    import prometheus_client
+
+                    cls = getattr(prometheus_client, self.kind)
+                    metric = cls(self.name, self.documentation, self.labelnames, **self.kwargs)
+                    _metrics[self.name] = metric
+        return metric
+
+    def labels(self, *args, **kwargs):
+        return self._metric().labels(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._metric(), attr)
+
+
+def counter(name: str, documentation: str, labelnames=()) -> LazyMetric:
+    return LazyMetric("Counter", name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames=(), **kwargs) -> LazyMetric:
+    return LazyMetric("Gauge", name, documentation, labelnames, **kwargs)
+
+
+def histogram(name: str, documentation: str, labelnames=(), **kwargs) -> LazyMetric:
+    return LazyMetric("Histogram", name, documentation, labelnames, **kwargs)
+
+
+def render_latest():
+    """Exposition payload and content type for the /metrics route"""
+    import prometheus_client
+
+    registry = prometheus_client.REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
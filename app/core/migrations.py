@@ -0,0 +1,71 @@
+import os
+import sys
+import logging
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+class SchemaVersionError(RuntimeError):
+    """Raised when the database schema is not at the revision this build expects"""
+    pass
+
+def alembic_config():
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    return config
+
+def head_revision() -> str:
+    """Latest revision shipped with this build, read from the migration scripts"""
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+def current_revision(engine):
+    """Revision stamped on the database, or None when it was never migrated"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except Exception:
+        return None
+
+def check_schema_version(engine) -> str:
+    expected = head_revision()
+    current = current_revision(engine)
+
+    if current != expected:
+        raise SchemaVersionError(
+            f"Database schema is at revision {current or '<none>'}, expected {expected}. "
+            f"Run `python -m app.core.migrations upgrade` before starting the app."
+        )
+    return current
+
+def upgrade(revision: str = "head"):
+    from alembic import command
+
+    command.upgrade(alembic_config(), revision)
+
+def main(argv):
+    from app.core.database import get_engine
+
+    action = argv[0] if argv else "upgrade"
+
+    if action == "upgrade":
+        upgrade(argv[1] if len(argv) > 1 else "head")
+        print(f"✅ Database schema at revision {current_revision(get_engine())}")
+    elif action == "current":
+        print(current_revision(get_engine()) or "<none>")
+    elif action == "check":
+        check_schema_version(get_engine())
+        print("✅ Database schema is up to date")
+    else:
+        print("Usage: python -m app.core.migrations [upgrade [revision] | current | check]")
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,187 @@
+"""
+Sampling profiler for live workers.
+
+A daemon thread reads ``sys._current_frames()`` every PROFILE_SAMPLE_INTERVAL
+seconds and counts the stack of each thread, so the event loop and the
+route threadpool are profiled without instrumenting them. Profiles are
+exported as speedscope JSON (https://www.speedscope.app) or as collapsed
+stacks for flamegraph.pl.
+
+Nothing here runs unless PROFILING_ENABLED is set: /debug/profile and the
+per-request ProfilingMiddleware are only installed then, and both require
+PROFILING_TOKEN in the ``X-Profile-Token`` header.
+"""
+import hmac
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile-token"
+# authenticated with the same header, but profiles the worker rather than the request
+PROFILE_ROUTE = "/debug/profile"
+
+Frame = Tuple[str, str, int]
+
+
+def token_matches(token: Optional[str]) -> bool:
+    expected = settings.PROFILING_TOKEN
+    if not settings.PROFILING_ENABLED or not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+class SamplingProfiler:
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or settings.PROFILE_SAMPLE_INTERVAL
+        self.samples: Dict[int, Counter] = {}
+        self.thread_names: Dict[int, str] = {}
+        self.sample_count = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.monotonic()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                self.thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.samples.setdefault(thread_id, Counter())[self._stack(frame)] += 1
+            self.sample_count += 1
+
+    @staticmethod
+    def _stack(frame) -> Tuple[Frame, ...]:
+        """Root-first stack of (function, file, first line) keys"""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _thread_label(self, thread_id: int) -> str:
+        return f"{self.thread_names.get(thread_id, 'thread')} ({thread_id})"
+
+    def to_speedscope(self, name: str) -> dict:
+        frames: List[dict] = []
+        frame_index: Dict[Frame, int] = {}
+        profiles = []
+        duration = (self.stopped_at or time.monotonic()) - (self.started_at or time.monotonic())
+
+        for thread_id, stacks in self.samples.items():
+            samples, weights = [], []
+            for stack, count in stacks.items():
+                indexes = []
+                for frame in stack:
+                    if frame not in frame_index:
+                        frame_index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    indexes.append(frame_index[frame])
+                samples.append(indexes)
+                weights.append(count * self.interval)
+            profiles.append({
+                "type": "sampled",
+                "name": self._thread_label(thread_id),
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(duration, 6),
+                "samples": samples,
+                "weights": weights
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "app-image-generator",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles
+        }
+
+    def to_collapsed(self) -> str:
+        """One ``thread;frame;...;frame count`` line per distinct stack"""
+        lines = []
+        for thread_id, stacks in self.samples.items():
+            label = self._thread_label(thread_id).replace(" ", "_")
+            for stack, count in stacks.items():
+                path = ";".join(f"{function} ({file}:{line})" for function, file, line in stack)
+                lines.append(f"{label};{path} {count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, name: str, output_format: str = "speedscope") -> Tuple[bytes, str]:
+        """Profile body and content type"""
+        if output_format == "collapsed":
+            return self.to_collapsed().encode(), "text/plain; charset=utf-8"
+        return json.dumps(self.to_speedscope(name)).encode(), "application/json"
+
+
+class ProfilingMiddleware:
+    """Profiles a single request that carries a valid ``X-Profile-Token``.
+
+    The route runs to completion, including a streamed body, and the
+    client gets the profile instead of the route's response; the route's
+    status code is in ``X-Profiled-Status``. Requests without the header
+    pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(PROFILE_ROUTE):
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or ())
+        token = headers.get(PROFILE_HEADER.encode())
+        if token is None or not token_matches(token.decode("latin-1")):
+            return await self.app(scope, receive, send)
+
+        response = {"status": None}
+
+        async def discard(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        output_format = headers.get(b"x-profile-format", b"speedscope").decode("latin-1")
+        name = f"{scope['method']} {scope['path']}"
+        body, content_type = profiler.export(name, output_format)
+        logger.info(f"🔬 Profiled {name}: {profiler.sample_count} samples")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profiled-status", str(response["status"]).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
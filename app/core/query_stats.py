@@ -0,0 +1,198 @@
+"""
+SQL query instrumentation.
+
+Engine events time every statement and add it to the QueryStats of the
+current request or task, held in a context variable so it follows the
+route into the threadpool and ingestion into ``asyncio.to_thread``.
+Statements slower than DB_SLOW_QUERY_THRESHOLD are logged with their
+fingerprint (the SQL with whitespace, literals and IN lists normalised)
+and bound parameters. A request that runs the same SELECT fingerprint
+DB_N_PLUS_ONE_THRESHOLD times or more is flagged as a likely N+1.
+
+``max_queries`` asserts a query budget around any block of code, for the
+scripts in app/test.
+"""
+import contextvars
+import hashlib
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging_setup import get_logger
+from app.core.metrics import counter, histogram
+
+logger = get_logger(__name__)
+
+query_seconds = histogram(
+    "db_query_seconds",
+    "Duration of SQL statements",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+queries_per_request = histogram(
+    "db_queries_per_request",
+    "SQL statements issued while handling a request",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+n_plus_one_total = counter("db_n_plus_one_total", "Requests that repeated a SELECT like an N+1", ["endpoint"])
+
+_IN_LIST = re.compile(r"\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r"\s+")
+
+_current: contextvars.ContextVar[Optional["QueryStats"]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def normalize_statement(statement: str) -> str:
+    normalized = _STRING.sub("?", statement)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _IN_LIST.sub("(?+)", normalized)
+    return _SPACE.sub(" ", normalized).strip()
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:12]
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    rows: int = 0
+    selects: Counter = field(default_factory=Counter)
+    statements: dict = field(default_factory=dict)
+
+    def record(self, statement: str, elapsed: float, rows: int):
+        self.count += 1
+        self.seconds += elapsed
+        self.rows += max(rows, 0)
+        key = fingerprint(statement)
+        self.statements.setdefault(key, normalize_statement(statement))
+        if statement.lstrip()[:6].upper() == "SELECT":
+            self.selects[key] += 1
+
+    def repeated_selects(self, threshold: int) -> List[Tuple[str, int]]:
+        """``(fingerprint, count)`` of SELECTs run at least ``threshold`` times"""
+        return [(key, count) for key, count in self.selects.most_common() if count >= threshold]
+
+    def as_dict(self) -> dict:
+        return {"queries": self.count, "db_seconds": round(self.seconds, 4), "rows": self.rows}
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Collect the statements run in this context, including threads started from it"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def track_task_queries() -> QueryStats:
+    """Collect the statements of the rest of the current asyncio task, which has its own context"""
+    stats = QueryStats()
+    _current.set(stats)
+    return stats
+
+
+@contextmanager
+def max_queries(limit: int) -> Iterator[QueryStats]:
+    """Fail with AssertionError if the block runs more than ``limit`` statements"""
+    with track_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        statements = "\n  ".join(stats.statements.values())
+        raise AssertionError(f"Expected at most {limit} queries, ran {stats.count}:\n  {statements}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    query_seconds.observe(elapsed)
+
+    stats = _current.get()
+    if stats is not None:
+        # DB-API rowcount: rows written, and for MySQL also rows selected
+        stats.record(statement, elapsed, getattr(cursor, "rowcount", 0) or 0)
+
+    if elapsed >= settings.DB_SLOW_QUERY_THRESHOLD:
+        logger.warning(
+            "🐢 Slow query",
+            seconds=round(elapsed, 4),
+            fingerprint=fingerprint(statement),
+            statement=normalize_statement(statement)[:1000],
+            parameters=repr(parameters)[:500]
+        )
+
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    if not settings.DB_QUERY_STATS_ENABLED or event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def report(stats: QueryStats, endpoint: str, **context):
+    """Record a request's totals and flag repeated SELECTs"""
+    queries_per_request.labels(endpoint).observe(stats.count)
+    for key, count in stats.repeated_selects(settings.DB_N_PLUS_ONE_THRESHOLD):
+        n_plus_one_total.labels(endpoint).inc()
+        logger.warning(
+            "⚠️ Possible N+1 query",
+            endpoint=endpoint,
+            fingerprint=key,
+            repeats=count,
+            statement=stats.statements[key][:1000],
+            **context
+        )
+    if stats.count:
+        logger.debug("🗄️ Request queries", endpoint=endpoint, **stats.as_dict(), **context)
+
+
+class QueryStatsMiddleware:
+    """Tracks the queries of each HTTP request.
+
+    Totals are reported per endpoint once the response is sent, and the
+    ones issued before the response started go out in ``Server-Timing``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with track_queries() as stats:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start" and stats.count:
+                    headers = list(message.get("headers") or ())
+                    headers.append((
+                        b"server-timing",
+                        f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries"'.encode()
+                    ))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                endpoint = getattr(scope.get("endpoint"), "__name__", "unmatched")
+                report(stats, endpoint, path=scope.get("path"))
@@ -0,0 +1,195 @@
+"""
+Retries and circuit breaking for calls to the Space.
+
+Every Space call goes through ``call_space_async`` on the event loop. Idempotent calls are retried with
+jittered exponential backoff on connection errors, timeouts, 429 and 5xx.
+After SPACE_BREAKER_FAILURE_THRESHOLD consecutive failures the breaker
+opens and calls fail immediately with ``CircuitOpenError`` until
+SPACE_BREAKER_RESET_TIMEOUT has passed, when a single probe is let through.
+"""
+import asyncio
+import threading
+import time
+from typing import Callable, Dict
+import logging
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from app.core.config import settings
+from app.core.metrics import counter, gauge
+from app.schemas.errors import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+breaker_state = gauge("space_circuit_state", "Space circuit breaker state (0 closed, 1 half-open, 2 open)", ["backend"])
+breaker_trips = counter("space_circuit_trips_total", "Times the Space circuit breaker opened", ["backend"])
+calls_total = counter("space_calls_total", "Space calls by outcome", ["operation", "outcome"])
+retries_total = counter("space_retries_total", "Retried Space call attempts", ["operation"])
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpenError unless the call may go to the Space"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                self._set_state(HALF_OPEN)
+
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+
+        raise CircuitOpenError(
+            f"Space API circuit is open after {self.failures} consecutive failures",
+            retry_after=max(remaining, 0)
+        )
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != CLOSED:
+                logger.info(f"✅ Space circuit '{self.name}' closed")
+                self._set_state(CLOSED)
+
+    def record_neutral(self):
+        """The call failed for a reason that says nothing about the Space"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"⚠️ Space circuit '{self.name}' opened after {self.failures} failures")
+                    breaker_trips.labels(self.name).inc()
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        breaker_state.labels(self.name).set(_STATE_VALUES[state])
+
+    def as_dict(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str = "space") -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                settings.SPACE_BREAKER_FAILURE_THRESHOLD,
+                settings.SPACE_BREAKER_RESET_TIMEOUT
+            )
+        return _breakers[name]
+
+
+def breakers_snapshot() -> dict:
+    return {name: breaker.as_dict() for name, breaker in list(_breakers.items())}
+
+
+class RetryableStatus(Exception):
+    """A Space response with a status worth retrying"""
+    def __init__(self, response, status: int):
+        super().__init__(f"Space API returned status code {status}")
+        self.response = response
+        self.status = status
+
+
+def _is_transient_async(exc: BaseException) -> bool:
+    import aiohttp
+    return isinstance(exc, (RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+
+def _retry_policy(operation: str, idempotent: bool, is_transient: Callable) -> dict:
+    def count_retry(retry_state):
+        retries_total.labels(operation).inc()
+        logger.warning(
+            f"🔁 Retrying Space {operation} (attempt {retry_state.attempt_number + 1}): "
+            f"{retry_state.outcome.exception()}"
+        )
+
+    return dict(
+        stop=stop_after_attempt(settings.SPACE_RETRY_ATTEMPTS if idempotent else 1),
+        wait=wait_random_exponential(
+            multiplier=settings.SPACE_RETRY_BACKOFF_BASE,
+            max=settings.SPACE_RETRY_BACKOFF_MAX
+        ),
+        retry=retry_if_exception(is_transient),
+        before_sleep=count_retry,
+        reraise=True
+    )
+
+
+def _check_status(response, status: int, breaker: CircuitBreaker):
+    if status in RETRYABLE_STATUS:
+        breaker.record_failure()
+        raise RetryableStatus(response, status)
+    breaker.record_success()
+    return response
+
+
+async def call_space_async(operation: str, request: Callable, idempotent: bool = True, breaker: str = "space"):
+    """Run an aiohttp call with retries and the circuit breaker; ``request`` returns an awaitable response.
+
+    Returns the response; a retryable status that persists after the last
+    attempt is returned as a response too, so callers map it as before.
+    """
+    circuit = get_breaker(breaker)
+
+    async def attempt():
+        circuit.before_call()
+        try:
+            response = await request()
+        except Exception as e:
+            if _is_transient_async(e):
+                circuit.record_failure()
+            else:
+                circuit.record_neutral()
+            raise
+        if response.status in RETRYABLE_STATUS:
+            await response.read()
+        return _check_status(response, response.status, circuit)
+
+    try:
+        async for attempt_state in AsyncRetrying(**_retry_policy(operation, idempotent, _is_transient_async)):
+            with attempt_state:
+                response = await attempt()
+        calls_total.labels(operation, "success").inc()
+        return response
+    except RetryableStatus as e:
+        calls_total.labels(operation, "error_status").inc()
+        return e.response
+    except CircuitOpenError:
+        calls_total.labels(operation, "circuit_open").inc()
+        raise
+    except Exception:
+        calls_total.labels(operation, "error").inc()
+        raise
@@ -1,19 +1,30 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime
 from typing import Optional
 import logging
 
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 class TaskScheduler:
     def __init__(self):
         self.scheduler: Optional[AsyncIOScheduler] = None
 
+    def _running_scheduler(self) -> AsyncIOScheduler:
+        """One scheduler for all jobs, so shutdown_scheduler stops every one of them"""
+        if self.scheduler is None:
+            self.scheduler = AsyncIOScheduler()
+        if not self.scheduler.running:
+            self.scheduler.start()
+        return self.scheduler
+
     def start_midnight_scheduler(self, app, cleanup_function):
         """Start the scheduler with midnight cleanup."""
         try:
-            self.scheduler = AsyncIOScheduler()
-            self.scheduler.add_job(
+            self._running_scheduler().add_job(
                 cleanup_function,
                 trigger=CronTrigger(hour=0, minute=0, second=0),
                 args=[app],
@@ -22,7 +33,6 @@ class TaskScheduler:
                 replace_existing=True
             )
             
-            self.scheduler.start()
             logger.info("✅ Task scheduler started successfully")
             logger.info("⏰ Scheduled task cleanup: Daily at 00:00 (midnight)")
             
@@ -33,8 +43,7 @@ class TaskScheduler:
     def start_weekly_scheduler(self, app, cleanup_function):
         """Start the scheduler with weekly cleanup."""
         try:
-            self.scheduler = AsyncIOScheduler()
-            self.scheduler.add_job(
+            self._running_scheduler().add_job(
                 cleanup_function,
                 trigger=CronTrigger(day_of_week='sun', hour=23, minute=59, second=59),
                 args=[app],
@@ -43,7 +52,6 @@ class TaskScheduler:
                 replace_existing=True
             )
             
-            self.scheduler.start()
             logger.info("✅ Db scheduler started successfully")
             logger.info("⏰ Scheduled db cleanup: every sunday at 23:59:59")
             
@@ -51,6 +59,133 @@ class TaskScheduler:
             logger.error(f"Failed to start weekly scheduler: {e}")
             raise
 
+    def start_reaper_scheduler(self, app, reaper_function):
+        """Start the scheduler with the stale task reaper."""
+        try:
+            self._running_scheduler().add_job(
+                reaper_function,
+                trigger=IntervalTrigger(seconds=settings.REAPER_INTERVAL),
+                args=[app],
+                id="stale_task_reaper",
+                name="Fail tasks stuck in pending or processing",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
+            logger.info("✅ Reaper scheduler started successfully")
+            logger.info(f"⏰ Scheduled stale task reaper: every {settings.REAPER_INTERVAL}s")
+            
+        except Exception as e:
+            logger.error(f"Failed to start reaper scheduler: {e}")
+            raise
+
+    def start_history_scheduler(self, app, history_function):
+        """Start the scheduler with the task history mover."""
+        try:
+            self._running_scheduler().add_job(
+                history_function,
+                trigger=IntervalTrigger(seconds=settings.TASK_HISTORY_INTERVAL),
+                args=[app],
+                id="task_history_mover",
+                name="Move finished tasks to tasks_history",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
+            logger.info("✅ History scheduler started successfully")
+            logger.info(f"⏰ Scheduled task history mover: every {settings.TASK_HISTORY_INTERVAL}s")
+            
+        except Exception as e:
+            logger.error(f"Failed to start history scheduler: {e}")
+            raise
+
+    def start_archive_scheduler(self, app, archive_function):
+        """Start the scheduler with the image archiver."""
+        try:
+            self._running_scheduler().add_job(
+                archive_function,
+                trigger=IntervalTrigger(seconds=settings.ARCHIVE_INTERVAL),
+                args=[app],
+                id="image_archiver",
+                name="Pack old images into archive files",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
+            logger.info("✅ Archive scheduler started successfully")
+            logger.info(f"⏰ Scheduled image archiver: every {settings.ARCHIVE_INTERVAL}s")
+            
+        except Exception as e:
+            logger.error(f"Failed to start archive scheduler: {e}")
+            raise
+
+    def start_similarity_scheduler(self, app, backfill_function):
+        """Start the scheduler with the perceptual hash backfill."""
+        try:
+            self._running_scheduler().add_job(
+                backfill_function,
+                trigger=IntervalTrigger(seconds=settings.SIMILARITY_BACKFILL_INTERVAL),
+                args=[app],
+                id="image_hash_backfill",
+                name="Hash images saved without a perceptual hash",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
+            logger.info("✅ Similarity scheduler started successfully")
+            logger.info(f"⏰ Scheduled image hash backfill: every {settings.SIMILARITY_BACKFILL_INTERVAL}s")
+            
+        except Exception as e:
+            logger.error(f"Failed to start similarity scheduler: {e}")
+            raise
+
+    def start_deletion_scheduler(self, app, deletion_function):
+        """Start the scheduler with the deletion job runner."""
+        try:
+            self._running_scheduler().add_job(
+                deletion_function,
+                trigger=IntervalTrigger(seconds=settings.DELETE_JOB_INTERVAL),
+                args=[app],
+                id="deletion_jobs",
+                name="Run pending and abandoned bulk deletion jobs",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            
+            logger.info("✅ Deletion scheduler started successfully")
+            logger.info(f"⏰ Scheduled deletion jobs: every {settings.DELETE_JOB_INTERVAL}s")
+            
+        except Exception as e:
+            logger.error(f"Failed to start deletion scheduler: {e}")
+            raise
+
+    def start_webhook_scheduler(self, app, redelivery_function):
+        """Start the scheduler with the abandoned webhook redelivery, first run at startup."""
+        try:
+            self._running_scheduler().add_job(
+                redelivery_function,
+                trigger=IntervalTrigger(seconds=settings.WEBHOOK_REDELIVERY_INTERVAL),
+                args=[app],
+                id="webhook_redelivery",
+                name="Send again webhook deliveries abandoned by stopped workers",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+                next_run_time=datetime.now()
+            )
+            
+            logger.info("✅ Webhook redelivery scheduler started successfully")
+            logger.info(f"⏰ Scheduled webhook redelivery: every {settings.WEBHOOK_REDELIVERY_INTERVAL}s")
+            
+        except Exception as e:
+            logger.error(f"Failed to start webhook redelivery scheduler: {e}")
+            raise
+
     def shutdown_scheduler(self):
         """Shutdown the scheduler."""
         if self.scheduler:
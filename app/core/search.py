@@ -0,0 +1,319 @@
+"""
+Full-text search over image prompts.
+
+On MySQL the ``images.prompt`` column has a FULLTEXT index (migration
+0008) and searches run MATCH ... AGAINST in natural language mode, so
+there is nothing to keep in sync. Every other database (SQL Server in
+development, SQLite in app/test) gets a SQLite FTS5 sidecar at
+SEARCH_INDEX_PATH, fed by ``save_image_to_db`` and backfilled from the
+images table the first time it is searched. The sidecar also keeps
+whether each image is a duplicate, so ``collapse`` filters in FTS5 itself;
+the writers of ``images.duplicate_of`` keep that flag in sync.
+
+Results are ranked by relevance, ties broken by newest id, and paged
+with an opaque cursor holding the ``(score, id)`` of the last result, so
+a page costs the same however deep the client scrolls.
+"""
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK = 1000
+# bump when the image_search columns change; the sidecar is rebuilt from the images table
+SCHEMA_VERSION = "2"
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+Cursor = Tuple[float, int]
+
+
+def encode_cursor(score: float, image_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, image_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Raises ValueError for anything that ``encode_cursor`` did not produce"""
+    try:
+        score, image_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(score), int(image_id)
+    except Exception:
+        raise ValueError("Invalid search cursor")
+
+
+def search_terms(q: str) -> List[str]:
+    return _TOKEN.findall(q.lower())
+
+
+def image_row_columns():
+    """Columns of the rows ``serialize_images_slice`` takes"""
+    from app.models.db_models import Image
+
+    return (
+        Image.id, Image.task_id, Image.prompt, Image.image_path,
+        Image.image_data, Image.model_used, Image.created_at, Image.archive_key
+    )
+
+
+class SearchIndex:
+    def add(self, image_id: int, prompt: Optional[str], model_used: Optional[str], duplicate: bool = False):
+        """Index a new image; the image row may still be uncommitted"""
+
+    def mark_duplicates(self, image_ids: Iterable[int], duplicate: bool = True):
+        """Record that ``duplicate_of`` was set (or cleared) on already indexed images"""
+
+    def remove(self, image_ids: Iterable[int]):
+        pass
+
+    def clear(self):
+        pass
+
+    def count(self, q: str, model: Optional[str], db, task_id: Optional[str] = None, collapse: bool = False) -> int:
+        raise NotImplementedError
+
+    def search(
+        self, q: str, model: Optional[str], limit: int, after: Optional[Cursor], db,
+        task_id: Optional[str] = None, collapse: bool = False
+    ) -> List[Tuple[int, float, Optional[tuple]]]:
+        """Up to ``limit`` ``(image id, score, image row)`` ranked after ``after``.
+
+        ``task_id`` keeps the images of one task; ``collapse`` drops images marked ``duplicate_of``
+        another. The row is None for an image deleted since it was indexed.
+        """
+        raise NotImplementedError
+
+
+class MySQLFullTextIndex(SearchIndex):
+    """MATCH ... AGAINST on the FULLTEXT index of images.prompt, maintained by MySQL itself"""
+
+    def _query(self, q: str, model: Optional[str], task_id: Optional[str], collapse: bool, columns, db):
+        from sqlalchemy.dialects.mysql import match
+        from app.models.db_models import Image
+
+        score = match(Image.prompt, against=q).in_natural_language_mode()
+        query = db.query(*columns(score)).filter(score)
+        if model:
+            query = query.filter(Image.model_used == model)
+        if task_id:
+            query = query.filter(Image.task_id == task_id)
+        if collapse:
+            query = query.filter(Image.duplicate_of.is_(None))
+        return query, score
+
+    def count(self, q, model, db, task_id=None, collapse=False):
+        from sqlalchemy import func
+        from app.models.db_models import Image
+
+        query, _ = self._query(q, model, task_id, collapse, lambda score: (func.count(Image.id),), db)
+        return query.scalar()
+
+    def search(self, q, model, limit, after, db, task_id=None, collapse=False):
+        from sqlalchemy import and_, or_
+        from app.models.db_models import Image
+
+        query, score = self._query(
+            q, model, task_id, collapse, lambda score: (*image_row_columns(), score.label("score")), db
+        )
+        if after is not None:
+            after_score, after_id = after
+            query = query.filter(or_(score < after_score, and_(score == after_score, Image.id < after_id)))
+        rows = query.order_by(score.desc(), Image.id.desc()).limit(limit).all()
+        return [(row.id, float(row.score), tuple(row[:-1])) for row in rows]
+
+
+class SQLiteSearchIndex(SearchIndex):
+    """FTS5 table in a sidecar SQLite file, rowid = image id, ranked by bm25"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._built = False
+        # entries of deleted images are pruned once per process, and again after a failed removal
+        self._pruned = False
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT)")
+            version = connection.execute("SELECT value FROM search_meta WHERE key = 'schema'").fetchone()
+            if version is None or version[0] != SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS image_search")
+                connection.execute("DELETE FROM search_meta WHERE key = 'backfilled'")
+                connection.execute(
+                    "INSERT OR REPLACE INTO search_meta (key, value) VALUES ('schema', ?)", (SCHEMA_VERSION,)
+                )
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS image_search "
+                "USING fts5(prompt, model_used UNINDEXED, duplicate UNINDEXED, tokenize='porter unicode61')"
+            )
+            self._local.connection = connection
+        return connection
+
+    def _insert(self, rows: Iterable[tuple]):
+        self._connection().executemany(
+            "INSERT OR REPLACE INTO image_search (rowid, prompt, model_used, duplicate) VALUES (?, ?, ?, ?)", rows
+        )
+
+    def add(self, image_id, prompt, model_used, duplicate=False):
+        self._insert([(image_id, prompt or "", model_used, int(duplicate))])
+
+    def mark_duplicates(self, image_ids, duplicate=True):
+        self._connection().executemany(
+            "UPDATE image_search SET duplicate = ? WHERE rowid = ?", [(int(duplicate), i) for i in image_ids]
+        )
+
+    def remove(self, image_ids):
+        try:
+            self._connection().executemany("DELETE FROM image_search WHERE rowid = ?", [(i,) for i in image_ids])
+        except Exception:
+            self._pruned = False
+            raise
+
+    def clear(self):
+        try:
+            connection = self._connection()
+            connection.execute("DELETE FROM image_search")
+            connection.execute("DELETE FROM search_meta WHERE key = 'backfilled'")
+        except Exception:
+            self._pruned = False
+            raise
+        self._built = False
+
+    def _ensure_built(self, db):
+        """Index the images saved before this sidecar existed, once, and prune entries of deleted images"""
+        if self._built and self._pruned:
+            return
+        connection = self._connection()
+        if connection.execute("SELECT 1 FROM search_meta WHERE key = 'backfilled'").fetchone() is None:
+            from app.models.db_models import Image
+
+            indexed = 0
+            rows = db.query(Image.id, Image.prompt, Image.model_used, Image.duplicate_of).yield_per(BACKFILL_CHUNK)
+            chunk = []
+            for image_id, prompt, model_used, duplicate_of in rows:
+                chunk.append((image_id, prompt or "", model_used, int(duplicate_of is not None)))
+                if len(chunk) >= BACKFILL_CHUNK:
+                    self._insert(chunk)
+                    indexed += len(chunk)
+                    chunk = []
+            self._insert(chunk)
+            indexed += len(chunk)
+            connection.execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('backfilled', '1')")
+            logger.info(f"🔎 Search index backfilled with {indexed} images")
+            self._pruned = True
+        self._built = True
+        if not self._pruned:
+            self._prune(db)
+
+    def _prune(self, db):
+        """Remove the entries whose image is gone, e.g. after a removal that failed; they would be counted"""
+        from app.models.db_models import Image
+
+        self._pruned = True
+        connection = self._connection()
+        pruned, after = 0, 0
+        while True:
+            ids = [i for i, in connection.execute(
+                "SELECT rowid FROM image_search WHERE rowid > ? ORDER BY rowid LIMIT ?", (after, BACKFILL_CHUNK)
+            )]
+            if not ids:
+                break
+            after = ids[-1]
+            existing = {i for i, in db.query(Image.id).filter(Image.id.in_(ids))}
+            stale = [i for i in ids if i not in existing]
+            if stale:
+                self.remove(stale)
+                pruned += len(stale)
+        if pruned:
+            logger.info(f"🔎 Search index pruned of {pruned} deleted images")
+
+    @staticmethod
+    def _match(q: str, model: Optional[str], task_id: Optional[str], collapse: bool, db) -> Tuple[str, list]:
+        from app.models.db_models import Image
+
+        # quoted terms, so user input is never parsed as FTS5 query syntax
+        expression = " OR ".join(f'"{term}"' for term in search_terms(q))
+        where, params = "image_search MATCH ?", [expression]
+        if model:
+            where += " AND model_used = ?"
+            params.append(model)
+        if collapse:
+            where += " AND duplicate = 0"
+        # the sidecar has no task ids; the images of one task become an id list read from images,
+        # passed as one JSON array so its length is not bound by SQLite's parameter limit
+        if task_id:
+            where += " AND rowid IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps([i for i, in db.query(Image.id).filter(Image.task_id == task_id)]))
+        return where, params
+
+    def count(self, q, model, db, task_id=None, collapse=False):
+        if not search_terms(q):
+            return 0
+        self._ensure_built(db)
+        where, params = self._match(q, model, task_id, collapse, db)
+        return self._connection().execute(f"SELECT count(*) FROM image_search WHERE {where}", params).fetchone()[0]
+
+    def search(self, q, model, limit, after, db, task_id=None, collapse=False):
+        if not search_terms(q):
+            return []
+        self._ensure_built(db)
+        where, params = self._match(q, model, task_id, collapse, db)
+        sql = f"SELECT id, score FROM (SELECT rowid AS id, -bm25(image_search) AS score FROM image_search WHERE {where})"
+        if after is not None:
+            sql += " WHERE score < ? OR (score = ? AND id < ?)"
+            params += [after[0], after[0], after[1]]
+        sql += " ORDER BY score DESC, id DESC LIMIT ?"
+        ranked = self._connection().execute(sql, params + [limit]).fetchall()
+        if not ranked:
+            return []
+
+        from app.models.db_models import Image
+
+        rows = {row[0]: tuple(row) for row in db.query(*image_row_columns()).filter(Image.id.in_([i for i, _ in ranked]))}
+        stale = [image_id for image_id, _ in ranked if image_id not in rows]
+        if stale:
+            self.remove(stale)
+        return [(image_id, score, rows.get(image_id)) for image_id, score in ranked]
+
+
+_indexes = {}
+
+
+def get_search_index(db) -> SearchIndex:
+    backend = settings.SEARCH_BACKEND
+    if backend == "auto":
+        backend = "mysql" if db.get_bind().dialect.name == "mysql" else "sqlite"
+    if backend not in _indexes:
+        if backend == "mysql":
+            _indexes[backend] = MySQLFullTextIndex()
+        elif backend == "sqlite":
+            _indexes[backend] = SQLiteSearchIndex(settings.SEARCH_INDEX_PATH)
+        else:
+            raise ValueError(f"Unsupported SEARCH_BACKEND '{settings.SEARCH_BACKEND}'")
+    return _indexes[backend]
+
+
+def search_images(
+    q: str, model: Optional[str], limit: int, cursor: Optional[str], db,
+    task_id: Optional[str] = None, collapse: bool = False
+):
+    """``(total matches, image rows, next cursor or None)`` of one page of a search"""
+    index = get_search_index(db)
+    after = decode_cursor(cursor) if cursor else None
+    ranked = index.search(q, model, limit + 1, after, db, task_id, collapse)
+    page = ranked[:limit]
+    next_cursor = None
+    if len(ranked) > limit:
+        last_id, last_score, _ = page[-1]
+        next_cursor = encode_cursor(last_score, last_id)
+    return index.count(q, model, db, task_id, collapse), [row for _, _, row in page if row is not None], next_cursor
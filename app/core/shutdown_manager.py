@@ -1,4 +1,3 @@
-import signal
 import asyncio
 import logging
 from typing import Callable, List
@@ -43,24 +42,6 @@ class ShutdownManager:
         await self._exit_stack.aclose()
         logger.info("Cleanup completed")
     
-    def setup_signal_handlers(self):
-        def signal_handler(signum, frame):
-            logger.info(f"Received signal {signum}, initiating graceful shutdown...")
-            
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    asyncio.create_task(self.run_cleanup())
-                else:
-                    loop.run_until_complete(self.run_cleanup())
-            except (RuntimeError, Exception) as e:
-                logger.error(f"Error during shutdown: {e}")
-                exit(0)
-        
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
-        logger.info("Signal handlers registered (SIGINT, SIGTERM)")
-
     async def aenter_context(self, cm):
         """Enter an async context manager and register for cleanup."""
         return await self._exit_stack.enter_async_context(cm)
@@ -0,0 +1,315 @@
+"""
+Perceptual hashes and near-duplicate lookup.
+
+Each image gets a 64-bit pHash when it is ingested: the 32x32 grayscale
+image is transformed with a 2D DCT and the 8x8 lowest frequencies are
+compared to their median, so re-encodes, small shifts and minor detail
+changes of the same picture land within a few bits of each other. It is
+stored in ``Image.phash`` as a signed BIGINT, and ``Image.duplicate_of``
+records the nearest image hashed before it within DUPLICATE_MAX_DISTANCE
+bits, which is what ``/images?collapse=true`` filters on. Images saved
+before hashing existed are hashed by ``hash_missing_images``.
+
+``HammingIndex`` keeps every hash of a worker in one uint64 array. Radius
+queries use multi-index hashing: the 64 bits are split into four 16-bit
+chunks, and any hash within ``r`` bits of the query matches it in some
+chunk within ``r // 4`` bits, so only the rows found by looking those
+chunk values up in sorted copies of each chunk get their full distance
+computed. Larger radii fall back to a vectorized scan of the whole array.
+Pillow and NumPy are imported on first use.
+"""
+import threading
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+# chunk radius above which enumerating neighbouring chunk values costs more than a scan
+MAX_CHUNK_RADIUS = 3
+# new hashes are scanned linearly until there are this many, then merged into the chunk tables
+TAIL_MERGE_SIZE = 4096
+
+
+def to_signed(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+@lru_cache(maxsize=1)
+def _dct_matrix():
+    import numpy as np
+
+    n = np.arange(DCT_SIZE)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * DCT_SIZE))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def phash(raw: bytes) -> int:
+    """64-bit perceptual hash of an encoded image, unsigned"""
+    import io
+    import numpy as np
+    from PIL import Image as PILImage
+
+    with PILImage.open(io.BytesIO(raw)) as image:
+        pixels = np.asarray(
+            image.convert("L").resize((DCT_SIZE, DCT_SIZE), PILImage.LANCZOS), dtype=np.float64
+        )
+    dct = _dct_matrix()
+    low = (dct @ pixels @ dct.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # the DC term is the mean brightness, it does not describe the picture
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+@lru_cache(maxsize=1)
+def _popcount_table():
+    """Set bits of every 16-bit value; NumPy 1.24 has no bitwise_count"""
+    import numpy as np
+
+    table = np.zeros(1 << CHUNK_BITS, dtype=np.uint8)
+    for bit in range(CHUNK_BITS):
+        table[1 << bit:1 << (bit + 1)] = table[:1 << bit] + 1
+    return table
+
+
+def hamming(hashes, query: int):
+    """Bits differing between each uint64 of ``hashes`` and ``query``"""
+    import numpy as np
+
+    differences = np.bitwise_xor(hashes, np.uint64(query))
+    return _popcount_table()[differences.view(np.uint16)].reshape(-1, CHUNKS).sum(axis=1, dtype=np.uint8)
+
+
+@lru_cache(maxsize=MAX_CHUNK_RADIUS + 1)
+def _chunk_masks(radius: int):
+    """Every 16-bit value with at most ``radius`` bits set"""
+    import numpy as np
+
+    return np.flatnonzero(_popcount_table() <= radius).astype(np.uint32)
+
+
+class HammingIndex:
+    """Immutable snapshot of ``(ids, hashes)``; ``with_rows`` returns an extended copy"""
+
+    def __init__(self, ids=None, hashes=None, tail_ids=None, tail_hashes=None):
+        import numpy as np
+
+        self.ids = np.asarray(ids if ids is not None else [], dtype=np.int64)
+        self.hashes = np.asarray(hashes if hashes is not None else [], dtype=np.uint64)
+        self.tail_ids = np.asarray(tail_ids if tail_ids is not None else [], dtype=np.int64)
+        self.tail_hashes = np.asarray(tail_hashes if tail_hashes is not None else [], dtype=np.uint64)
+        self._tables = []
+        for chunk in range(CHUNKS):
+            values = ((self.hashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(0xFFFF)).astype(np.uint16)
+            order = np.argsort(values, kind="stable")
+            self._tables.append((values[order], order))
+
+    def __len__(self):
+        return len(self.ids) + len(self.tail_ids)
+
+    def with_rows(self, ids, hashes) -> "HammingIndex":
+        import numpy as np
+
+        tail_ids = np.concatenate([self.tail_ids, np.asarray(ids, dtype=np.int64)])
+        tail_hashes = np.concatenate([self.tail_hashes, np.asarray(hashes, dtype=np.uint64)])
+        if len(tail_ids) < TAIL_MERGE_SIZE:
+            return HammingIndex(self.ids, self.hashes, tail_ids, tail_hashes)
+        return HammingIndex(np.concatenate([self.ids, tail_ids]), np.concatenate([self.hashes, tail_hashes]))
+
+    def _candidates(self, query: int, radius: int):
+        """Positions in ``hashes`` sharing a chunk with ``query`` within ``radius // CHUNKS`` bits"""
+        import numpy as np
+
+        masks = _chunk_masks(radius // CHUNKS)
+        found = []
+        for chunk, (values, order) in enumerate(self._tables):
+            neighbours = (((query >> (chunk * CHUNK_BITS)) & 0xFFFF) ^ masks).astype(np.uint16)
+            starts = np.searchsorted(values, neighbours, side="left")
+            ends = np.searchsorted(values, neighbours, side="right")
+            found.extend(order[start:end] for start, end in zip(starts, ends) if end > start)
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def within(self, query: int, radius: int) -> List[Tuple[int, int]]:
+        """``(id, distance)`` of every hash within ``radius`` bits, nearest first, then newest"""
+        import numpy as np
+
+        if radius // CHUNKS <= MAX_CHUNK_RADIUS:
+            positions = self._candidates(query, radius)
+            ids, hashes = self.ids[positions], self.hashes[positions]
+        else:
+            ids, hashes = self.ids, self.hashes
+        ids = np.concatenate([ids, self.tail_ids])
+        distances = hamming(np.concatenate([hashes, self.tail_hashes]), query)
+
+        close = distances <= radius
+        ids, distances = ids[close], distances[close]
+        ids, first = np.unique(ids, return_index=True)
+        distances = distances[first]
+        order = np.lexsort((-ids, distances))
+        return [(int(ids[i]), int(distances[i])) for i in order]
+
+
+class SimilarityIndex:
+    """The HammingIndex of this worker, loaded from the images table and topped up with new rows"""
+
+    def __init__(self):
+        self._index: Optional[HammingIndex] = None
+        self._max_id = 0
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self, db) -> HammingIndex:
+        """The index including every image hashed up to now; reloads fully every SIMILARITY_INDEX_TTL"""
+        from app.models.db_models import Image
+
+        with self._lock:
+            if self._index is None or time.monotonic() - self._loaded_at > settings.SIMILARITY_INDEX_TTL:
+                started = time.perf_counter()
+                rows = db.query(Image.id, Image.phash).filter(Image.phash.isnot(None)).order_by(Image.id).all()
+                self._index = HammingIndex(*self._columns(rows))
+                self._max_id = rows[-1][0] if rows else 0
+                self._loaded_at = time.monotonic()
+                logger.info(f"🧬 Similarity index loaded: {len(rows)} hashes in {time.perf_counter() - started:.2f}s")
+            else:
+                rows = (
+                    db.query(Image.id, Image.phash)
+                    .filter(Image.id > self._max_id, Image.phash.isnot(None))
+                    .order_by(Image.id)
+                    .all()
+                )
+                if rows:
+                    self._index = self._index.with_rows(*self._columns(rows))
+                    self._max_id = rows[-1][0]
+            return self._index
+
+    def add(self, image_id: int, image_hash: int):
+        """Make a hash searchable right away, before the next top-up reads it back"""
+        with self._lock:
+            if self._index is not None:
+                self._index = self._index.with_rows([image_id], [to_unsigned(image_hash)])
+
+    @staticmethod
+    def _columns(rows):
+        return [row[0] for row in rows], [to_unsigned(row[1]) for row in rows]
+
+    def find_duplicate(self, image_hash: int, db) -> Optional[int]:
+        """Id of the closest indexed image within DUPLICATE_MAX_DISTANCE bits, if any"""
+        matches = self.current(db).within(to_unsigned(image_hash), settings.DUPLICATE_MAX_DISTANCE)
+        return matches[0][0] if matches else None
+
+
+similarity_index = SimilarityIndex()
+
+
+def fingerprint(db, raw: Optional[bytes] = None, path: Optional[str] = None, image_data: Optional[str] = None) -> Tuple[Optional[int], Optional[int]]:
+    """``(phash, duplicate_of)`` of a new image given as bytes, a file or inline base64.
+
+    The hash is signed, as stored; ``(None, None)`` if the image cannot be read or decoded.
+    """
+    from app.core.archive import decode_image_data
+
+    if not settings.SIMILARITY_ENABLED:
+        return None, None
+    try:
+        if raw is None and path:
+            with open(path, "rb") as f:
+                raw = f.read()
+        elif raw is None and image_data:
+            raw = decode_image_data(image_data)
+        if raw is None:
+            return None, None
+        image_hash = to_signed(phash(raw))
+        return image_hash, similarity_index.find_duplicate(image_hash, db)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not hash image: {e}")
+        return None, None
+
+
+def similar_images(image_id: int, limit: int, max_distance: int, db):
+    """``(image rows, distances)`` of the images nearest to ``image_id``; None if it has no hash"""
+    from app.core.search import image_row_columns
+    from app.models.db_models import Image
+
+    image_hash = db.query(Image.phash).filter(Image.id == image_id).scalar()
+    if image_hash is None:
+        return None
+    matches = [
+        (match_id, distance)
+        for match_id, distance in similarity_index.current(db).within(to_unsigned(image_hash), max_distance)
+        if match_id != image_id
+    ][:limit]
+    if not matches:
+        return [], []
+    rows = {row[0]: row for row in db.query(*image_row_columns()).filter(Image.id.in_([i for i, _ in matches]))}
+    found = [(rows[match_id], distance) for match_id, distance in matches if match_id in rows]
+    return [row for row, _ in found], [distance for _, distance in found]
+
+
+def hash_missing_images(db) -> int:
+    """Hash images saved without a phash, SIMILARITY_BACKFILL_BATCH at a time; returns how many got one"""
+    from sqlalchemy import update
+    from app.core.archive import read_archived_image
+    from app.core.image_store import image_store
+    from app.core.search import get_search_index
+    from app.models.db_models import Image
+
+    hashed = 0
+    after = 0
+    while True:
+        rows = (
+            db.query(
+                Image.id, Image.image_path, Image.archive_key, Image.archive_offset,
+                Image.archive_length, Image.archive_codec
+            )
+            .filter(Image.phash.is_(None), Image.id > after)
+            .order_by(Image.id)
+            .limit(settings.SIMILARITY_BACKFILL_BATCH)
+            .all()
+        )
+        if not rows:
+            return hashed
+        duplicates = []
+        for image_id, image_path, archive_key, archive_offset, archive_length, archive_codec in rows:
+            after = image_id
+            if archive_key:
+                try:
+                    raw = read_archived_image(archive_key, archive_offset, archive_length, archive_codec)
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not read archived image {image_id}: {e}")
+                    continue
+                image_hash, duplicate_of = fingerprint(db, raw=raw)
+            elif image_path and image_store.exists(image_path):
+                image_hash, duplicate_of = fingerprint(db, path=image_path)
+            else:
+                # one payload at a time, the LONGTEXT column is never loaded for the whole batch
+                image_data = db.query(Image.image_data).filter(Image.id == image_id).scalar()
+                image_hash, duplicate_of = fingerprint(db, image_data=image_data)
+            if image_hash is None:
+                continue
+            db.execute(
+                update(Image).where(Image.id == image_id).values(phash=image_hash, duplicate_of=duplicate_of)
+            )
+            db.commit()
+            similarity_index.add(image_id, image_hash)
+            if duplicate_of is not None:
+                duplicates.append(image_id)
+            hashed += 1
+        if duplicates:
+            try:
+                get_search_index(db).mark_duplicates(duplicates)
+            except Exception as e:
+                logger.warning(f"⚠️ Duplicates not marked in the search index: {e}")
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class WarmupState:
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    db_connections: int = 0
+    upstream_connections: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def as_dict(self) -> dict:
+        duration = None
+        if self.started_at is not None:
+            duration = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        return {
+            "ready": self.ready,
+            "duration_seconds": duration,
+            "db_connections": self.db_connections,
+            "upstream_connections": self.upstream_connections,
+            "errors": self.errors
+        }
+
+warmup_state = WarmupState()
+
+def _warm_db_pool(count: int) -> int:
+    """Check out ``count`` connections at once so the pool opens them, then return them"""
+    from app.core.database import get_engine
+
+    engine = get_engine()
+    pool_size = getattr(engine.pool, "size", lambda: count)()
+    count = min(count, pool_size)
+
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(engine.connect())
+    finally:
+        for conn in connections:
+            conn.close()
+    return len(connections)
+
+async def _warm_async_upstream(count: int) -> int:
+    from app.core.http_client import get_upstream_session, space_headers
+
+    session = get_upstream_session()
+
+    async def ping(url):
+        async with session.get(f"{url}/health", headers=space_headers()) as response:
+            await response.read()
+            return response.status
+
+    statuses = await asyncio.gather(*(ping(url) for url in settings.space_urls for _ in range(count)))
+    return len(statuses)
+
+async def warm_up(state: WarmupState = warmup_state):
+    """Open pooled DB and upstream connections (M per backend) before the worker reports ready.
+
+    Failures are recorded on the state but do not keep the worker unready:
+    warm-up only moves connection setup off the first requests.
+    """
+    state.started_at = time.monotonic()
+    logger.info(
+        f"🔥 Warming up {settings.WARMUP_DB_CONNECTIONS} DB and "
+        f"{settings.WARMUP_UPSTREAM_CONNECTIONS} upstream connections..."
+    )
+
+    async def warm_db():
+        if settings.WARMUP_DB_CONNECTIONS > 0:
+            state.db_connections = await asyncio.to_thread(_warm_db_pool, settings.WARMUP_DB_CONNECTIONS)
+
+    async def warm_upstream():
+        count = settings.WARMUP_UPSTREAM_CONNECTIONS
+        if count > 0:
+            state.upstream_connections = await _warm_async_upstream(count)
+
+    results = await asyncio.gather(
+        asyncio.wait_for(warm_db(), settings.WARMUP_TIMEOUT),
+        asyncio.wait_for(warm_upstream(), settings.WARMUP_TIMEOUT),
+        return_exceptions=True
+    )
+    for name, result in zip(("db", "upstream"), results):
+        if isinstance(result, BaseException):
+            message = "timed out" if isinstance(result, asyncio.TimeoutError) else str(result)
+            state.errors.append({"step": name, "error": message})
+            logger.warning(f"⚠️ {name} warm-up failed: {message}")
+
+    state.finished_at = time.monotonic()
+    logger.info(f"✅ Warm-up complete: {state.as_dict()}")
+    return state
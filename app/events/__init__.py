@@ -1,10 +1,8 @@
-from .startup import start_up
 from .cleanup import midnight_cleanup, db_weekly_cleanup
 from .db_events import save_image_to_db, delete_image_from_db, save_task_to_db, update_task_in_db, get_all_tasks, delete_all_tasks
 
 __all__ = [
   'db_weekly_cleanup',
-  'start_up', 
   'midnight_cleanup', 
   'save_image_to_db', 
   'delete_image_from_db', 
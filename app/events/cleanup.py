@@ -1,13 +1,23 @@
+import asyncio
 from fastapi import FastAPI
-from sqlalchemy import delete
-from datetime import datetime
-from app.events.db_events import delete_all_tasks
-from app.models.db_models import Image, Task
-from app.core.database import get_session
+from sqlalchemy import delete, func
+from datetime import datetime, timedelta
+from app.events.db_events import delete_all_tasks, fail_stale_tasks, move_finished_tasks, run_in_own_session
+from app.events.task_stats import prune_task_stats, reset_status_counts
+from app.events.webhooks import webhooks
+from app.models.db_models import TASK_TABLES, Image, TaskStatus
+from app.core.config import settings
+from app.core.metrics import counter
 import logging
 
 logger = logging.getLogger(__name__)
 
+ARCHIVE_MAX_PASSES = 10
+
+tasks_reaped = counter("tasks_reaped_total", "Stale tasks transitioned to failed by the reaper", ["status"])
+tasks_bulk_deleted = counter("tasks_bulk_deleted_total", "Tasks deleted by deletion jobs")
+tasks_moved = counter("tasks_moved_to_history_total", "Finished tasks moved from tasks_active to tasks_history")
+
 async def midnight_cleanup(app: FastAPI):
     logger.info("🕛 Starting midnight cleanup...")
 
@@ -16,6 +26,13 @@ async def midnight_cleanup(app: FastAPI):
         logger.info(f"Midnight cleanup - Database: {success}")
     except Exception as e:
         logger.error(f"Midnight cleanup - Database cleanup failed: {e}")
+
+    try:
+        cutoff = datetime.now() - timedelta(days=settings.STATS_RETENTION_DAYS)
+        pruned = await run_in_own_session(prune_task_stats, cutoff)
+        logger.info(f"Midnight cleanup - Task statistics: {pruned} old rows pruned")
+    except Exception as e:
+        logger.error(f"Midnight cleanup - Task statistics pruning failed: {e}")
     
     result = {
         "message": "Midnight cleanup completed",
@@ -25,31 +42,159 @@ async def midnight_cleanup(app: FastAPI):
     logger.info(f"✅ Midnight cleanup completed: {result}")
     return result
 
+def wipe_tasks_and_images(db) -> dict:
+    """Delete every image and task and zero the status counts in one transaction.
+
+    The image files and the archive packs are removed after the commit.
+    """
+    from app.core.search import get_search_index
+    from app.events.deletion import BatchResult, remove_image_payloads
+
+    try:
+        # images saved while the wipe runs keep their row and their file
+        last_id = db.query(func.max(Image.id)).scalar() or 0
+        payloads = db.query(Image.image_path, Image.archive_key).filter(Image.id <= last_id).all()
+        images_deleted = db.execute(delete(Image).where(Image.id <= last_id)).rowcount
+        tasks_deleted = sum(db.execute(delete(model)).rowcount for model in TASK_TABLES)
+        reset_status_counts(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    get_search_index(db).clear()
+    files_deleted = remove_image_payloads(None, BatchResult(
+        image_paths=[image_path for image_path, _ in payloads if image_path],
+        archive_keys=sorted({archive_key for _, archive_key in payloads if archive_key})
+    ), db)
+    return {
+        "images_deleted": images_deleted,
+        "files_deleted": files_deleted,
+        "tasks_deleted": tasks_deleted,
+        "timestamp": datetime.now().isoformat()
+    }
+
 async def db_weekly_cleanup(app: FastAPI):
     logger.info("🗓️ Starting weekly database cleanup...")
-    
-    results = {}
-    
+
     try:
-        async with get_session() as session:
-            stmt_images = delete(Image)
-            result_images = await session.execute(stmt_images)
-            
-            stmt_tasks = delete(Task)
-            result_tasks = await session.execute(stmt_tasks)
-            
-            await session.commit()
-            
-            results["images_deleted"] = result_images.rowcount
-            results["tasks_deleted"] = result_tasks.rowcount
-            results["timestamp"] = datetime.now().isoformat()
-            
+        results = await run_in_own_session(wipe_tasks_and_images)
     except Exception as e:
         logger.error(f"Error during weekly database cleanup: {e}")
-        await session.rollback()
         raise
-    finally:
-        await session.close()
-    
+
     logger.info(f"✅ Weekly cleanup completed: {results}")
     return results
+
+async def reap_stale_tasks(app: FastAPI):
+    """Fail tasks stuck in pending or processing, in batches of REAPER_BATCH_SIZE"""
+    now = datetime.now()
+    stale_after = {
+        TaskStatus.PENDING.value: settings.TASK_PENDING_TTL,
+        TaskStatus.PROCESSING.value: settings.TASK_PROCESSING_TTL
+    }
+    results = {}
+
+    for status, ttl in stale_after.items():
+        cutoff = now - timedelta(seconds=ttl)
+        reaped = 0
+        while True:
+            count, callback_task_ids = await run_in_own_session(
+                fail_stale_tasks, status, cutoff, settings.REAPER_BATCH_SIZE
+            )
+            reaped += count
+            for task_id in callback_task_ids:
+                webhooks.notify(task_id)
+            if count < settings.REAPER_BATCH_SIZE:
+                break
+        if reaped:
+            tasks_reaped.labels(status).inc(reaped)
+        results[status] = reaped
+
+    if any(results.values()):
+        logger.warning(f"⚠️ Reaped stale tasks: {results}")
+    return results
+
+async def redeliver_stale_webhooks(app: FastAPI):
+    """Send again the webhook deliveries left pending by a worker that stopped"""
+    sent = await webhooks.redeliver_stale()
+    if sent:
+        logger.warning(f"⚠️ Redelivered {sent} abandoned webhooks")
+    return sent
+
+async def move_tasks_to_history(app: FastAPI):
+    """Move tasks finished more than TASK_HISTORY_AFTER seconds ago out of tasks_active"""
+    cutoff = datetime.now() - timedelta(seconds=settings.TASK_HISTORY_AFTER)
+    moved = 0
+    while True:
+        count = await run_in_own_session(move_finished_tasks, cutoff, settings.TASK_HISTORY_BATCH_SIZE)
+        moved += count
+        if count < settings.TASK_HISTORY_BATCH_SIZE:
+            break
+
+    if moved:
+        tasks_moved.inc(moved)
+        logger.info(f"✅ Moved {moved} finished tasks to history")
+    return moved
+
+async def archive_old_images(app: FastAPI):
+    """Pack images older than ARCHIVE_AFTER_HOURS into archive files, one pack per pass"""
+    from app.core.archive import archive_images
+
+    cutoff = datetime.now() - timedelta(hours=settings.ARCHIVE_AFTER_HOURS)
+    archived = 0
+    try:
+        for _ in range(ARCHIVE_MAX_PASSES):
+            count = await run_in_own_session(archive_images, cutoff)
+            archived += count
+            if count == 0:
+                break
+    except Exception as e:
+        logger.error(f"❌ Image archiver failed: {e}")
+
+    if archived:
+        logger.info(f"✅ Archived {archived} images")
+    return archived
+
+async def hash_missing_images(app: FastAPI):
+    """Compute the perceptual hash of images saved without one"""
+    from app.core import similarity
+
+    try:
+        hashed = await run_in_own_session(similarity.hash_missing_images)
+    except Exception as e:
+        logger.error(f"❌ Image hash backfill failed: {e}")
+        return 0
+
+    if hashed:
+        logger.info(f"✅ Hashed {hashed} images")
+    return hashed
+
+async def process_deletion_jobs(app: FastAPI):
+    """Run every claimable deletion job, one batch per transaction"""
+    from app.events import deletion
+
+    while True:
+        job = await run_in_own_session(deletion.claim_deletion_job)
+        if job is None:
+            return
+        logger.info(f"🗑️ Deletion job {job.job_id} started")
+        error = None
+        deleted = 0
+        try:
+            while True:
+                batch = await run_in_own_session(deletion.delete_batch, job.id)
+                if batch is None:
+                    break
+                deleted += batch.tasks
+                tasks_bulk_deleted.inc(batch.tasks)
+                await run_in_own_session(deletion.remove_image_payloads, job.id, batch)
+                # leaves room for other writers between the short batch transactions
+                await asyncio.sleep(settings.DELETE_BATCH_PAUSE)
+        except Exception as e:
+            error = str(e)
+            logger.error(f"❌ Deletion job {job.job_id} failed: {e}")
+
+        await run_in_own_session(deletion.finish_deletion_job, job.id, error)
+        if error is None:
+            logger.info(f"✅ Deletion job {job.job_id} deleted {deleted} tasks")
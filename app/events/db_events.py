@@ -1,9 +1,34 @@
+import asyncio
 import datetime
-from sqlalchemy import update
+from collections import Counter
+from typing import List, Optional
+from sqlalchemy import delete, func, insert, select, union_all, update
 from app.schemas.schemas import GenerationResult, TaskData
-from app.core.database import get_db
-from app.models.db_models import Image, Task
-from sqlalchemy.orm import Session, joinedload
+from app.core.database import get_db, get_session
+from app.models.db_models import TASK_TABLES, Image, Task, TaskHistory, TaskStatus, WebhookDelivery
+from sqlalchemy.orm import Session
+from app.core.logging_setup import get_logger
+from app.events.task_stats import record_created, record_transition, reset_status_counts
+
+logger = get_logger(__name__)
+
+ACTIVE_STATUSES = [TaskStatus.PENDING.value, TaskStatus.PROCESSING.value]
+TASK_ROW_COLUMNS = ("task_id", "status", "progress", "prompt", "created_at", "updated_at")
+
+
+def select_tasks(*columns: str, active_only: bool = False, **filters):
+    """SELECT of ``columns`` from tasks_active and tasks_history as one UNION ALL.
+
+    ``filters`` are column equalities applied to both tables, so a lookup by
+    task_id is one statement with an index seek on each side.
+    """
+    selects = []
+    for model in TASK_TABLES[:1] if active_only else TASK_TABLES:
+        query = select(*(getattr(model, column) for column in columns))
+        if filters:
+            query = query.where(*(getattr(model, column) == value for column, value in filters.items()))
+        selects.append(query)
+    return selects[0] if len(selects) == 1 else union_all(*selects)
 
 
 def save_task_to_db(task_info, db: Session):
@@ -13,59 +38,191 @@ def save_task_to_db(task_info, db: Session):
             status=task_info['status'],
             progress=task_info['progress'],
             prompt=task_info['prompt'],
+            backend_url=task_info.get('backend_url'),
+            callback_url=task_info.get('callback_url'),
             updated_at=datetime.datetime.now()
         )
         db.add(task)
+        record_created([task_info['status']], db)
         db.commit()
-        db.refresh(task)
 
         return task
     except Exception as e:
         db.rollback()
-        print(f"Error saving task: {e}")
+        logger.error("❌ Error saving task", task_id=task_info['task_id'], error=str(e))
+
+def save_tasks_to_db(task_infos, db: Session):
+    """Insert a batch of new tasks with one executemany statement"""
+    try:
+        now = datetime.datetime.now()
+        rows = [
+            {
+                "task_id": task_info['task_id'],
+                "status": task_info['status'],
+                "progress": task_info['progress'],
+                "prompt": task_info['prompt'],
+                "batch_id": task_info.get('batch_id'),
+                "callback_url": task_info.get('callback_url'),
+                "updated_at": now
+            }
+            for task_info in task_infos
+        ]
+        db.execute(insert(Task), rows)
+        record_created([row["status"] for row in rows], db)
+        db.commit()
+        logger.info("✅ Saved tasks", count=len(rows))
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Error saving tasks", error=str(e))
+        return False
+
+def update_task_in_db(task_id:str, task_updates, db:Session, inference_time: Optional[float] = None):
+    """Apply ``task_updates`` to a task; a change of status also updates the task statistics.
 
-def update_task_in_db(task_id:str, task_updates, db:Session):
+    A status change only applies to a pending or processing task: once a task
+    is cancelled, failed or completed, updates to another status return False.
+    ``inference_time`` goes into the statistics when this update completes the task.
+    """
     try:
         updates = (
             update(Task)
             .where(Task.task_id == task_id)
             .values(**task_updates)
         )
-        result = db.execute(updates)
+        status = task_updates.get("status")
+        if status is None:
+            result = db.execute(updates)
+        else:
+            # progress messages repeat the current status, that stays a single UPDATE
+            result = db.execute(updates.where(Task.status == status))
+            if result.rowcount == 0:
+                previous = db.execute(
+                    select(Task.status).where(Task.task_id == task_id).with_for_update()
+                ).scalar()
+                if previous is not None and previous not in ACTIVE_STATUSES:
+                    # cancelled, failed or completed is final; late frames must not revive the task
+                    db.rollback()
+                    logger.warning("⚠️ Ignored update of a finished task", task_id=task_id, status=previous, update=status)
+                    return False
+                if previous is not None:
+                    result = db.execute(updates.where(Task.status.in_(ACTIVE_STATUSES)))
+                    if result.rowcount:
+                        record_transition(previous, status, db, inference_time=inference_time)
         db.commit()
         
         if result.rowcount == 0:
-            print(f"⚠️ No task found with ID: {task_id}")
+            logger.warning("⚠️ No task found", task_id=task_id)
             return False
             
-        print(f"✅ Updated task {task_id}")
+        logger.debug("✅ Updated task", task_id=task_id, **task_updates)
         return True
         
     except Exception as e:
         db.rollback()
-        print(f"❌ Error updating task {task_id}: {e}")
+        logger.error("❌ Error updating task", task_id=task_id, error=str(e))
         return False
 
+def _call_in_own_session(func, *args):
+    db = get_session()
+    try:
+        return func(*args, db)
+    finally:
+        db.close()
+
+async def run_in_own_session(func, *args):
+    """Run ``func(*args, db)`` off the event loop, in a thread with its own session"""
+    return await asyncio.to_thread(_call_in_own_session, func, *args)
+
+async def update_task_in_db_async(task_id: str, task_updates):
+    """update_task_in_db for the event loop"""
+    return await run_in_own_session(update_task_in_db, task_id, task_updates)
+
+def cancel_task_in_db(task_id: str, db: Session):
+    """Mark a task cancelled unless it already finished.
+
+    The status check is part of the UPDATE, so a completion racing the
+    cancel leaves exactly one of them in the row.
+    """
+    try:
+        previous = db.execute(
+            select(Task.status).where(Task.task_id == task_id).with_for_update()
+        ).scalar()
+        updates = (
+            update(Task)
+            .where(Task.task_id == task_id)
+            .where(Task.status.in_(ACTIVE_STATUSES))
+            .values(status=TaskStatus.CANCELLED.value)
+        )
+        result = db.execute(updates)
+        if result.rowcount:
+            record_transition(previous, TaskStatus.CANCELLED.value, db)
+        db.commit()
+        return result.rowcount > 0
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Error cancelling task", task_id=task_id, error=str(e))
+        return False
+
+def fail_tasks_in_db(task_ids: List[str], db: Session) -> int:
+    """Mark the given tasks failed unless they already finished; returns the rows failed"""
+    if not task_ids:
+        return 0
+    try:
+        rows = db.execute(
+            select(Task.status)
+            .where(Task.task_id.in_(task_ids))
+            .where(Task.status.in_(ACTIVE_STATUSES))
+            .with_for_update()
+        ).all()
+        updates = (
+            update(Task)
+            .where(Task.task_id.in_(task_ids))
+            .where(Task.status.in_(ACTIVE_STATUSES))
+            .values(status=TaskStatus.FAILED.value)
+        )
+        result = db.execute(updates)
+        for previous, count in Counter(row.status for row in rows).items():
+            record_transition(previous, TaskStatus.FAILED.value, db, count=count)
+        db.commit()
+        return result.rowcount
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Error failing tasks", count=len(task_ids), error=str(e))
+        return 0
+
 def save_image_to_db(result: GenerationResult, db: Session):
     try:
         image = Image(
             task_id=result.task_id,   
             image_data=result.image_data, 
+            image_path=result.image_path,
+            content_type=result.content_type,
             prompt=result.prompt,
-            model_used=result.model_used        
+            model_used=result.model_used,
+            phash=result.phash,
+            duplicate_of=result.duplicate_of
         )
         db.add(image)
+        db.flush()
+        image_id = image.id
         db.commit()
-        db.refresh(image)
-        print(f"✅ Image saved for task {result.task_id}")
-        return True
-    except Exception as e:
+        logger.info("✅ Image saved", task_id=result.task_id, image_path=result.image_path)
+    except Exception:
         db.rollback()
-        print(f"Error saving image: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error saving image", task_id=result.task_id)
         return False
 
+    try:
+        from app.core.search import get_search_index
+        get_search_index(db).add(image_id, result.prompt, result.model_used, result.duplicate_of is not None)
+    except Exception as e:
+        logger.warning("⚠️ Image not added to the search index", task_id=result.task_id, error=str(e))
+    if result.phash is not None:
+        from app.core.similarity import similarity_index
+        similarity_index.add(image_id, result.phash)
+    return True
+
 def delete_image_from_db(task_id: str):
     db_gen = get_db()
     try:
@@ -73,37 +230,38 @@ def delete_image_from_db(task_id: str):
         image = db.query(Image).filter(Image.task_id == task_id).first()
         
         if image:
+            from app.core.search import get_search_index
             db.delete(image)
-            print(f"✅ Image with task_id {task_id} deleted successfully")
+            get_search_index(db).remove([image.id])
+            logger.info("✅ Image deleted", task_id=task_id)
             return True
         else:
-            print(f"⚠️  No image found with task_id {task_id}")
+            logger.warning("⚠️ No image found", task_id=task_id)
             return False
                 
     except Exception as e:
-        print(f"❌ Error deleting image with task_id {task_id}: {e}")
+        logger.error("❌ Error deleting image", task_id=task_id, error=str(e))
         return False
     
 def delete_all_tasks():
     db_gen = get_db()
     try:
         db = next(db_gen) 
-        deleted_tasks = db.query(Task).delete()
+        deleted_tasks = sum(db.query(model).delete() for model in TASK_TABLES)
+        reset_status_counts(db)
         db.commit()
-        print(f"✅ Deleted {deleted_tasks} tasks successfully")
+        logger.info("✅ Deleted tasks", count=deleted_tasks)
         return True
     except Exception as e:
         db.rollback()
-        print(f"❌ Error deleting all tasks: {e}")
+        logger.error("❌ Error deleting all tasks", error=str(e))
         return False
     
 
 def get_all_tasks(db: Session):
     try:
-        tasks = db.query(Task).options(joinedload(Task.image)).all()
-        
         task_dict = {}
-        for task in tasks:    
+        for task in db.execute(select_tasks(*TASK_ROW_COLUMNS)):
             task_dict[task.task_id] = {
                 "status": task.status,
                 "progress": task.progress or 0,
@@ -116,15 +274,231 @@ def get_all_tasks(db: Session):
         return task_dict
         
     except Exception as e:
-        print(f"Error retrieving tasks: {e}")
+        logger.error("❌ Error retrieving tasks", error=str(e))
         return {}
     
+def get_task_rows(db: Session, active_only: bool = False):
+    """Column rows for the /tasks serializer, without loading ORM objects"""
+    return db.execute(select_tasks(*TASK_ROW_COLUMNS, active_only=active_only)).all()
+
+def get_task_row(task_id: str, db: Session):
+    return db.execute(select_tasks(*TASK_ROW_COLUMNS, task_id=task_id)).first()
+
+def get_image_rows(db: Session, page: int, limit: int, task_id: str = None, model: str = None, collapse: bool = False):
+    """Total count and one page of column rows for the /images serializer"""
+    query = db.query(
+        Image.id, Image.task_id, Image.prompt, Image.image_path,
+        Image.image_data, Image.model_used, Image.created_at, Image.archive_key
+    )
+    count_query = db.query(func.count(Image.id))
+    if task_id:
+        query = query.filter(Image.task_id == task_id)
+        count_query = count_query.filter(Image.task_id == task_id)
+    if model:
+        query = query.filter(Image.model_used == model)
+        count_query = count_query.filter(Image.model_used == model)
+    if collapse:
+        query = query.filter(Image.duplicate_of.is_(None))
+        count_query = count_query.filter(Image.duplicate_of.is_(None))
+
+    total_count = count_query.scalar()
+    rows = query.order_by(Image.created_at.desc()).offset((page - 1) * limit).limit(limit).all()
+    return total_count, rows
+    
+def get_image_location(image_id: int, db: Session):
+    """Where an image's bytes are: its file, or its member of an archive pack"""
+    return db.query(
+        Image.image_path, Image.content_type, Image.archive_key,
+        Image.archive_offset, Image.archive_length, Image.archive_codec
+    ).filter(Image.id == image_id).first()
+
+def get_task_backend_url(task_id: str, db: Session):
+    """Backend the task was submitted to, None for tasks from before backend pinning.
+
+    Only asked about tasks being cancelled, which are still in tasks_active.
+    """
+    return db.query(Task.backend_url).filter(Task.task_id == task_id).scalar()
+    
+def fail_stale_tasks(status: str, cutoff: datetime.datetime, batch_size: int, db: Session):
+    """Fail up to ``batch_size`` tasks in ``status`` not updated since ``cutoff``.
+
+    Returns the number of failed rows and the task ids among them that have a callback_url.
+    """
+    try:
+        last_update = func.coalesce(Task.updated_at, Task.created_at)
+        rows = (
+            db.query(Task.id, Task.task_id, Task.callback_url)
+            .filter(Task.status == status, last_update < cutoff)
+            .order_by(Task.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return 0, []
+        ids = [row.id for row in rows]
+
+        updates = (
+            update(Task)
+            .where(Task.id.in_(ids))
+            .where(Task.status == status)
+            .values(status=TaskStatus.FAILED.value)
+        )
+        result = db.execute(updates)
+        record_transition(status, TaskStatus.FAILED.value, db, count=result.rowcount)
+        db.commit()
+        return result.rowcount, [row.task_id for row in rows if row.callback_url]
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Error failing stale tasks", status=status, error=str(e))
+        return 0, []
+
+def move_finished_tasks(cutoff: datetime.datetime, batch_size: int, db: Session) -> int:
+    """Move up to ``batch_size`` finished tasks not updated since ``cutoff`` to tasks_history.
+
+    History rows get ids of their own, in the order of the tasks_active ids;
+    the copy and the delete commit together.
+    """
+    try:
+        last_update = func.coalesce(Task.updated_at, Task.created_at)
+        rows = (
+            db.query(Task.id)
+            .filter(Task.status.notin_(ACTIVE_STATUSES), last_update < cutoff)
+            .order_by(Task.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return 0
+        ids = [row.id for row in rows]
+
+        columns = [column.name for column in TaskHistory.__table__.columns if column.name != "id"]
+        finished = (
+            select(*(Task.__table__.c[column] for column in columns))
+            .where(Task.id.in_(ids))
+            .order_by(Task.id)
+        )
+        db.execute(insert(TaskHistory.__table__).from_select(columns, finished))
+        db.execute(delete(Task).where(Task.id.in_(ids)))
+        db.commit()
+        return len(ids)
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Error moving finished tasks", error=str(e))
+        return 0
+
+def get_task_status(task_id: str, db: Session):
+    return db.execute(select_tasks("status", task_id=task_id)).scalar()
+    
+def get_task_progress(task_id: str, db: Session):
+    """(status, progress) of a task, None if it does not exist"""
+    return db.execute(select_tasks("status", "progress", task_id=task_id)).first()
+    
+def get_task_image(task_id: str, db: Session):
+    return (
+        db.query(Image.id, Image.image_path, Image.content_type, Image.image_data, Image.prompt,
+                 Image.model_used, Image.archive_key)
+        .filter(Image.task_id == task_id)
+        .first()
+    )
+    
+def get_webhook_subject(task_id: str, db: Session):
+    """(task row, image row or None) for a webhook payload, None if the task has no callback"""
+    task = db.execute(select_tasks(
+        "task_id", "status", "progress", "prompt", "batch_id", "callback_url", "created_at", "updated_at",
+        task_id=task_id
+    )).first()
+    if task is None or not task.callback_url:
+        return None
+    image = (
+        db.query(Image.id, Image.image_path, Image.archive_key, Image.content_type, Image.model_used)
+        .filter(Image.task_id == task_id)
+        .first()
+    )
+    return task, image
+    
+def create_webhook_delivery(task_id: str, event: str, url: str, payload: str, db: Session):
+    """Log a new delivery, returns its id; None if this event was already logged for the task"""
+    try:
+        delivery = WebhookDelivery(
+            task_id=task_id, event=event, url=url, payload=payload, status="pending", attempts=0,
+            updated_at=datetime.datetime.now()
+        )
+        db.add(delivery)
+        db.commit()
+        return delivery.id
+    except Exception as e:
+        db.rollback()
+        logger.warning("⚠️ Webhook delivery not logged", task_id=task_id, webhook_event=event, error=str(e))
+        return None
+    
+def update_webhook_delivery(delivery_id: int, updates, db: Session):
+    try:
+        db.execute(
+            update(WebhookDelivery)
+            .where(WebhookDelivery.id == delivery_id)
+            .values(**updates, updated_at=datetime.datetime.now())
+        )
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Error updating webhook delivery", delivery_id=delivery_id, error=str(e))
+        return False
+    
+def claim_stale_webhook_deliveries(cutoff: datetime.datetime, limit: int, db: Session):
+    """Pending deliveries not updated since ``cutoff``, whose worker stopped before posting them.
+
+    Each row is claimed with a conditional UPDATE of ``updated_at``, so one worker sends it again.
+    """
+    last_update = func.coalesce(WebhookDelivery.updated_at, WebhookDelivery.created_at)
+    stale = (WebhookDelivery.status == "pending", last_update < cutoff)
+    try:
+        rows = (
+            db.query(WebhookDelivery.id, WebhookDelivery.task_id, WebhookDelivery.event, WebhookDelivery.url,
+                     WebhookDelivery.payload, WebhookDelivery.attempts)
+            .filter(*stale)
+            .order_by(WebhookDelivery.id)
+            .limit(limit)
+            .all()
+        )
+        claimed = []
+        for row in rows:
+            if db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id == row.id, *stale)
+                .values(updated_at=datetime.datetime.now())
+            ).rowcount:
+                claimed.append(row)
+        db.commit()
+        return claimed
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Error claiming stale webhook deliveries", error=str(e))
+        return []
+
+def get_webhook_deliveries(db: Session, task_id: str = None, status: str = None, limit: int = 50):
+    query = db.query(
+        WebhookDelivery.id, WebhookDelivery.task_id, WebhookDelivery.event, WebhookDelivery.url,
+        WebhookDelivery.status, WebhookDelivery.attempts, WebhookDelivery.last_status_code,
+        WebhookDelivery.last_error, WebhookDelivery.created_at, WebhookDelivery.delivered_at
+    )
+    if task_id:
+        query = query.filter(WebhookDelivery.task_id == task_id)
+    if status:
+        query = query.filter(WebhookDelivery.status == status)
+    return query.order_by(WebhookDelivery.id.desc()).limit(limit).all()
+    
+def get_batch_task_ids(batch_id: str, db: Session):
+    query = select_tasks("task_id", "created_at", "id", batch_id=batch_id)
+    rows = db.execute(query.order_by(query.selected_columns.created_at, query.selected_columns.id)).all()
+    return [row.task_id for row in rows]
+    
 def get_task_info(task_id: str, db: Session):
     try:
-        task = db.query(Task).options(joinedload(Task.image)).filter(Task.task_id == task_id).first()
+        task = db.execute(select_tasks(*TASK_ROW_COLUMNS, task_id=task_id)).first()
         
         if not task:
-            print(f"⚠️ No task found with ID: {task_id}")
+            logger.warning("⚠️ No task found", task_id=task_id)
             return None
 
         task = {
@@ -139,5 +513,5 @@ def get_task_info(task_id: str, db: Session):
         return TaskData(**task)
         
     except Exception as e:
-        print(f"Error retrieving task info for {task_id}: {e}")
+        logger.error("❌ Error retrieving task info", task_id=task_id, error=str(e))
         return None
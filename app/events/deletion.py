@@ -0,0 +1,278 @@
+"""
+Bulk deletion of tasks and their images as tracked background jobs.
+
+``create_deletion_job`` stores the filters in a ``deletion_jobs`` row and
+returns its job id; ``process_deletion_jobs`` (app.events.cleanup) claims
+pending jobs and runs them. A job walks tasks_active, then tasks_history,
+in id order: every batch selects up to DELETE_BATCH_SIZE matching ids
+after the job's ``last_id``, deletes those tasks and their images, uncounts
+them from ``task_status_counts`` and advances ``last_id`` in one short
+transaction. Files, search index entries and archive packs left without
+images are removed after the commit.
+
+Jobs survive restarts: a running job whose row has not been updated for
+DELETE_JOB_STALE_AFTER seconds is claimed again and resumes at ``last_id``.
+"""
+import datetime
+import json
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging_setup import get_logger
+from app.events.task_stats import record_deleted
+from app.models.db_models import DeletionJob, Image, Task, TaskHistory
+
+logger = get_logger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+PHASES = {"tasks_active": Task, "tasks_history": TaskHistory}
+PHASE_ORDER = list(PHASES)
+
+
+@dataclass
+class DeletionFilters:
+    statuses: Optional[List[str]] = None
+    created_before: Optional[datetime.datetime] = None
+    prompt_contains: Optional[str] = None
+    task_ids: Optional[List[str]] = None
+
+    def to_json(self) -> str:
+        data = dict(self.__dict__)
+        if self.created_before is not None:
+            data["created_before"] = self.created_before.isoformat()
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "DeletionFilters":
+        data = json.loads(raw)
+        if data.get("created_before"):
+            data["created_before"] = datetime.datetime.fromisoformat(data["created_before"])
+        return cls(**data)
+
+
+@dataclass
+class BatchResult:
+    tasks: int = 0
+    images: int = 0
+    image_ids: List[int] = field(default_factory=list)
+    # images whose duplicate_of pointed at a deleted image and was cleared
+    unmarked_ids: List[int] = field(default_factory=list)
+    image_paths: List[str] = field(default_factory=list)
+    archive_keys: List[str] = field(default_factory=list)
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _matching(model, filters: DeletionFilters):
+    conditions = []
+    if filters.statuses:
+        conditions.append(model.status.in_(filters.statuses))
+    if filters.created_before is not None:
+        conditions.append(model.created_at < filters.created_before)
+    if filters.prompt_contains:
+        conditions.append(model.prompt.ilike(f"%{_escape_like(filters.prompt_contains)}%", escape="\\"))
+    if filters.task_ids:
+        conditions.append(model.task_id.in_(filters.task_ids))
+    return conditions
+
+
+def create_deletion_job(filters: DeletionFilters, db: Session) -> str:
+    job_id = str(uuid.uuid4())
+    db.add(DeletionJob(job_id=job_id, status=JOB_PENDING, filters=filters.to_json(), phase=PHASE_ORDER[0], last_id=0))
+    db.commit()
+    logger.info("🗑️ Deletion job created", job_id=job_id, filters=filters.to_json())
+    return job_id
+
+
+def get_deletion_job(job_id: str, db: Session):
+    return db.query(
+        DeletionJob.job_id, DeletionJob.status, DeletionJob.filters, DeletionJob.phase,
+        DeletionJob.tasks_deleted, DeletionJob.images_deleted, DeletionJob.files_deleted,
+        DeletionJob.error, DeletionJob.created_at, DeletionJob.updated_at, DeletionJob.finished_at
+    ).filter(DeletionJob.job_id == job_id).first()
+
+
+def claim_deletion_job(db: Session):
+    """Take the oldest pending job, or a running one abandoned by its worker; None if there is none.
+
+    The claim is a conditional UPDATE, so one worker gets each job.
+    """
+    stale = datetime.datetime.now() - datetime.timedelta(seconds=settings.DELETE_JOB_STALE_AFTER)
+    claimable = or_(
+        DeletionJob.status == JOB_PENDING,
+        and_(DeletionJob.status == JOB_RUNNING, DeletionJob.updated_at < stale)
+    )
+    try:
+        job = db.query(DeletionJob.id).filter(claimable).order_by(DeletionJob.id).first()
+        if job is None:
+            return None
+        claimed = db.execute(
+            update(DeletionJob)
+            .where(DeletionJob.id == job.id, claimable)
+            .values(status=JOB_RUNNING, updated_at=datetime.datetime.now())
+        ).rowcount
+        db.commit()
+        if not claimed:
+            return None
+        return db.query(DeletionJob.id, DeletionJob.job_id).filter(DeletionJob.id == job.id).first()
+    except Exception as e:
+        db.rollback()
+        logger.error("❌ Error claiming a deletion job", error=str(e))
+        return None
+
+
+def delete_batch(job_pk: int, db: Session) -> Optional[BatchResult]:
+    """Delete the next batch of a job's tasks and images; None once the job has nothing left.
+
+    The batch is selected FOR UPDATE where the database supports it. Each DELETE also
+    requires the status read by the SELECT, and the status counts are uncounted from its
+    rowcount. The deletes, the status counts and the job's resume point commit together.
+    """
+    job = db.query(DeletionJob.filters, DeletionJob.phase, DeletionJob.last_id).filter(DeletionJob.id == job_pk).first()
+    filters = DeletionFilters.from_json(job.filters)
+    phase, last_id = job.phase, job.last_id
+
+    while True:
+        model = PHASES[phase]
+        rows = (
+            db.query(model.id, model.task_id, model.status)
+            .filter(model.id > last_id, *_matching(model, filters))
+            .order_by(model.id)
+            .limit(settings.DELETE_BATCH_SIZE)
+            .with_for_update()
+            .all()
+        )
+        if rows:
+            break
+        next_phase = PHASE_ORDER.index(phase) + 1
+        if next_phase == len(PHASE_ORDER):
+            return None
+        phase, last_id = PHASE_ORDER[next_phase], 0
+
+    try:
+        # rows moved to tasks_history or changed since the SELECT are not deleted, and are
+        # only uncounted under the status they were deleted with
+        by_status = defaultdict(list)
+        for row in rows:
+            by_status[row.status].append(row.id)
+        deleted_statuses = []
+        for status, ids in by_status.items():
+            deleted = db.execute(delete(model).where(model.id.in_(ids), model.status == status)).rowcount
+            deleted_statuses += [status] * deleted
+
+        selected_ids = [row.id for row in rows]
+        remaining = {id for id, in db.execute(select(model.id).where(model.id.in_(selected_ids)))}
+        gone = [row.task_id for row in rows if row.id not in remaining]
+        elsewhere = set()
+        if gone:
+            other = PHASES[PHASE_ORDER[1 - PHASE_ORDER.index(phase)]]
+            elsewhere = {task_id for task_id, in db.execute(select(other.task_id).where(other.task_id.in_(gone)))}
+        task_ids = [task_id for task_id in gone if task_id not in elsewhere]
+
+        images = []
+        if task_ids:
+            images = db.query(Image.id, Image.image_path, Image.archive_key).filter(Image.task_id.in_(task_ids)).all()
+        result = BatchResult(
+            tasks=len(deleted_statuses),
+            images=len(images),
+            image_ids=[image.id for image in images],
+            image_paths=[image.image_path for image in images if image.image_path],
+            archive_keys=sorted({image.archive_key for image in images if image.archive_key})
+        )
+
+        if result.image_ids:
+            db.execute(delete(Image).where(Image.id.in_(result.image_ids)))
+            # their duplicates are shown again by /images?collapse=true
+            result.unmarked_ids = [
+                id for id, in db.execute(select(Image.id).where(Image.duplicate_of.in_(result.image_ids)))
+            ]
+            if result.unmarked_ids:
+                db.execute(update(Image).where(Image.id.in_(result.unmarked_ids)).values(duplicate_of=None))
+        record_deleted(deleted_statuses, db)
+        db.execute(
+            update(DeletionJob)
+            .where(DeletionJob.id == job_pk)
+            .values(
+                phase=phase,
+                # rows whose status changed are matched again by the next batch
+                last_id=min(remaining) - 1 if remaining else rows[-1].id,
+                tasks_deleted=DeletionJob.tasks_deleted + result.tasks,
+                images_deleted=DeletionJob.images_deleted + result.images,
+                updated_at=datetime.datetime.now()
+            )
+        )
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+
+
+def remove_image_payloads(job_pk: Optional[int], result: BatchResult, db: Session) -> int:
+    """Delete the files, search entries and emptied archive packs of a committed batch; returns files deleted.
+
+    ``job_pk`` is the job whose ``files_deleted`` is advanced, None outside deletion jobs.
+    """
+    from app.core.archive import INDEX_SUFFIX, get_archive_backend
+    from app.core.image_store import image_store
+    from app.core.search import get_search_index
+
+    files = sum(1 for path in result.image_paths if image_store.delete(path))
+
+    if result.archive_keys:
+        in_use = {
+            key for key, in db.execute(
+                select(Image.archive_key).where(Image.archive_key.in_(result.archive_keys)).distinct()
+            )
+        }
+        backend = get_archive_backend()
+        for key in result.archive_keys:
+            if key in in_use:
+                continue
+            backend.delete(key)
+            backend.delete(f"{key}{INDEX_SUFFIX}")
+            files += 1
+            logger.info("🧊 Archive pack deleted", archive_key=key)
+
+    if result.image_ids:
+        try:
+            index = get_search_index(db)
+            index.remove(result.image_ids)
+            index.mark_duplicates(result.unmarked_ids, False)
+        except Exception as e:
+            logger.warning("⚠️ Images not removed from the search index", error=str(e))
+
+    if files and job_pk is not None:
+        db.execute(
+            update(DeletionJob)
+            .where(DeletionJob.id == job_pk)
+            .values(files_deleted=DeletionJob.files_deleted + files)
+        )
+        db.commit()
+    return files
+
+
+def finish_deletion_job(job_pk: int, error: Optional[str], db: Session):
+    db.execute(
+        update(DeletionJob)
+        .where(DeletionJob.id == job_pk)
+        .values(
+            status=JOB_FAILED if error else JOB_COMPLETED,
+            error=error,
+            finished_at=datetime.datetime.now(),
+            updated_at=datetime.datetime.now()
+        )
+    )
+    db.commit()
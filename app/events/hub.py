@@ -0,0 +1,74 @@
+"""
+In-process fan-out of ingested task messages to client streams.
+
+The ingestion worker publishes every message it parses for a task; client
+streams subscribe and get the latest message first, then everything after.
+A slow client only loses intermediate progress: when its queue is full the
+oldest message is dropped, never the terminal one.
+"""
+import asyncio
+from typing import Dict, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+class TaskEventHub:
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._latest: Dict[str, Optional[dict]] = {}
+
+    def open(self, task_id: str):
+        """Called when ingestion of the task starts"""
+        self._latest.setdefault(task_id, None)
+
+    def is_live(self, task_id: str) -> bool:
+        return task_id in self._latest
+
+    def publish(self, task_id: str, message: dict):
+        self._latest[task_id] = message
+        for queue in self._subscribers.get(task_id, ()):
+            self._put(queue, message)
+
+    def close(self, task_id: str):
+        """Called when ingestion of the task ends; subscribers finish"""
+        self._latest.pop(task_id, None)
+        for queue in self._subscribers.pop(task_id, ()):
+            self._put(queue, None)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, item: Optional[dict]):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(item)
+
+    async def subscribe(self, task_id: str):
+        """Yields the task's messages until its ingestion ends"""
+        if not self.is_live(task_id):
+            return
+
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        latest = self._latest.get(task_id)
+        if latest is not None:
+            queue.put_nowait(latest)
+        subscribers = self._subscribers.setdefault(task_id, set())
+        subscribers.add(queue)
+
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    return
+                yield message
+        finally:
+            subscribers.discard(queue)
+            if not subscribers and self._subscribers.get(task_id) is subscribers:
+                del self._subscribers[task_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+task_events = TaskEventHub()
@@ -0,0 +1,208 @@
+"""
+Background ingestion of Space streams.
+
+Every task this worker dispatches gets one upstream stream, read here
+whether or not a client is watching. Progress and the final image are
+persisted as they arrive and each message is published on the task event
+hub, which client streams read from.
+"""
+import asyncio
+import datetime
+from typing import Dict
+from app.core.backends import Backend, backend_pool
+from app.core.config import settings
+from app.core.image_store import image_store
+from app.core.logging_setup import ProgressSampler, bind_task, get_logger
+from app.core.query_stats import track_task_queries
+from app.events.hub import task_events
+from app.events.streams import CANCELLED, DRAINED, STALLED, upstream_streams
+from app.events.webhooks import TERMINAL_STATUSES, webhooks
+
+logger = get_logger(__name__)
+progress_sampler = ProgressSampler(settings.LOG_PROGRESS_SAMPLE_STEP)
+
+
+def process_message(task_id: str, data: dict, db) -> bool:
+    """Persist one parsed Space message; runs in a worker thread.
+
+    Returns False for a status message the task no longer accepts, which is
+    dropped instead of published: the task already reached a final status.
+    """
+    from app.core.dispatcher import dispatcher
+    from app.core.similarity import fingerprint
+    from app.events.db_events import save_image_to_db, update_task_in_db
+    from app.schemas.schemas import GenerationResult
+
+    try:
+        if "status" in data:
+            status = data["status"]
+            progress = int(float(data.get("progress", 100)) + 0.5)
+            inference_time = None
+            if status == "completed":
+                inference_time = (data.get("result") or {}).get("total_inference_time")
+            if not update_task_in_db(task_id, {"status": status, "progress": progress}, db, inference_time=inference_time):
+                stored_image = (data.get("result") or {}).get("stored_image")
+                if stored_image:
+                    image_store.delete(stored_image.path)
+                return False
+            if progress_sampler.sample(task_id, progress):
+                logger.debug("📈 Progress", status=status, progress=progress)
+
+            if status == "completed":
+                if "result" in data:
+                    stored_image = data["result"].get("stored_image")
+                    image_hash, duplicate_of = fingerprint(
+                        db,
+                        path=stored_image.path if stored_image else None,
+                        image_data=None if stored_image else data["result"].get("image")
+                    )
+                    result = GenerationResult(
+                        task_id=task_id,
+                        image_data=None if stored_image else data["result"].get("image"),
+                        image_path=stored_image.path if stored_image else None,
+                        content_type=stored_image.content_type if stored_image else None,
+                        prompt=data["result"]["prompt"],
+                        model_used = data["result"].get("model_used", None),
+                        total_inference_time=data["result"]["total_inference_time"],
+                        completed_at=datetime.datetime.now().isoformat(),
+                        phash=image_hash,
+                        duplicate_of=duplicate_of
+                    )
+                    if not save_image_to_db(result, db) and stored_image:
+                        image_store.delete(stored_image.path)
+                    update_task_in_db(task_id, {"status": data['status'], "progress": 100}, db)
+                    dispatcher.record_completion(task_id, data["result"].get("total_inference_time"))
+
+    except Exception as e:
+        logger.exception(f"❌ Error processing complete message: {e}")
+    return True
+
+
+class IngestionWorker:
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, task_id: str, backend: Backend):
+        """Begin reading the upstream stream of a task that was just dispatched"""
+        if task_id in self._tasks:
+            return
+        task_events.open(task_id)
+        ingest = asyncio.create_task(self._ingest(task_id, backend))
+        self._tasks[task_id] = ingest
+        ingest.add_done_callback(lambda _: self._tasks.pop(task_id, None))
+
+    def is_ingesting(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    async def _ingest(self, task_id: str, backend: Backend):
+        from app.core.database import get_session
+        from app.core.dispatcher import dispatcher
+        from app.core.http_client import get_upstream_session, space_headers
+        from app.core.resilience import call_space_async
+        from app.events.sse_decoder import SSEFrameDecoder
+        import aiohttp
+
+        bind_task(task_id)
+        query_stats = track_task_queries()
+        db = get_session()
+        decoder = SSEFrameDecoder(task_id)
+
+        async def publish(messages):
+            for message in messages:
+                if not await asyncio.to_thread(process_message, task_id, message, db):
+                    continue
+                task_events.publish(task_id, message)
+                if message.get("status") in TERMINAL_STATUSES:
+                    webhooks.notify(task_id)
+
+        async def fail(error: str):
+            from app.events.db_events import update_task_in_db
+            await asyncio.to_thread(update_task_in_db, task_id, {"status": "failed"}, db)
+            task_events.publish(task_id, {"status": "failed", "task_id": task_id, "error": error})
+            webhooks.notify(task_id)
+
+        try:
+            timeout = aiohttp.ClientTimeout(
+                total=3600,
+                connect=30,
+                sock_read=300,
+                sock_connect=30
+            )
+            session = get_upstream_session()
+            try:
+                response = await call_space_async(
+                    "stream_connect",
+                    lambda: session.get(
+                        f"{backend.url}/generate-stream/{task_id}",
+                        headers=space_headers("text/event-stream", **{"Cache-Control": "no-cache"}),
+                        timeout=timeout
+                    ),
+                    breaker=backend.url
+                )
+            except Exception as e:
+                logger.error(f"❌ Could not open the Space stream of task {task_id}: {e}")
+                await fail(str(e))
+                return
+
+            async with response:
+                if response.status != 200:
+                    error = await response.text()
+                    await fail(error[:200])
+                    return
+
+                upstream_streams.track(task_id, response)
+                try:
+                    async for chunk in response.content.iter_any():
+                        if chunk:
+                            # image segments are decoded and written to disk; one chunk in flight per task
+                            messages = await asyncio.to_thread(decoder.feed, chunk)
+                            if messages:
+                                upstream_streams.touch(task_id)
+                                await publish(messages)
+                except Exception as e:
+                    if upstream_streams.closed_reason(task_id) is None:
+                        logger.error(f"❌ Space stream of task {task_id} failed: {e}")
+                finally:
+                    closed_reason = upstream_streams.untrack(task_id, response)
+
+            if closed_reason == CANCELLED:
+                task_events.publish(task_id, {"status": "cancelled", "task_id": task_id})
+            elif closed_reason == STALLED:
+                await fail("Generation stalled")
+            elif closed_reason == DRAINED:
+                await fail("Worker shut down before the generation finished")
+                await dispatcher.cancel_upstream(task_id, backend)
+
+        except Exception as e:
+            logger.error(f"❌ Ingestion of task {task_id} failed: {e}")
+        finally:
+            await asyncio.to_thread(decoder.close)
+            db.close()
+            logger.info("🗄️ Task queries", **query_stats.as_dict())
+            progress_sampler.forget(task_id)
+            backend_pool.release(task_id)
+            dispatcher.forget(task_id)
+            task_events.close(task_id)
+
+    def task_ids(self):
+        return list(self._tasks)
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for every ingestion to end; False if some are still running"""
+        if not self._tasks:
+            return True
+        _, running = await asyncio.wait(list(self._tasks.values()), timeout=timeout)
+        return not running
+
+    async def stop(self):
+        for ingest in list(self._tasks.values()):
+            ingest.cancel()
+
+    def snapshot(self) -> dict:
+        return {
+            "ingesting": len(self._tasks),
+            "subscribers": task_events.subscriber_count()
+        }
+
+
+ingestion = IngestionWorker()
@@ -0,0 +1,123 @@
+import json
+import re
+from typing import List, Optional
+import logging
+
+from app.core.image_store import ImageStore, ImageWriter, StoredImage, image_store
+
+logger = logging.getLogger(__name__)
+
+_IMAGE_FIELD = re.compile(rb'"image"\s*:\s*"')
+LARGE_FRAME_BYTES = 10000
+
+
+class SSEFrameDecoder:
+    """Incremental parser for the Space SSE stream of a single task.
+
+    Regular frames are small and are parsed with ``json.loads`` once complete.
+    When the ``"image"`` field of a frame is reached its value is not buffered:
+    it is base64-decoded chunk by chunk into the image store and replaced by an
+    empty string in the frame, so the completion frame parses like any other
+    and the stored file is handed out next to it.
+    """
+
+    def __init__(self, task_id: str, store: Optional[ImageStore] = None):
+        self.task_id = task_id
+        self.store = store or image_store
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self._image: Optional[ImageWriter] = None
+        self._stored: Optional[StoredImage] = None
+
+    def feed(self, chunk: bytes) -> List[dict]:
+        """Feed raw stream bytes, returns the frames completed by this chunk"""
+        messages = []
+        data = chunk
+
+        while data:
+            if self._image is not None:
+                data = self._feed_image(data)
+                continue
+
+            self._buffer += data
+            data = b""
+
+            while True:
+                frame_end = self._buffer.find(b"\n\n")
+                head_end = len(self._buffer) if frame_end == -1 else frame_end
+
+                match = _IMAGE_FIELD.search(self._buffer, self._scan_from, head_end)
+                if match:
+                    data = bytes(self._buffer[match.end():])
+                    del self._buffer[match.end():]
+                    self._image = self.store.open_writer(self.task_id)
+                    break
+
+                if frame_end == -1:
+                    break
+
+                frame = bytes(self._buffer[:frame_end])
+                del self._buffer[:frame_end + 2]
+                self._scan_from = 0
+
+                message = self._parse_frame(frame)
+                if message is not None:
+                    messages.append(message)
+
+        if len(self._buffer) > LARGE_FRAME_BYTES:
+            logger.warning(f"⚠️ Large buffer for task {self.task_id}: {len(self._buffer)} bytes")
+
+        return messages
+
+    def _feed_image(self, data: bytes) -> bytes:
+        end = data.find(b'"')
+        self._image.write(data if end == -1 else data[:end])
+        if end == -1:
+            return b""
+
+        self._stored = self._image.close()
+        self._image = None
+        self._buffer += b'"'
+        self._scan_from = len(self._buffer)
+        return data[end + 1:]
+
+    def _parse_frame(self, frame: bytes) -> Optional[dict]:
+        stored, self._stored = self._stored, None
+
+        try:
+            message_str = frame.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            logger.error(f"❌ Failed to decode message for task {self.task_id}")
+            self._discard(stored)
+            return None
+
+        if not message_str.startswith("data: "):
+            self._discard(stored)
+            return None
+
+        try:
+            data = json.loads(message_str[6:].strip())
+        except json.JSONDecodeError as e:
+            logger.error(f"❌ JSON decode error in complete message: {e}")
+            self._discard(stored)
+            return None
+
+        if stored is not None:
+            if isinstance(data, dict) and isinstance(data.get("result"), dict):
+                data["result"]["stored_image"] = stored
+            else:
+                self._discard(stored)
+        return data
+
+    def _discard(self, stored: Optional[StoredImage]):
+        if stored is not None:
+            self.store.delete(stored.path)
+
+    def close(self):
+        """Drop any partial frame, removing a half written image"""
+        if self._image is not None:
+            self._image.abort()
+            self._image = None
+        self._discard(self._stored)
+        self._stored = None
+        self._buffer.clear()
@@ -0,0 +1,94 @@
+"""
+Registry of the upstream Space streams open in this worker.
+
+Cancellation closes a task's upstream responses so its relays stop right
+away instead of waiting for the Space to notice. The watchdog does the same
+for streams that have not delivered a message for STREAM_IDLE_TIMEOUT
+seconds, and a drain that runs out of time for the streams still open.
+Relays ask ``untrack`` why their stream ended to tell these cases apart
+from a dropped connection.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Set
+import logging
+
+from app.core.config import settings
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+stalled_streams = counter("space_streams_stalled_total", "Upstream streams aborted by the stall watchdog")
+
+CANCELLED = "cancelled"
+STALLED = "stalled"
+DRAINED = "drained"
+
+
+class UpstreamStreams:
+    def __init__(self):
+        self._open: Dict[str, Set] = {}
+        self._closed: Dict[str, str] = {}
+        self._last_progress: Dict[str, float] = {}
+
+    def track(self, task_id: str, response):
+        self._open.setdefault(task_id, set()).add(response)
+        self._last_progress[task_id] = time.monotonic()
+
+    def touch(self, task_id: str):
+        """Record that the task's stream delivered a message"""
+        if task_id in self._last_progress:
+            self._last_progress[task_id] = time.monotonic()
+
+    def untrack(self, task_id: str, response) -> Optional[str]:
+        """Forget a finished response, returns why it was closed by us, if it was"""
+        responses = self._open.get(task_id)
+        if responses is not None:
+            responses.discard(response)
+            if not responses:
+                del self._open[task_id]
+        reason = self._closed.get(task_id)
+        if task_id not in self._open:
+            self._closed.pop(task_id, None)
+            self._last_progress.pop(task_id, None)
+        return reason
+
+    def closed_reason(self, task_id: str) -> Optional[str]:
+        return self._closed.get(task_id)
+
+    def close(self, task_id: str, reason: str = CANCELLED) -> int:
+        """Close every open upstream response of the task"""
+        responses = self._open.get(task_id)
+        if not responses:
+            return 0
+        self._closed[task_id] = reason
+        for response in list(responses):
+            response.close()
+        logger.info(f"🛑 Closed {len(responses)} upstream stream(s) of task {task_id}: {reason}")
+        return len(responses)
+
+    def close_idle(self, idle_seconds: float) -> List[str]:
+        cutoff = time.monotonic() - idle_seconds
+        idle = [
+            task_id for task_id, last in self._last_progress.items()
+            if last < cutoff and task_id in self._open and task_id not in self._closed
+        ]
+        for task_id in idle:
+            logger.warning(f"⚠️ No progress from task {task_id} for {idle_seconds}s, aborting its stream")
+            self.close(task_id, STALLED)
+            stalled_streams.inc()
+        return idle
+
+    async def run_watchdog(self):
+        while True:
+            await asyncio.sleep(settings.STREAM_WATCHDOG_INTERVAL)
+            try:
+                self.close_idle(settings.STREAM_IDLE_TIMEOUT)
+            except Exception as e:
+                logger.error(f"❌ Stream watchdog failed: {e}")
+
+    def __len__(self):
+        return sum(len(responses) for responses in self._open.values())
+
+
+upstream_streams = UpstreamStreams()
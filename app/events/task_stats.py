@@ -0,0 +1,197 @@
+"""
+Incrementally maintained task statistics.
+
+Every status transition written by db_events updates three small tables
+in the same transaction:
+
+- ``task_status_counts``: one row per status with the number of tasks in
+  it, over both task tables.
+- ``task_stat_buckets``: per STATS_BUCKET_SECONDS bucket and finished
+  status, how many tasks got there, plus the count and sum of inference
+  times of the completed ones.
+- ``task_inference_bins``: a logarithmic quantile sketch of inference
+  times per bucket. A time falls into bin ``ceil(log_gamma(t / SKETCH_MIN))``,
+  so each bin's midpoint is within SKETCH_ACCURACY of every time in it.
+  Sketches of several buckets merge by adding up their bins.
+
+/tasks/stats reads at most one row per status, bucket and bin, whatever
+the size of the task tables.
+"""
+import datetime
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.db_models import TaskInferenceBin, TaskStatBucket, TaskStatus, TaskStatusCount
+
+# changing either invalidates the bins already stored
+SKETCH_ACCURACY = 0.02
+SKETCH_MIN = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(SKETCH_GAMMA)
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+FINISHED_STATUSES = {
+    TaskStatus.COMPLETED.value, TaskStatus.CANCELLED.value, TaskStatus.FAILED.value, TaskStatus.ERROR.value
+}
+
+
+def sketch_bin(seconds: float) -> int:
+    if seconds <= SKETCH_MIN:
+        return 0
+    return math.ceil(math.log(seconds / SKETCH_MIN) / _LOG_GAMMA)
+
+
+def bin_value(index: int) -> float:
+    """Estimate for the times in a bin, at most SKETCH_ACCURACY off any of them"""
+    if index <= 0:
+        return SKETCH_MIN
+    return SKETCH_MIN * 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1)
+
+
+def sketch_quantiles(bins: Sequence[Tuple[int, int]], quantiles: Iterable[float] = QUANTILES) -> Dict[str, Optional[float]]:
+    """``{"p50": seconds, ...}`` from ``(bin, samples)`` pairs sorted by bin"""
+    total = sum(samples for _, samples in bins)
+    result = {}
+    for q in quantiles:
+        key = f"p{round(q * 100):g}"
+        if not total:
+            result[key] = None
+            continue
+        rank = q * (total - 1)
+        seen = 0
+        for index, samples in bins:
+            seen += samples
+            if seen > rank:
+                result[key] = round(bin_value(index), 3)
+                break
+    return result
+
+
+def bucket_start(moment: datetime.datetime) -> datetime.datetime:
+    seconds = settings.STATS_BUCKET_SECONDS
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    offset = int((moment - midnight).total_seconds()) // seconds * seconds
+    return midnight + datetime.timedelta(seconds=offset)
+
+
+def _increment(model, keys: dict, increments: dict, db: Session):
+    """Add ``increments`` to the row of ``model`` at ``keys``, creating it on first use"""
+    table = model.__table__
+    statement = (
+        update(table)
+        .where(*(table.c[column] == value for column, value in keys.items()))
+        .values({table.c[column]: table.c[column] + delta for column, delta in increments.items()})
+    )
+    if db.execute(statement).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(table).values(**keys, **increments))
+    except IntegrityError:
+        # created by a concurrent transition since the UPDATE
+        db.execute(statement)
+
+
+def record_created(statuses: Iterable[str], db: Session):
+    """Count new tasks; part of the caller's transaction"""
+    table = TaskStatusCount.__table__
+    for status, count in Counter(statuses).items():
+        db.execute(update(table).where(table.c.status == status).values(tasks=table.c.tasks + count))
+
+
+def record_deleted(statuses: Iterable[str], db: Session):
+    """Uncount deleted tasks; part of the caller's transaction"""
+    table = TaskStatusCount.__table__
+    for status, count in Counter(statuses).items():
+        db.execute(update(table).where(table.c.status == status).values(tasks=table.c.tasks - count))
+
+
+def record_transition(previous: str, status: str, db: Session, count: int = 1, inference_time: Optional[float] = None):
+    """Move ``count`` tasks from ``previous`` to ``status``; part of the caller's transaction"""
+    if previous == status or count <= 0:
+        return
+    table = TaskStatusCount.__table__
+    db.execute(
+        update(table)
+        .where(table.c.status.in_([previous, status]))
+        .values(tasks=table.c.tasks + case((table.c.status == status, count), else_=-count))
+    )
+    if status not in FINISHED_STATUSES:
+        return
+
+    bucket = bucket_start(datetime.datetime.now())
+    increments = {"tasks": count}
+    if inference_time is not None and status == TaskStatus.COMPLETED.value:
+        increments.update(inference_count=1, inference_seconds=float(inference_time))
+        _increment(TaskInferenceBin, {"bucket_start": bucket, "bin": sketch_bin(inference_time)}, {"samples": 1}, db)
+    _increment(TaskStatBucket, {"bucket_start": bucket, "status": status}, increments, db)
+
+
+def reset_status_counts(db: Session):
+    """Zero the per-status counts after the task tables were emptied; part of the caller's transaction"""
+    db.execute(update(TaskStatusCount.__table__).values(tasks=0))
+
+
+def count_tasks(db: Session) -> int:
+    """Tasks over both task tables, from the per-status counts"""
+    return int(db.query(func.coalesce(func.sum(TaskStatusCount.tasks), 0)).scalar())
+
+
+def prune_task_stats(cutoff: datetime.datetime, db: Session) -> int:
+    """Delete buckets that start before ``cutoff``; returns the rows deleted"""
+    deleted = 0
+    for model in (TaskStatBucket, TaskInferenceBin):
+        deleted += db.query(model).filter(model.bucket_start < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def get_task_stats(hours: int, db: Session) -> dict:
+    """Counts per status, and finished tasks and inference times of the last ``hours``"""
+    since = bucket_start(datetime.datetime.now() - datetime.timedelta(hours=hours))
+
+    statuses = {status.value: 0 for status in TaskStatus}
+    statuses.update(db.query(TaskStatusCount.status, TaskStatusCount.tasks).all())
+
+    buckets: Dict[datetime.datetime, Dict[str, int]] = {}
+    inference_count, inference_seconds = 0, 0.0
+    rows = (
+        db.query(
+            TaskStatBucket.bucket_start, TaskStatBucket.status, TaskStatBucket.tasks,
+            TaskStatBucket.inference_count, TaskStatBucket.inference_seconds
+        )
+        .filter(TaskStatBucket.bucket_start >= since)
+        .order_by(TaskStatBucket.bucket_start)
+        .all()
+    )
+    for start, status, tasks, count, seconds in rows:
+        buckets.setdefault(start, {name: 0 for name in sorted(FINISHED_STATUSES)})[status] = tasks
+        inference_count += count
+        inference_seconds += seconds
+
+    bins: List[Tuple[int, int]] = (
+        db.query(TaskInferenceBin.bin, func.sum(TaskInferenceBin.samples))
+        .filter(TaskInferenceBin.bucket_start >= since)
+        .group_by(TaskInferenceBin.bin)
+        .order_by(TaskInferenceBin.bin)
+        .all()
+    )
+
+    return {
+        "statuses": statuses,
+        "total_tasks": sum(statuses.values()),
+        "window_hours": hours,
+        "bucket_seconds": settings.STATS_BUCKET_SECONDS,
+        "buckets": [{"bucket_start": start, **counts} for start, counts in buckets.items()],
+        "inference_time": {
+            "count": inference_count,
+            "mean": round(inference_seconds / inference_count, 3) if inference_count else None,
+            **sketch_quantiles([(index, int(samples)) for index, samples in bins])
+        }
+    }
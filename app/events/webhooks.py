@@ -0,0 +1,265 @@
+"""
+Completion webhooks.
+
+Tasks created with a ``callback_url`` get one signed POST when they reach a
+terminal status. ``notify`` only queues the task id; WEBHOOK_CONCURRENCY
+workers build the payload from the task row, log the delivery in
+``webhook_deliveries`` (one row per task and status, so repeated notifies
+deliver once) and post it, retrying connection errors, 429 and 5xx with
+jittered backoff. A delivery left pending by a worker that stopped is sent
+again from its logged payload once it has not been updated for
+WEBHOOK_STALE_AFTER seconds.
+
+Before every attempt the callback host is resolved, and the delivery fails
+without a request if any of its addresses is not public (loopback, private,
+link-local, ...), unless WEBHOOK_ALLOW_PRIVATE_TARGETS is set.
+
+Receivers verify ``X-Webhook-Signature``: ``sha256=`` followed by the hex
+HMAC-SHA256 of ``"{X-Webhook-Timestamp}." + body`` keyed with
+WEBHOOK_SECRET (or SECRET_KEY).
+"""
+import asyncio
+import datetime
+import hashlib
+import hmac
+import ipaddress
+import socket
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+import logging
+
+from app.core.config import settings
+from app.core.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"completed", "cancelled", "failed", "error"}
+REDELIVERY_BATCH_SIZE = 100
+
+deliveries_total = counter("webhook_deliveries_total", "Webhook deliveries by outcome", ["outcome"])
+
+
+class WebhookStatusError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"Receiver returned status code {status}")
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        return self.status == 429 or self.status >= 500
+
+
+class WebhookTargetError(Exception):
+    """The callback URL points at an address webhooks may not reach"""
+
+
+async def check_callback_target(url: str):
+    """Raise WebhookTargetError unless every address of the callback host is public"""
+    if settings.WEBHOOK_ALLOW_PRIVATE_TARGETS:
+        return
+    host = urlsplit(url).hostname
+    if not host:
+        raise WebhookTargetError("Callback URL has no host")
+    try:
+        addresses = [ipaddress.ip_address(host)]
+    except ValueError:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        addresses = [ipaddress.ip_address(info[4][0].split("%", 1)[0]) for info in infos]
+    for address in addresses:
+        if not address.is_global or address.is_multicast:
+            raise WebhookTargetError(f"Callback host {host} resolves to the non-public address {address}")
+
+
+def deliveries_token_matches(token: Optional[str]) -> bool:
+    expected = settings.WEBHOOK_DELIVERIES_TOKEN
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+def sign_payload(body: bytes, timestamp: str, secret: Optional[str] = None) -> str:
+    key = (secret or settings.WEBHOOK_SECRET or settings.SECRET_KEY).encode()
+    digest = hmac.new(key, timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def build_payload(task, image) -> dict:
+    image_payload = None
+    if image is not None:
+        image_payload = {
+            "id": image.id,
+            "url": f"{settings.PUBLIC_BASE_URL.rstrip('/')}/images/{image.id}/content" if image.image_path or image.archive_key else None,
+            "content_type": image.content_type,
+            "model_used": image.model_used
+        }
+    return {
+        "event": f"task.{task.status}",
+        "task": {
+            "task_id": task.task_id,
+            "status": task.status,
+            "progress": int(task.progress or 0),
+            "prompt": task.prompt,
+            "batch_id": task.batch_id,
+            "created_at": task.created_at,
+            "updated_at": task.updated_at
+        },
+        "image": image_payload
+    }
+
+
+class WebhookWorker:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=settings.WEBHOOK_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._run()) for _ in range(settings.WEBHOOK_CONCURRENCY)]
+
+    async def flush(self, timeout: float):
+        """Wait up to ``timeout`` seconds for queued deliveries, on shutdown"""
+        if self._queue is None or not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Shutting down with {self._queue.qsize()} webhook notifications still queued")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+    def notify(self, task_id: str):
+        """Queue a delivery check for a task that may have reached a terminal status"""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(task_id)
+        except asyncio.QueueFull:
+            deliveries_total.labels("dropped").inc()
+            logger.warning(f"⚠️ Webhook queue full, dropped notification for task {task_id}")
+
+    async def _run(self):
+        while True:
+            task_id = await self._queue.get()
+            try:
+                await self.deliver(task_id)
+            except Exception as e:
+                logger.error(f"❌ Webhook delivery for task {task_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def deliver(self, task_id: str):
+        import orjson
+        from app.events.db_events import create_webhook_delivery, get_webhook_subject, run_in_own_session
+
+        subject = await run_in_own_session(get_webhook_subject, task_id)
+        if subject is None:
+            return
+        task, image = subject
+        if task.status not in TERMINAL_STATUSES:
+            return
+
+        body = orjson.dumps(build_payload(task, image))
+        delivery_id = await run_in_own_session(
+            create_webhook_delivery, task_id, task.status, task.callback_url, body.decode()
+        )
+        if delivery_id is None:
+            return
+        await self._send(delivery_id, task_id, task.status, task.callback_url, body)
+
+    async def redeliver_stale(self) -> int:
+        """Send again the pending deliveries abandoned by a stopped worker; returns how many were sent"""
+        from app.events.db_events import claim_stale_webhook_deliveries, run_in_own_session
+
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=settings.WEBHOOK_STALE_AFTER)
+        slots = asyncio.Semaphore(settings.WEBHOOK_CONCURRENCY)
+
+        async def send(delivery):
+            async with slots:
+                logger.info(f"🔁 Redelivering abandoned {delivery.event} webhook for task {delivery.task_id}")
+                await self._send(
+                    delivery.id, delivery.task_id, delivery.event, delivery.url,
+                    delivery.payload.encode(), delivery.attempts
+                )
+
+        sent = 0
+        while True:
+            deliveries = await run_in_own_session(claim_stale_webhook_deliveries, cutoff, REDELIVERY_BATCH_SIZE)
+            await asyncio.gather(*(send(delivery) for delivery in deliveries))
+            sent += len(deliveries)
+            if len(deliveries) < REDELIVERY_BATCH_SIZE:
+                return sent
+
+    async def _send(self, delivery_id: int, task_id: str, status: str, url: str, body: bytes, previous_attempts: int = 0):
+        from app.events.db_events import run_in_own_session, update_webhook_delivery
+
+        attempts, status_code, error = await self._post(delivery_id, url, f"task.{status}", body)
+        attempts += previous_attempts
+        delivered = error is None
+        deliveries_total.labels("delivered" if delivered else "failed").inc()
+        await run_in_own_session(update_webhook_delivery, delivery_id, {
+            "status": "delivered" if delivered else "failed",
+            "attempts": attempts,
+            "last_status_code": status_code,
+            "last_error": error,
+            "delivered_at": datetime.datetime.now() if delivered else None
+        })
+
+        if delivered:
+            logger.info(f"📨 Delivered {status} webhook for task {task_id}")
+        else:
+            logger.warning(f"⚠️ Giving up on {status} webhook for task {task_id} after {attempts} attempts: {error}")
+
+    async def _post(self, delivery_id: int, url: str, event: str, body: bytes) -> Tuple[int, Optional[int], Optional[str]]:
+        """Returns (attempts, last status code, error or None)"""
+        from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+        from app.core.http_client import get_upstream_session
+        import aiohttp
+
+        state = {"attempts": 0, "status": None}
+
+        def retryable(e: BaseException) -> bool:
+            if isinstance(e, WebhookStatusError):
+                return e.retryable
+            return isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError, socket.gaierror))
+
+        async def attempt():
+            state["attempts"] += 1
+            # resolved on every attempt, so a host cannot be repointed after the first one
+            await check_callback_target(url)
+            timestamp = str(int(time.time()))
+            headers = {
+                "Content-Type": "application/json",
+                "X-Webhook-Event": event,
+                "X-Webhook-Delivery": str(delivery_id),
+                "X-Webhook-Timestamp": timestamp,
+                "X-Webhook-Signature": sign_payload(body, timestamp)
+            }
+            async with get_upstream_session().post(
+                url,
+                data=body,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=settings.WEBHOOK_TIMEOUT)
+            ) as response:
+                state["status"] = response.status
+                if response.status >= 400:
+                    raise WebhookStatusError(response.status)
+
+        try:
+            async for attempt_state in AsyncRetrying(
+                stop=stop_after_attempt(settings.WEBHOOK_MAX_ATTEMPTS),
+                wait=wait_random_exponential(multiplier=1, max=settings.WEBHOOK_BACKOFF_MAX),
+                retry=retry_if_exception(retryable),
+                reraise=True
+            ):
+                with attempt_state:
+                    await attempt()
+            return state["attempts"], state["status"], None
+        except Exception as e:
+            return state["attempts"], state["status"], str(e) or type(e).__name__
+
+
+webhooks = WebhookWorker()
@@ -1,29 +1,27 @@
 import logging
-import os
-import sys
-from dotenv import load_dotenv
-import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import traceback
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-load_dotenv() 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from app.core.logging_setup import setup_logging
+
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
-from app.core import shutdown_manager, lifespan
+from app.core.config import settings
+from app.core.lifespan import lifespan
+from app.schemas.errors import CircuitOpenError, SpaceAPIError
 from app.routes import (generate_image, get_generation_stream, 
                      get_generation_status, cancel_generation,
-                     delete_tasks, get_tasks, get_images, health_check)
+                     delete_tasks, get_tasks, get_images, health_check,
+                     readiness, metrics, webhooks, profiling)
 
-shutdown_manager.setup_signal_handlers()
 app = FastAPI(lifespan=lifespan)
+if settings.DB_QUERY_STATS_ENABLED:
+    from app.core.query_stats import QueryStatsMiddleware
+
+    app.add_middleware(QueryStatsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -37,13 +35,36 @@ app.add_middleware(
 )
 
 app.include_router(health_check)
+app.include_router(readiness)
 app.include_router(generate_image)
 app.include_router(get_generation_stream)
 app.include_router(get_generation_status)
 app.include_router(cancel_generation)
 app.include_router(delete_tasks)
 app.include_router(get_tasks)
-app.include_router(get_images)  
+app.include_router(get_images)
+app.include_router(metrics)
+app.include_router(webhooks)
+
+if settings.PROFILING_ENABLED:
+    from app.core.profiler import ProfilingMiddleware
+
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(profiling)
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after) + 1)}
+    )
+
+@app.exception_handler(SpaceAPIError)
+async def space_api_error_handler(request: Request, exc: SpaceAPIError):
+    return JSONResponse(status_code=502, content={"message": str(exc)})  
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import uvicorn
+    # backstop for connections still open once the drain has aborted its work
+    uvicorn.run(app, host="0.0.0.0", port=8000, timeout_graceful_shutdown=int(settings.DRAIN_TIMEOUT) + 10)
\ No newline at end of file
@@ -0,0 +1,50 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.core.database import Base, get_engine
+from app.models import db_models  # noqa: F401 - registers the tables on Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL without connecting to the database."""
+    context.configure(
+        url=get_engine().url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Run the migrations with a connection from the application engine."""
+    connection = config.attributes.get("connection")
+
+    if connection is None:
+        with get_engine().connect() as connection:
+            _run(connection)
+    else:
+        _run(connection)
+
+
+def _run(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,37 @@
+"""Helpers shared by the revisions in app/migrations/versions."""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import mysql
+
+
+def dialect() -> str:
+    return op.get_bind().dialect.name
+
+
+def schema():
+    """Tables live in ``dbo`` on the SQL Server development database"""
+    return "dbo" if dialect() == "mssql" else None
+
+
+def long_text():
+    return sa.Text().with_variant(mysql.LONGTEXT(), "mysql")
+
+
+def has_table(table: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(table, schema=schema())
+
+
+def has_column(table: str, column: str) -> bool:
+    columns = sa.inspect(op.get_bind()).get_columns(table, schema=schema())
+    return column in {c["name"] for c in columns}
+
+
+def has_index(table: str, index: str) -> bool:
+    indexes = sa.inspect(op.get_bind()).get_indexes(table, schema=schema())
+    return index in {i["name"] for i in indexes}
+
+
+def foreign_keys_to(table: str, referred_table: str) -> list:
+    """Names of ``table``'s foreign keys on ``referred_table``; SQLite's are unnamed and left out"""
+    foreign_keys = sa.inspect(op.get_bind()).get_foreign_keys(table, schema=schema())
+    return [fk["name"] for fk in foreign_keys if fk["referred_table"] == referred_table and fk["name"]]
@@ -0,0 +1,82 @@
+"""initial tasks and images schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 00:00:00
+
+Databases that were set up by the old create_all/manual DDL on startup
+already have both tables; for those only the missing columns and
+indexes are added, so the revision can be stamped onto any existing
+deployment with a plain upgrade.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import has_column, has_index, has_table, long_text, schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    tasks_fk = 'dbo.tasks.task_id' if schema() else 'tasks.task_id'
+
+    if not has_table('tasks'):
+        op.create_table(
+            'tasks',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('task_id', sa.String(36), nullable=False),
+            sa.Column('status', sa.String(20), server_default='pending'),
+            sa.Column('progress', sa.Integer(), server_default='0'),
+            sa.Column('prompt', long_text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+            schema=schema()
+        )
+        op.create_index('ix_tasks_task_id', 'tasks', ['task_id'], unique=True, schema=schema())
+
+    if not has_index('tasks', 'idx_tasks_status'):
+        op.create_index('idx_tasks_status', 'tasks', ['status'], schema=schema())
+    if not has_index('tasks', 'idx_tasks_created_at'):
+        op.create_index('idx_tasks_created_at', 'tasks', ['created_at'], schema=schema())
+
+    if not has_table('images'):
+        op.create_table(
+            'images',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column(
+                'task_id', sa.String(36),
+                sa.ForeignKey(tasks_fk, ondelete='SET NULL'),
+                nullable=True
+            ),
+            sa.Column('image_data', long_text(), nullable=True),
+            sa.Column('image_path', sa.String(255), nullable=True),
+            sa.Column('content_type', sa.String(50), nullable=True),
+            sa.Column('prompt', long_text(), nullable=True),
+            sa.Column('model_used', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+            schema=schema()
+        )
+        op.create_index('ix_images_task_id', 'images', ['task_id'], unique=True, schema=schema())
+    else:
+        for column in (
+            sa.Column('image_path', sa.String(255), nullable=True),
+            sa.Column('content_type', sa.String(50), nullable=True),
+            sa.Column('model_used', sa.Text(), nullable=True),
+        ):
+            if not has_column('images', column.name):
+                op.add_column('images', column, schema=schema())
+
+    if not has_index('images', 'idx_images_created_at'):
+        op.create_index('idx_images_created_at', 'images', ['created_at'], schema=schema())
+
+
+def downgrade() -> None:
+    op.drop_table('images', schema=schema())
+    op.drop_table('tasks', schema=schema())
@@ -0,0 +1,28 @@
+"""pin tasks to the backend they were submitted to
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('backend_url', sa.String(255), nullable=True), schema=schema())
+
+
+def downgrade() -> None:
+    op.drop_column('tasks', 'backend_url', schema=schema())
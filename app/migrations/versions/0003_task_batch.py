@@ -0,0 +1,30 @@
+"""group tasks submitted through /generate/batch
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('batch_id', sa.String(36), nullable=True), schema=schema())
+    op.create_index('ix_tasks_batch_id', 'tasks', ['batch_id'], schema=schema())
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_batch_id', table_name='tasks', schema=schema())
+    op.drop_column('tasks', 'batch_id', schema=schema())
@@ -0,0 +1,52 @@
+"""completion webhooks: task callback url and delivery log
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import long_text, schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('callback_url', sa.String(1024), nullable=True), schema=schema())
+
+    op.create_table(
+        'webhook_deliveries',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('task_id', sa.String(36), nullable=False),
+        sa.Column('event', sa.String(20), nullable=False),
+        sa.Column('url', sa.String(1024), nullable=False),
+        sa.Column('payload', long_text(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_status_code', sa.Integer(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+        schema=schema()
+    )
+    op.create_index(
+        'ix_webhook_deliveries_task_event', 'webhook_deliveries', ['task_id', 'event'],
+        unique=True, schema=schema()
+    )
+    op.create_index('ix_webhook_deliveries_status', 'webhook_deliveries', ['status'], schema=schema())
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_deliveries_status', table_name='webhook_deliveries', schema=schema())
+    op.drop_index('ix_webhook_deliveries_task_event', table_name='webhook_deliveries', schema=schema())
+    op.drop_table('webhook_deliveries', schema=schema())
+    op.drop_column('tasks', 'callback_url', schema=schema())
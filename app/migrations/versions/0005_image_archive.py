@@ -0,0 +1,38 @@
+"""image archive pointers for packed cold storage
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('archive_key', sa.String(255), nullable=True), schema=schema())
+    op.add_column('images', sa.Column('archive_offset', sa.BigInteger(), nullable=True), schema=schema())
+    op.add_column('images', sa.Column('archive_length', sa.Integer(), nullable=True), schema=schema())
+    op.add_column('images', sa.Column('archive_codec', sa.String(10), nullable=True), schema=schema())
+    op.add_column('images', sa.Column('archived_at', sa.DateTime(timezone=True), nullable=True), schema=schema())
+    op.create_index('ix_images_archive_key', 'images', ['archive_key'], schema=schema())
+
+
+def downgrade() -> None:
+    op.drop_index('ix_images_archive_key', table_name='images', schema=schema())
+    op.drop_column('images', 'archived_at', schema=schema())
+    op.drop_column('images', 'archive_codec', schema=schema())
+    op.drop_column('images', 'archive_length', schema=schema())
+    op.drop_column('images', 'archive_offset', schema=schema())
+    op.drop_column('images', 'archive_key', schema=schema())
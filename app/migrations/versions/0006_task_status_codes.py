@@ -0,0 +1,138 @@
+"""task status codes and the tasks_active / tasks_history split
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+
+``tasks`` becomes ``tasks_active`` and keeps its rows; finished tasks
+are moved into the new ``tasks_history``, which numbers them itself. ``status`` turns from a string into a SMALLINT code (the
+mapping below is frozen, see ``STATUS_CODES`` in app/models/db_models.py)
+indexed together with ``created_at``. The images foreign key on
+tasks.task_id is dropped, since the task row now moves between tables.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import foreign_keys_to, has_index, long_text, schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUS_CODES = {
+    'pending': 0,
+    'processing': 1,
+    'completed': 2,
+    'cancelled': 3,
+    'failed': 4,
+    'error': 5,
+}
+ACTIVE_CODES = (STATUS_CODES['pending'], STATUS_CODES['processing'])
+OLD_INDEXES = ('ix_tasks_task_id', 'ix_tasks_batch_id', 'idx_tasks_status', 'idx_tasks_created_at')
+TASK_COLUMNS = (
+    'task_id', 'status', 'progress', 'prompt', 'backend_url',
+    'batch_id', 'callback_url', 'created_at', 'updated_at'
+)
+
+
+def task_table(name: str, *columns: str) -> sa.Table:
+    return sa.table(name, *(sa.column(column) for column in columns), schema=schema())
+
+
+def create_task_indexes(table: str):
+    op.create_index(f'ix_{table}_task_id', table, ['task_id'], unique=True, schema=schema())
+    op.create_index(f'ix_{table}_batch_id', table, ['batch_id'], schema=schema())
+    op.create_index(f'ix_{table}_status_created', table, ['status', 'created_at'], schema=schema())
+
+
+def drop_task_indexes(table: str):
+    for suffix in ('task_id', 'batch_id', 'status_created'):
+        op.drop_index(f'ix_{table}_{suffix}', table_name=table, schema=schema())
+
+
+def upgrade() -> None:
+    for name in foreign_keys_to('images', 'tasks'):
+        op.drop_constraint(name, 'images', type_='foreignkey', schema=schema())
+
+    op.rename_table('tasks', 'tasks_active', schema=schema())
+    for index in OLD_INDEXES:
+        if has_index('tasks_active', index):
+            op.drop_index(index, table_name='tasks_active', schema=schema())
+
+    op.add_column('tasks_active', sa.Column('status_code', sa.SmallInteger(), nullable=True), schema=schema())
+    tasks = task_table('tasks_active', 'status', 'status_code')
+    op.execute(
+        tasks.update().values(status_code=sa.case(
+            STATUS_CODES, value=tasks.c.status, else_=STATUS_CODES['error']
+        ))
+    )
+    with op.batch_alter_table('tasks_active', schema=schema()) as batch:
+        batch.drop_column('status', mssql_drop_default=True)
+        batch.alter_column(
+            'status_code', new_column_name='status', existing_type=sa.SmallInteger(),
+            nullable=False, server_default=sa.text(str(STATUS_CODES['pending']))
+        )
+
+    op.create_table(
+        'tasks_history',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('task_id', sa.String(36), nullable=False),
+        sa.Column('status', sa.SmallInteger(), nullable=False),
+        sa.Column('progress', sa.Integer(), server_default='0'),
+        sa.Column('prompt', long_text(), nullable=True),
+        sa.Column('backend_url', sa.String(255), nullable=True),
+        sa.Column('batch_id', sa.String(36), nullable=True),
+        sa.Column('callback_url', sa.String(1024), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        schema=schema()
+    )
+
+    active = task_table('tasks_active', *TASK_COLUMNS)
+    history = task_table('tasks_history', *TASK_COLUMNS)
+    finished = active.c.status.notin_(ACTIVE_CODES)
+    op.execute(history.insert().from_select(
+        TASK_COLUMNS, sa.select(*active.c).where(finished).order_by(sa.column('id'))
+    ))
+    op.execute(active.delete().where(finished))
+
+    create_task_indexes('tasks_active')
+    create_task_indexes('tasks_history')
+
+
+def downgrade() -> None:
+    active = task_table('tasks_active', *TASK_COLUMNS)
+    history = task_table('tasks_history', *TASK_COLUMNS)
+    op.execute(active.insert().from_select(TASK_COLUMNS, sa.select(*history.c).order_by(sa.column('id'))))
+    drop_task_indexes('tasks_history')
+    op.drop_table('tasks_history', schema=schema())
+    drop_task_indexes('tasks_active')
+
+    op.add_column('tasks_active', sa.Column('status_name', sa.String(20), nullable=True), schema=schema())
+    tasks = task_table('tasks_active', 'status', 'status_name')
+    op.execute(
+        tasks.update().values(status_name=sa.case(
+            {code: name for name, code in STATUS_CODES.items()}, value=tasks.c.status
+        ))
+    )
+    with op.batch_alter_table('tasks_active', schema=schema()) as batch:
+        batch.drop_column('status', mssql_drop_default=True)
+        batch.alter_column(
+            'status_name', new_column_name='status', existing_type=sa.String(20),
+            server_default='pending'
+        )
+
+    op.rename_table('tasks_active', 'tasks', schema=schema())
+    op.create_index('ix_tasks_task_id', 'tasks', ['task_id'], unique=True, schema=schema())
+    op.create_index('ix_tasks_batch_id', 'tasks', ['batch_id'], schema=schema())
+    op.create_index('idx_tasks_status', 'tasks', ['status'], schema=schema())
+    op.create_index('idx_tasks_created_at', 'tasks', ['created_at'], schema=schema())
+    op.create_foreign_key(
+        None, 'images', 'tasks', ['task_id'], ['task_id'],
+        ondelete='SET NULL', source_schema=schema(), referent_schema=schema()
+    )
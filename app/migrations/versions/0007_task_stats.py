@@ -0,0 +1,68 @@
+"""task statistics tables
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:00:00
+
+The per-status counts are seeded from both task tables; the time buckets
+and the inference time sketch start empty, inference times of past tasks
+were never stored.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# pending, processing, completed, cancelled, failed, error, as frozen in 0006
+STATUS_CODES = (0, 1, 2, 3, 4, 5)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'task_status_counts',
+        sa.Column('status', sa.SmallInteger(), primary_key=True, autoincrement=False),
+        sa.Column('tasks', sa.BigInteger(), nullable=False, server_default='0'),
+        schema=schema()
+    )
+    op.create_table(
+        'task_stat_buckets',
+        sa.Column('bucket_start', sa.DateTime(), primary_key=True),
+        sa.Column('status', sa.SmallInteger(), primary_key=True, autoincrement=False),
+        sa.Column('tasks', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('inference_count', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('inference_seconds', sa.Float(), nullable=False, server_default='0'),
+        schema=schema()
+    )
+    op.create_table(
+        'task_inference_bins',
+        sa.Column('bucket_start', sa.DateTime(), primary_key=True),
+        sa.Column('bin', sa.SmallInteger(), primary_key=True, autoincrement=False),
+        sa.Column('samples', sa.BigInteger(), nullable=False, server_default='0'),
+        schema=schema()
+    )
+
+    counts = sa.table('task_status_counts', sa.column('status'), sa.column('tasks'), schema=schema())
+    task_tables = [
+        sa.table(name, sa.column('status'), schema=schema()) for name in ('tasks_active', 'tasks_history')
+    ]
+    for code in STATUS_CODES:
+        tasks = sum(
+            sa.select(sa.func.count()).select_from(table).where(table.c.status == code).scalar_subquery()
+            for table in task_tables
+        )
+        op.execute(counts.insert().from_select(['status', 'tasks'], sa.select(sa.literal(code), tasks)))
+
+
+def downgrade() -> None:
+    op.drop_table('task_inference_bins', schema=schema())
+    op.drop_table('task_stat_buckets', schema=schema())
+    op.drop_table('task_status_counts', schema=schema())
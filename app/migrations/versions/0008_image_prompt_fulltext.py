@@ -0,0 +1,31 @@
+"""FULLTEXT index on images.prompt for /images?q= on MySQL
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 00:00:00
+
+Other databases search through the SQLite FTS5 sidecar of
+app.core.search and get no index here.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.migrations.utils import dialect, schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if dialect() == 'mysql':
+        op.create_index('ix_images_prompt_fulltext', 'images', ['prompt'], mysql_prefix='FULLTEXT', schema=schema())
+
+
+def downgrade() -> None:
+    if dialect() == 'mysql':
+        op.drop_index('ix_images_prompt_fulltext', table_name='images', schema=schema())
@@ -0,0 +1,33 @@
+"""perceptual hash and duplicate pointer on images
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 00:00:00
+
+Existing images are hashed by the similarity backfill job, not here.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('phash', sa.BigInteger(), nullable=True), schema=schema())
+    op.add_column('images', sa.Column('duplicate_of', sa.Integer(), nullable=True), schema=schema())
+    op.create_index('ix_images_duplicate_of', 'images', ['duplicate_of'], schema=schema())
+
+
+def downgrade() -> None:
+    op.drop_index('ix_images_duplicate_of', table_name='images', schema=schema())
+    op.drop_column('images', 'duplicate_of', schema=schema())
+    op.drop_column('images', 'phash', schema=schema())
@@ -0,0 +1,48 @@
+"""bulk deletion jobs
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'deletion_jobs',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('job_id', sa.String(36), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('filters', sa.Text(), nullable=False),
+        sa.Column('phase', sa.String(20), nullable=True),
+        sa.Column('last_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('tasks_deleted', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('images_deleted', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('files_deleted', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        schema=schema()
+    )
+    op.create_index('ix_deletion_jobs_job_id', 'deletion_jobs', ['job_id'], unique=True, schema=schema())
+    op.create_index('ix_deletion_jobs_status', 'deletion_jobs', ['status'], schema=schema())
+
+
+def downgrade() -> None:
+    op.drop_index('ix_deletion_jobs_status', table_name='deletion_jobs', schema=schema())
+    op.drop_index('ix_deletion_jobs_job_id', table_name='deletion_jobs', schema=schema())
+    op.drop_table('deletion_jobs', schema=schema())
@@ -0,0 +1,31 @@
+"""last update time of webhook deliveries
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 00:00:00
+
+Pending deliveries not updated for WEBHOOK_STALE_AFTER seconds are sent again.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrations.utils import schema
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('webhook_deliveries', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True), schema=schema())
+    op.create_index('ix_webhook_deliveries_status_updated', 'webhook_deliveries', ['status', 'updated_at'], schema=schema())
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_deliveries_status_updated', table_name='webhook_deliveries', schema=schema())
+    op.drop_column('webhook_deliveries', 'updated_at', schema=schema())
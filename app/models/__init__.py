@@ -1,3 +1,3 @@
-from .db_models import Base, Image, Task, TaskStatus
+from .db_models import Base, DeletionJob, Image, Task, TaskHistory, TaskStatus
 
-__all__ = ['Base', 'Image', 'Task', 'TaskStatus']
\ No newline at end of file
+__all__ = ['Base', 'DeletionJob', 'Image', 'Task', 'TaskHistory', 'TaskStatus']
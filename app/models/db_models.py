@@ -1,12 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, Float, Integer, SmallInteger, String, DateTime, Text, Index
 from sqlalchemy.sql import func
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator
 import enum
 
 from app.core.config import settings
+from app.core.database import Base
 
-Base = declarative_base()
+SCHEMA_ARGS = ({'schema': 'dbo'},) if settings.is_development else ()
 
 class TaskStatus(enum.Enum):
     PENDING = "pending"
@@ -16,20 +16,103 @@ class TaskStatus(enum.Enum):
     FAILED = "failed"
     ERROR = "error"
 
-class Task(Base):
-    __tablename__ = "tasks"
-    if settings.is_development:
-        __table_args__ = {'schema': 'dbo'} 
-    
-    id = Column(Integer, primary_key=True, index=True)
+    @property
+    def code(self) -> int:
+        return STATUS_CODES[self.value]
+
+    @classmethod
+    def from_code(cls, code: int) -> "TaskStatus":
+        return cls(STATUS_NAMES[code])
+
+# stored in the tasks tables: add new statuses at the end, never renumber
+STATUS_CODES = {
+    TaskStatus.PENDING.value: 0,
+    TaskStatus.PROCESSING.value: 1,
+    TaskStatus.COMPLETED.value: 2,
+    TaskStatus.CANCELLED.value: 3,
+    TaskStatus.FAILED.value: 4,
+    TaskStatus.ERROR.value: 5,
+}
+STATUS_NAMES = {code: status for status, code in STATUS_CODES.items()}
+
+class StatusCode(TypeDecorator):
+    """A TaskStatus value in Python, its small integer code in the database"""
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, TaskStatus):
+            value = value.value
+        try:
+            return STATUS_CODES[value]
+        except KeyError:
+            raise ValueError(f"Unknown task status '{value}'")
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else STATUS_NAMES[value]
+
+class TaskColumns:
+    """Columns of a task row, shared by the active and the history table"""
     task_id = Column(String(36), unique=True, index=True)
-    status = Column(String(20), default="pending")
+    status = Column(StatusCode, default=TaskStatus.PENDING.value, nullable=False)
     progress = Column(Integer, default=0)
     prompt = Column(Text, nullable=True)
+    backend_url = Column(String(255), nullable=True)
+    batch_id = Column(String(36), nullable=True, index=True)
+    callback_url = Column(String(1024), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    
-    image = relationship("Image", back_populates="task", uselist=False)
+
+class Task(TaskColumns, Base):
+    """Pending and processing tasks, plus finished ones until they move to TaskHistory"""
+    __tablename__ = "tasks_active"
+    __table_args__ = (
+        Index("ix_tasks_active_status_created", "status", "created_at"),
+    ) + SCHEMA_ARGS
+
+    id = Column(Integer, primary_key=True, index=True)
+
+class TaskHistory(TaskColumns, Base):
+    """Finished tasks, moved out of tasks_active by the history mover"""
+    __tablename__ = "tasks_history"
+    __table_args__ = (
+        Index("ix_tasks_history_status_created", "status", "created_at"),
+    ) + SCHEMA_ARGS
+
+    # its own sequence, ids of tasks_active can be reused once their rows moved here
+    id = Column(Integer, primary_key=True, index=True)
+
+TASK_TABLES = (Task, TaskHistory)
+
+class TaskStatusCount(Base):
+    """Number of tasks in each status over both task tables, see app.events.task_stats"""
+    __tablename__ = "task_status_counts"
+    __table_args__ = SCHEMA_ARGS
+
+    status = Column(StatusCode, primary_key=True, autoincrement=False)
+    tasks = Column(BigInteger, nullable=False, default=0)
+
+class TaskStatBucket(Base):
+    """Tasks that reached a finished status within one STATS_BUCKET_SECONDS bucket"""
+    __tablename__ = "task_stat_buckets"
+    __table_args__ = SCHEMA_ARGS
+
+    bucket_start = Column(DateTime, primary_key=True)
+    status = Column(StatusCode, primary_key=True, autoincrement=False)
+    tasks = Column(BigInteger, nullable=False, default=0)
+    inference_count = Column(BigInteger, nullable=False, default=0)
+    inference_seconds = Column(Float, nullable=False, default=0)
+
+class TaskInferenceBin(Base):
+    """Inference time sketch of one bucket: samples per logarithmic bin"""
+    __tablename__ = "task_inference_bins"
+    __table_args__ = SCHEMA_ARGS
+
+    bucket_start = Column(DateTime, primary_key=True)
+    bin = Column(SmallInteger, primary_key=True, autoincrement=False)
+    samples = Column(BigInteger, nullable=False, default=0)
 
 class Image(Base):
     __tablename__ = "images"
@@ -37,18 +120,63 @@ class Image(Base):
         __table_args__ = {'schema': 'dbo'}   
     
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(
-        String(36),
-        ForeignKey(
-            'dbo.tasks.task_id' if settings.is_development else 'tasks.task_id',
-            ondelete='SET NULL'
-        ),
-        unique=True,
-        index=True
-    )
+    # no foreign key, the task row moves between tasks_active and tasks_history
+    task_id = Column(String(36), unique=True, index=True)
     image_data = Column(Text, nullable=True)
+    image_path = Column(String(255), nullable=True)
+    content_type = Column(String(50), nullable=True)
     prompt = Column(Text, nullable=True)
     model_used = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    
-    task = relationship("Task", back_populates="image", passive_deletes=True)
\ No newline at end of file
+    # pointer into an archive pack, see app.core.archive
+    archive_key = Column(String(255), nullable=True, index=True)
+    archive_offset = Column(BigInteger, nullable=True)
+    archive_length = Column(Integer, nullable=True)
+    archive_codec = Column(String(10), nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=True)
+    # 64-bit perceptual hash stored signed, see app.core.similarity
+    phash = Column(BigInteger, nullable=True)
+    duplicate_of = Column(Integer, nullable=True, index=True)
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        Index("ix_webhook_deliveries_task_event", "task_id", "event", unique=True),
+        Index("ix_webhook_deliveries_status", "status"),
+        Index("ix_webhook_deliveries_status_updated", "status", "updated_at"),
+    ) + SCHEMA_ARGS
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(String(36), nullable=False)
+    event = Column(String(20), nullable=False)
+    url = Column(String(1024), nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String(20), default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_status_code = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    delivered_at = Column(DateTime(timezone=True), nullable=True)
+
+class DeletionJob(Base):
+    """A bulk delete of tasks and their images, run in batches by app.events.deletion"""
+    __tablename__ = "deletion_jobs"
+    __table_args__ = (
+        Index("ix_deletion_jobs_status", "status"),
+    ) + SCHEMA_ARGS
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String(36), unique=True, index=True, nullable=False)
+    status = Column(String(20), default="pending", nullable=False)
+    filters = Column(Text, nullable=False)
+    # resume point: the task table being deleted from and the last id done in it
+    phase = Column(String(20), nullable=True)
+    last_id = Column(Integer, default=0, nullable=False)
+    tasks_deleted = Column(Integer, default=0, nullable=False)
+    images_deleted = Column(Integer, default=0, nullable=False)
+    files_deleted = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -7,6 +7,10 @@ from .task_status import router as get_generation_status
 from .generate_stream import router as get_generation_stream
 from .cancel_generation import router as cancel_generation
 from .health_check import router as health_check
+from .readiness import router as readiness
+from .metrics import router as metrics
+from .webhooks import router as webhooks
+from .profiling import router as profiling
 
 __all__ = [
   'get_images', 
@@ -16,5 +20,9 @@ __all__ = [
   'get_generation_status', 
   'get_generation_stream', 
   'delete_tasks',
-  'health_check'
+  'health_check',
+  'readiness',
+  'metrics',
+  'webhooks',
+  'profiling'
 ]
\ No newline at end of file
@@ -1,13 +1,11 @@
 import logging
-import os
-import sys
-from dotenv import load_dotenv
 from fastapi import APIRouter
-import requests
 from app.schemas.schemas import CancellationResponse
-load_dotenv() 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))    
-from app.core.config import settings
+from app.core.backends import backend_pool
+from app.core.dispatcher import dispatcher
+from app.events.db_events import cancel_task_in_db, get_task_backend_url, run_in_own_session
+from app.events.streams import upstream_streams
+from app.events.webhooks import webhooks
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -15,16 +13,39 @@ router = APIRouter()
 @router.post("/cancel-generation/{task_id}", response_model=CancellationResponse)
 async def cancel_generation(task_id:str):
 
-    try:    
-        cancel_response = requests.post(
-            f"{settings.HF_SPACE_URL}/cancel-generation/{task_id}",
-            headers={
-                "Authorization": f"Bearer {settings.HF_TOKEN}"
-            },
-            timeout=10
-        )
-        
-        if cancel_response.status_code == 200:
+    try:
+        if not await run_in_own_session(cancel_task_in_db, task_id):
+            return CancellationResponse(
+                success=False,
+                message=f"Generation task {task_id} is not pending or processing",
+                task_id=task_id
+            )
+        webhooks.notify(task_id)
+
+        if dispatcher.cancel(task_id):
+            return CancellationResponse(
+                success=True,
+                message=f"Generation task {task_id} cancelled before dispatch",
+                task_id=task_id
+            )
+
+        backend = backend_pool.backend_of(task_id)
+        if backend is None:
+            backend_url = await run_in_own_session(get_task_backend_url, task_id)
+            if backend_url is None:
+                # still queued on another worker, which skips cancelled rows
+                return CancellationResponse(
+                    success=True,
+                    message=f"Generation task {task_id} cancelled before dispatch",
+                    task_id=task_id
+                )
+            backend = backend_pool.get(backend_url)
+
+        upstream_streams.close(task_id)
+        backend_pool.release(task_id)
+        dispatcher.forget(task_id)
+
+        if await dispatcher.cancel_upstream(task_id, backend):
             return CancellationResponse(
                 success=True,
                 message=f"Generation task {task_id} cancelled successfully",
@@ -32,16 +53,14 @@ async def cancel_generation(task_id:str):
             )
         else:
             return CancellationResponse(
-                success=False,
-                message=f"Failed to cancel generation task {task_id}. Status code: {cancel_response.status_code}",
+                success=True,
+                message=f"Generation task {task_id} cancelled; the Space did not confirm the cancellation",
                 task_id=task_id
             )
     except Exception as e:
-        logger.error(f"❌ Error cancelling generation task: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Error cancelling generation task: {e}")
         return CancellationResponse(
             success=False,
             message=f"Error cancelling generation task: {str(e)}",
             task_id=task_id
-        )
\ No newline at end of file
+        )
@@ -1,36 +1,93 @@
-
-from fastapi import APIRouter
+import datetime
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.events.cleanup import process_deletion_jobs
+from app.events.deletion import DeletionFilters, create_deletion_job, get_deletion_job
+from app.events.task_stats import count_tasks
+from app.schemas.schemas import DeletionJobRequest, DeletionJobResponse, DeletionResponse
+import logging
 
-from app.events.db_events import delete_all_tasks, get_all_tasks
-from app.schemas.schemas import DeletionResponse
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter()
 
 @router.delete("/delete-tasks")
-async def delete_tasks():
-    ongoing_tasks = get_all_tasks()
-
+def delete_tasks(request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """Deletes every task and its image through a background deletion job"""
     try:
-        if not ongoing_tasks or len(ongoing_tasks) == 0:
+        total_tasks = count_tasks(db)
+        if total_tasks == 0:
             return DeletionResponse(
                 success=False,
                 message=f"No tasks found to delete"
             )
-        
-        total_tasks = len(ongoing_tasks)
-        delete_all_tasks()
-        
+
+        job_id = create_deletion_job(DeletionFilters(created_before=datetime.datetime.now()), db)
+        background_tasks.add_task(process_deletion_jobs, request.app)
+
         return DeletionResponse(
             success=True,
-            message=f"Deleted {total_tasks} tasks successfully"
+            message=f"Deleting {total_tasks} tasks, follow /delete-jobs/{job_id}",
+            job_id=job_id
         )
-        
+
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ Failed to delete tasks: {e}")
         return JSONResponse(
             status_code=500,
             content={"status": "error", "message": f"Failed to delete tasks: {str(e)}"}
         )
+
+@router.post("/delete-jobs", status_code=202, response_model=DeletionResponse)
+def create_delete_job(
+    job_request: DeletionJobRequest,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    created_before = job_request.created_before
+    if created_before is not None and created_before.tzinfo is not None:
+        # task timestamps are naive local times
+        created_before = created_before.astimezone().replace(tzinfo=None)
+    if job_request.older_than_seconds is not None:
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=job_request.older_than_seconds)
+        created_before = min(created_before, cutoff) if created_before else cutoff
+
+    filters = DeletionFilters(
+        statuses=job_request.statuses,
+        created_before=created_before,
+        prompt_contains=job_request.prompt_contains,
+        task_ids=job_request.task_ids
+    )
+    if not any(value for value in filters.__dict__.values()) and not job_request.all:
+        raise HTTPException(status_code=400, detail={"message": "No filters given; set all=true to delete every task"})
+    # tasks created after the request are not part of it
+    if filters.created_before is None:
+        filters.created_before = datetime.datetime.now()
+
+    job_id = create_deletion_job(filters, db)
+    background_tasks.add_task(process_deletion_jobs, request.app)
+    return DeletionResponse(success=True, message=f"Deletion job {job_id} accepted", job_id=job_id)
+
+@router.get("/delete-jobs/{job_id}", response_model=DeletionJobResponse)
+def get_delete_job(job_id: str, db: Session = Depends(get_db)):
+    job = get_deletion_job(job_id, db)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"message": f"No deletion job with ID: {job_id}"})
+    return DeletionJobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        filters=DeletionFilters.from_json(job.filters).__dict__,
+        phase=job.phase,
+        tasks_deleted=job.tasks_deleted,
+        images_deleted=job.images_deleted,
+        files_deleted=job.files_deleted,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+        finished_at=job.finished_at
+    )
@@ -1,144 +1,165 @@
 from datetime import datetime
-import os
-import sys
-import time
-from dotenv import load_dotenv
+import uuid
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-import requests
-from requests.exceptions import Timeout, RequestException, HTTPError, ConnectionError
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-load_dotenv() 
-from app.events.db_events import save_task_to_db
-from app.schemas.schemas import GenerateRequest, GenerationResponse
-from app.core.database import get_db
+from app.events.db_events import save_task_to_db, save_tasks_to_db
+from app.schemas.schemas import GenerateRequest, GenerationResponse, BatchGenerationResponse
 from app.core.config import settings
-from app.schemas.errors import SpaceAPIError
+from app.core.database import get_db
+from app.core.backends import backend_pool
+from app.core.dispatcher import dispatcher
+from app.core.drain import drainer
+from app.schemas.errors import CircuitOpenError, SpaceAPIError
 import logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/generate")
-def generate_image(
-    generate_request: GenerateRequest,
-    db: Session = Depends(get_db),
-    timeout:int = settings.REQUEST_TIMEOUT
-):
+def new_task_id() -> str:
+    # second-resolution timestamps collided for requests in the same second
+    return str(uuid.uuid4())
+
+def validate_generate_request(generate_request: GenerateRequest) -> Optional[str]:
     if not generate_request.prompt or generate_request.prompt.strip() == "":
-      raise HTTPException(
-          status_code=400,
-          detail={"message": "Prompt cannot be empty"}
-      )
-        
+      return "Prompt cannot be empty"
+
     if generate_request.width % 8 != 0 or generate_request.height % 8 != 0:
-      raise HTTPException(
-          status_code=400,
-          detail={"message": "Width and height must be divisible by 8"}
-      )
-    
-    if generate_request.prompt:
-      try:
-        health = requests.get(
-          f"{settings.HF_SPACE_URL}/health",
-          headers={
-            "Authorization": f"Bearer {settings.HF_TOKEN}",
-            "Accept": "application/json"
-          }
-        )
-        if health.status_code != 200:
-          raise SpaceAPIError(f"Space API health check failed with status code {health.status_code}")
-        
-      except Timeout as e:
-        raise SpaceAPIError(f"Space API health check timed out after {timeout} seconds")
-      except Exception as e:
-        raise SpaceAPIError(f"Failed to connect to Space API for health check: {str(e)}")
-    else: 
-      raise HTTPException(
-          status_code=400,
-          detail={"message": "Prompt is required for image generation"}
-      )
-    
-    
-    task_id = f"{int(time.time())}"
-    task_data = {
-        "task_id": task_id,
-        "status": "pending",
-        "progress": 0,
-        "prompt": generate_request.prompt
-    }
-    
+      return "Width and height must be divisible by 8"
+
+    if generate_request.callback_url and not generate_request.callback_url.startswith(("http://", "https://")):
+      return "Callback URL must be an http(s) URL"
+
+    if generate_request.callback_url and len(generate_request.callback_url) > 1024:
+      return "Callback URL is too long"
+
+    return None
+
+def build_space_request(task_id: str, generate_request: GenerateRequest) -> dict:
     space_request = {
         "task_id": task_id,
         "prompt": generate_request.prompt,
         "model": generate_request.model,
-        "negative_prompt": generate_request.negative_prompt or "", 
+        "negative_prompt": generate_request.negative_prompt or "",
         "num_inference_steps": generate_request.num_inference_steps or 20,
         "guidance_scale": generate_request.guidance_scale or 7.5,
         "width": generate_request.width or 512,
         "height": generate_request.height or 512,
         "seed": generate_request.seed or None
     }
-        
-    space_request = {k: v for k, v in space_request.items() if v is not None}
-    try: 
-      generate_response = requests.post(
-        f"{settings.HF_SPACE_URL}/generate",
-        json=space_request,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.HF_TOKEN}",
-            "Accept": "application/json"
-        },
-        timeout=timeout
+    return {k: v for k, v in space_request.items() if v is not None}
+
+def ensure_accepting():
+    # a draining worker finishes what it has; the load balancer retries elsewhere
+    if drainer.draining:
+      raise HTTPException(
+          status_code=503,
+          detail={"message": "Worker is shutting down"},
+          headers={"Retry-After": "1"}
+      )
+
+def ensure_backend_available():
+    # Backend health is tracked by the pool's health checks and circuit
+    # breakers; only refuse work when no backend could take it.
+    if not backend_pool.has_available():
+      raise CircuitOpenError("No healthy Space backend available")
+
+@router.post("/generate")
+def generate_image(
+    generate_request: GenerateRequest,
+    db: Session = Depends(get_db)
+):
+    ensure_accepting()
+
+    error = validate_generate_request(generate_request)
+    if error:
+      raise HTTPException(status_code=400, detail={"message": error})
+
+    ensure_backend_available()
+
+    task_id = new_task_id()
+    task_data = {
+        "task_id": task_id,
+        "status": "pending",
+        "progress": 0,
+        "prompt": generate_request.prompt,
+        "callback_url": generate_request.callback_url
+    }
+    space_request = build_space_request(task_id, generate_request)
+
+    if save_task_to_db(task_data, db) is None:
+      raise HTTPException(
+          status_code=500,
+          detail={"message": f"Failed to save task {task_id}"}
+      )
+
+    try:
+      dispatcher.submit(task_id, generate_request.model, space_request)
+    except Exception as e:
+      raise SpaceAPIError(f"Failed to queue generation: {str(e)}")
+
+    return GenerationResponse(
+        status="pending",
+        task_id=task_id,
+        message="Generation queued",
+        created_at=datetime.now().isoformat()
+    )
+
+@router.post("/generate/batch")
+def generate_batch(
+    generate_requests: List[GenerateRequest],
+    db: Session = Depends(get_db)
+):
+    ensure_accepting()
+
+    if not generate_requests:
+      raise HTTPException(status_code=400, detail={"message": "Batch cannot be empty"})
+
+    if len(generate_requests) > settings.BATCH_MAX_SIZE:
+      raise HTTPException(
+          status_code=400,
+          detail={"message": f"Batch cannot have more than {settings.BATCH_MAX_SIZE} requests"}
+      )
+
+    for index, generate_request in enumerate(generate_requests):
+      error = validate_generate_request(generate_request)
+      if error:
+        raise HTTPException(status_code=400, detail={"message": f"Request {index}: {error}"})
+
+    ensure_backend_available()
+
+    batch_id = str(uuid.uuid4())
+    members = [(new_task_id(), generate_request) for generate_request in generate_requests]
+    tasks_data = [
+        {
+            "task_id": task_id,
+            "status": "pending",
+            "progress": 0,
+            "prompt": generate_request.prompt,
+            "batch_id": batch_id,
+            "callback_url": generate_request.callback_url
+        }
+        for task_id, generate_request in members
+    ]
+
+    if not save_tasks_to_db(tasks_data, db):
+      raise HTTPException(
+          status_code=500,
+          detail={"message": f"Failed to save batch {batch_id}"}
       )
 
-      if generate_response.status_code == 200: 
-        response_json = generate_response.json()
-      else:
-        raise SpaceAPIError(f"Space API returned status code {generate_response.status_code}")
-
-      response_data = {
-          "status": response_json.get('status', 'unknown'),
-          "task_id": response_json.get('task_id', task_id), 
-          "message": response_json.get('message', ''),
-          "created_at": datetime.now().isoformat()
-      }
-
-      save_task_to_db(task_data, db)
-
-      return GenerationResponse(**response_data)
-  
-    except Timeout as e:
-      raise SpaceAPIError(f"Space API request timed out after {timeout} seconds")
-  
-    except HTTPError as e:
-      status_code = e.response.status_code if hasattr(e, 'response') else None
-      response_text = e.response.text if hasattr(e, 'response') else str(e)
-      
-      if status_code == 401:
-          raise SpaceAPIError("Invalid or expired authentication token")
-      elif status_code == 403:
-          raise SpaceAPIError("Access forbidden to Space API")
-      elif status_code == 404:
-          raise SpaceAPIError("Space API endpoint not found")
-      elif status_code == 429:
-          raise SpaceAPIError("Rate limit exceeded for Space API")
-      elif 500 <= status_code < 600:
-          raise SpaceAPIError(f"Space API server error: {status_code}")
-      else:
-          raise SpaceAPIError(f"Space API HTTP error {status_code}: {response_text}")
-  
-    except ConnectionError as e:
-        raise SpaceAPIError(f"Failed to connect to Space API: {str(e)}")
-      
-    except RequestException as e:
-        raise SpaceAPIError(f"Space API request failed: {str(e)}")
-      
-    except ValueError as e:
-        raise SpaceAPIError("Invalid JSON response from Space API")
-      
+    try:
+      dispatcher.submit_many([
+          (task_id, generate_request.model, build_space_request(task_id, generate_request))
+          for task_id, generate_request in members
+      ])
     except Exception as e:
-        raise SpaceAPIError(f"Unexpected error: {str(e)}")
+      raise SpaceAPIError(f"Failed to queue batch: {str(e)}")
 
+    return BatchGenerationResponse(
+        status="pending",
+        batch_id=batch_id,
+        task_ids=[task_id for task_id, _ in members],
+        message=f"{len(members)} generations queued",
+        created_at=datetime.now().isoformat()
+    )
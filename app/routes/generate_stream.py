@@ -1,141 +1,218 @@
-import datetime
+import asyncio
 import json
-import os
-import sys
-import aiohttp
-from dotenv import load_dotenv
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
 import logging
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from app.core.config import settings
-from app.core.database import get_db
-from app.events.db_events import update_task_in_db, save_image_to_db
-from app.schemas.schemas import GenerationResult
-load_dotenv() 
+from app.core.archive import archived_data_url
+from app.core.image_store import StoredImage, image_store
+from app.core.dispatcher import dispatcher
+from app.core.drain import drainer
+from app.events.hub import task_events
+from app.events.db_events import get_batch_task_ids, get_task_image, get_task_progress, run_in_own_session
+from app.schemas.errors import SpaceAPIError
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-_sse_buffers = {}
+PENDING_FRAME_INTERVAL = 2.0
+TERMINAL_STATUSES = {"completed", "cancelled", "failed", "error"}
 
-def handle_db_event(task_id: str, chunk: bytes, db: Session): 
+def format_frame(data: dict) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+def pending_message(task_id: str) -> dict:
+    message = {"status": "pending", "progress": 0, "task_id": task_id}
+    position = dispatcher.queue_position(task_id)
+    if position is not None:
+        message["queue_position"] = position
+    return message
+
+def cancelled_message(task_id: str) -> dict:
+    return {"status": "cancelled", "task_id": task_id}
+
+async def stored_completion_message(task_id: str) -> dict:
+    """Completion message rebuilt from the saved image, for tasks no longer ingested here"""
+    message = {"status": "completed", "progress": 100, "task_id": task_id}
+    image = await run_in_own_session(get_task_image, task_id)
+    if image is not None:
+        image_id, image_path, content_type, image_data, prompt, model_used, archive_key = image
+        message["result"] = {"prompt": prompt, "model_used": model_used}
+        if image_path:
+            message["result"]["stored_image"] = StoredImage(image_path, content_type or "image/png", 0)
+        elif archive_key:
+            message["result"]["image"] = await run_in_own_session(archived_data_url, image_id)
+        else:
+            message["result"]["image"] = image_data
+    return message
+
+async def follow_task(task_id: str):
+    """Yields the messages of a task until it reaches a terminal status.
+
+    Tasks queued or ingested by this worker are followed through the
+    dispatcher and the event hub; tasks handled by another worker, or that
+    already finished, are followed through their row. While this worker
+    drains, row-followed streams end with ``reconnect`` so the client
+    resumes on another worker.
+    """
+    job = dispatcher.pending_job(task_id)
+    while job is not None and not job.dispatched.is_set():
+        yield pending_message(task_id)
+        try:
+            await asyncio.wait_for(job.dispatched.wait(), PENDING_FRAME_INTERVAL)
+        except asyncio.TimeoutError:
+            continue
+    if job is not None:
+        if job.error:
+            raise SpaceAPIError(job.error)
+        if job.cancelled:
+            yield cancelled_message(task_id)
+            return
+
+    last_state = None
+    while True:
+        if task_events.is_live(task_id):
+            async for message in task_events.subscribe(task_id):
+                yield message
+            return
+
+        state = await run_in_own_session(get_task_progress, task_id)
+        if state is None:
+            raise SpaceAPIError(f"No task found with ID: {task_id}")
+        status, progress = state
+
+        if status == "completed":
+            yield await stored_completion_message(task_id)
+            return
+        if status in TERMINAL_STATUSES:
+            yield {"status": status, "progress": int(progress or 0), "task_id": task_id}
+            return
+        if drainer.draining:
+            # hand the client over to another worker
+            yield {"status": status, "progress": int(progress or 0), "task_id": task_id, "reconnect": True}
+            return
+        if status == "pending":
+            yield pending_message(task_id)
+        elif (status, progress) != last_state:
+            yield {"status": status, "progress": int(progress or 0), "task_id": task_id}
+        last_state = (status, progress)
+
+        await asyncio.sleep(PENDING_FRAME_INTERVAL)
+
+def _image_frame_parts(payload: dict, result: dict):
+    """SSE text before and after the image string of a message, with ``result.image`` spliced in last"""
+    outer = json.dumps({key: value for key, value in payload.items() if key != "result"})
+    inner = json.dumps(result)
+    head = outer[:-1] + (", " if outer != "{}" else "") + '"result": '
+    head += inner[:-1] + (", " if inner != "{}" else "") + '"image": '
+    return f"data: {head}", "}}\n\n"
+
+async def encode_message(message: dict):
+    """SSE text for a message; a stored image goes out as a base64 data URL read from disk in chunks.
+
+    The file is opened and read in a worker thread, one chunk at a time.
+    """
+    result = message.get("result")
+    stored = result.get("stored_image") if isinstance(result, dict) else None
+    if stored is None:
+        yield format_frame(message)
+        return
+
+    payload = dict(message)
+    payload["result"] = {key: value for key, value in result.items() if key not in ("stored_image", "image")}
+    if not await asyncio.to_thread(image_store.exists, stored.path):
+        payload["result"]["image"] = ""
+        yield format_frame(payload)
+        return
+
+    head, tail = _image_frame_parts(payload, payload["result"])
+    yield f'{head}"data:{stored.content_type};base64,'
+    chunks = image_store.iter_base64(stored.path)
     try:
-        if task_id not in _sse_buffers:
-            _sse_buffers[task_id] = b""
-
-        _sse_buffers[task_id] += chunk
-        
-        buffer = _sse_buffers[task_id]
-        complete_messages = []
-        
-        while b"\n\n" in buffer:
-            message_bytes, buffer = buffer.split(b"\n\n", 1)
-            
-            try:
-                message_str = message_bytes.decode('utf-8').strip()
-                complete_messages.append(message_str)
-            except UnicodeDecodeError:
-                logger.error(f"❌ Failed to decode message for task {task_id}")
-                continue
-        
-        _sse_buffers[task_id] = buffer
-        
-        for message_str in complete_messages:
-            process_complete_message(task_id, message_str, db)
-            
-        if len(buffer) > 10000:
-            logger.warning(f"⚠️ Large buffer for task {task_id}: {len(buffer)} bytes")
-            
-    except Exception as e:
-        logger.error(f"Error handling DB event for task {task_id}: {e}")
-        import traceback
-        traceback.print_exc()
-        if task_id in _sse_buffers:
-            del _sse_buffers[task_id]
-
-def process_complete_message(task_id: str, message_str: str, db: Session):
-    try:    
-        if message_str.startswith("data: "):
-            data_str = message_str[6:].strip() 
-            
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        chunks.close()
+    yield f'"{tail}'
+
+def batch_member_message(task_id: str, message: dict) -> dict:
+    """Tag a member message with its task, dropping the inline image.
+
+    Clients fetch finished images through /images?task_id=...
+    """
+    tagged = {key: value for key, value in message.items() if key != "result"}
+    tagged["task_id"] = task_id
+    result = message.get("result")
+    if isinstance(result, dict):
+        tagged["result"] = {
+            key: value for key, value in result.items() if key not in ("image", "stored_image")
+        }
+    return tagged
+
+SSE_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache, no-transform",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+    "Access-Control-Allow-Origin": "*",
+    "X-SSE-Proxy": "enabled"
+}
+
+@router.get("/generate-stream/batch/{batch_id}")
+async def generate_batch_stream(batch_id: str):
+    task_ids = await run_in_own_session(get_batch_task_ids, batch_id)
+    if not task_ids:
+        raise HTTPException(status_code=404, detail={"message": f"No batch found with ID: {batch_id}"})
+
+    async def multiplex():
+        messages = asyncio.Queue()
+
+        async def follow(task_id: str):
             try:
-                data = json.loads(data_str)
-                
-                if "status" in data:
-                    status = data["status"]
-                    progress = int(float(data.get("progress", 100)) + 0.5)
-                    update_task_in_db(task_id, {"status": status, "progress": progress}, db)
-                    
-                    if status == "completed":    
-                        if "result" in data:
-                            result = GenerationResult(
-                                task_id=task_id,
-                                image_data=data["result"]["image"],
-                                prompt=data["result"]["prompt"],
-                                model_used = data["result"].get("model_used", None),
-                                total_inference_time=data["result"]["total_inference_time"],
-                                completed_at=datetime.datetime.now().isoformat()
-                            )
-                            save_image_to_db(result, db)
-                            update_task_in_db(task_id, {"status": data['status'], "progress": 100}, db)
-                    
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ JSON decode error in complete message: {e}")
-                
-            
-    except Exception as e:
-        logger.error(f"❌ Error processing complete message for {task_id}: {e}")
-        import traceback
-        traceback.print_exc()
+                async for message in follow_task(task_id):
+                    await messages.put(batch_member_message(task_id, message))
+            except SpaceAPIError as e:
+                await messages.put({"task_id": task_id, "error": str(e)})
+            except Exception as e:
+                logger.error(f"❌ Stream of batch member {task_id} failed: {e}")
+                await messages.put({"task_id": task_id, "error": "Stream failed"})
+            finally:
+                await messages.put(None)
+
+        followers = [asyncio.create_task(follow(task_id)) for task_id in task_ids]
+        remaining = len(followers)
+        try:
+            while remaining:
+                message = await messages.get()
+                if message is None:
+                    remaining -= 1
+                    continue
+                yield format_frame(message)
+            yield format_frame({"batch_id": batch_id, "status": "done", "task_ids": task_ids})
+        finally:
+            for follower in followers:
+                follower.cancel()
+
+    return StreamingResponse(
+        multiplex(),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Batch-ID": batch_id}
+    )
 
 @router.get("/generate-stream/{task_id}")
-async def generate_stream(task_id: str, db: Session = Depends(get_db)):
-    async def proxy():
-        space_url = f"{settings.HF_SPACE_URL}/generate-stream/{task_id}"    
-        headers = {
-            "Accept": "text/event-stream",
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Authorization": f"Bearer {settings.HF_TOKEN}"
-        }
-        
+async def generate_stream(task_id: str):
+    async def subscribe():
         try:
-            timeout = aiohttp.ClientTimeout(
-                total=3600, 
-                connect=30,     
-                sock_read=300, 
-                sock_connect=30  
-            )
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(space_url, headers=headers) as response:
-                    if response.status != 200:
-                        error = await response.text()
-                        yield f"data: {json.dumps({'error': error[:200]})}\n\n"
-                        return
-                    
-                    async for chunk in response.content.iter_any():
-                        if chunk:
-                            handle_db_event(task_id, chunk, db)
-                            decoded = chunk.decode('utf-8', errors='ignore')
-                            yield decoded
-                            
-        except Exception as e:
-            raise e
-
-    
+            async for message in follow_task(task_id):
+                async for text in encode_message(message):
+                    yield text
+        except SpaceAPIError as e:
+            yield format_frame({'error': str(e)})
+
     return StreamingResponse(
-        proxy(),
+        subscribe(),
         media_type="text/event-stream",
-        headers={
-            "Content-Type": "text/event-stream",
-            "Cache-Control": "no-cache, no-transform",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-            "Access-Control-Allow-Origin": "*",
-            "X-SSE-Proxy": "enabled",
-            "X-Task-ID": task_id
-        }
-    )
\ No newline at end of file
+        headers={**SSE_HEADERS, "X-Task-ID": task_id}
+    )
@@ -1,14 +1,18 @@
-from dotenv import load_dotenv
 from fastapi import APIRouter
 
-load_dotenv() 
 from app.core.config import settings
+from app.core.backends import backend_pool
+from app.core.dispatcher import dispatcher
+from app.core.loop_monitor import loop_monitor
+from app.core.resilience import breakers_snapshot
+from app.events.ingestion import ingestion
 
 
 router = APIRouter()
 
+# sync so the blocking probes below run in the threadpool, not on the event loop
 @router.get("/health")
-async def health_check():
+def health_check():
     """Test connectivity to Hugging Face Space from Render.com"""
     import socket
     import requests
@@ -18,7 +22,12 @@ async def health_check():
         "space_url": settings.HF_SPACE_URL,
         "token_present": bool(settings.HF_TOKEN),
         "dns_lookup": None,
-        "connection_tests": {}
+        "connection_tests": {},
+        "circuit_breakers": breakers_snapshot(),
+        "backends": backend_pool.snapshot(),
+        "dispatcher": dispatcher.snapshot(),
+        "ingestion": ingestion.snapshot(),
+        "event_loop": loop_monitor.snapshot()
     }
     
     # 1. Test DNS resolution
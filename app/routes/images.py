@@ -1,41 +1,121 @@
-from fastapi import APIRouter, Depends, HTTPException
-from requests import Session
-from app.models.db_models import Image
-from app.schemas.schemas import ImagesParams, ImagesSliceResponse
+import datetime
+from typing import Optional, Union
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from app.events.db_events import get_image_location, get_image_rows
+from app.schemas.schemas import ExportParams, ImageSearchResponse, ImagesParams, ImagesSliceResponse, SimilarImagesResponse
+from app.schemas.serializers import (
+    JSONBytesResponse, serialize_image_search, serialize_images_slice, serialize_similar_images
+)
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.image_store import image_store
+from app.core.archive import read_archived_image
+from app.core.export import FORMATS, ExportFilters, export_archive
+from app.core.search import search_images
+from app.core.similarity import similar_images
 
 router = APIRouter()
 
-@router.get("/images", response_model=ImagesSliceResponse)
-async def get_images(
-    images_params: ImagesParams = Depends(),  
+IMAGE_CONTENT_PATH = "/images/{image_id}/content"
+
+def content_url_template(request: Request) -> str:
+    """URL of /images/{image_id}/content with an ``{id}`` field, as the serializers expect"""
+    return str(request.base_url).rstrip("/") + IMAGE_CONTENT_PATH.replace("{image_id}", "{id}")
+
+@router.get("/images", response_model=Union[ImagesSliceResponse, ImageSearchResponse])
+def get_images(
+    request: Request,
+    images_params: ImagesParams = Depends(),
     db: Session = Depends(get_db)
 ):
+    content_url = content_url_template(request)
     try:
-        query = db.query(Image).order_by(Image.created_at.desc())
-        
-        if images_params.task_id:
-            query = query.filter(Image.task_id == images_params.task_id)
-        
-        total_count = query.count()
-        offset = (images_params.page - 1) * images_params.limit 
-        images_slice = query.offset(offset).limit(images_params.limit).all() 
-        
-        images_list = []
-        for image in images_slice:
-            images_list.append({
-                "id":image.id,
-                "task_id": image.task_id,
-                "prompt": image.prompt,
-                "image_url": image.image_data,
-                "model_used": image.model_used,
-                "created_at": image.created_at.isoformat() if image.created_at else None
-            })
-        
-        return ImagesSliceResponse(
-            length=total_count,
-            slice=images_list
+        if images_params.q:
+            total_count, rows, next_cursor = search_images(
+                images_params.q, images_params.model, images_params.limit, images_params.cursor, db,
+                images_params.task_id, images_params.collapse
+            )
+            return JSONBytesResponse(serialize_image_search(total_count, rows, content_url, next_cursor))
+
+        total_count, rows = get_image_rows(
+            db, images_params.page, images_params.limit, images_params.task_id, images_params.model,
+            images_params.collapse
         )
-        
+        return JSONBytesResponse(serialize_images_slice(total_count, rows, content_url))
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"message": str(e)})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving images: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error retrieving images: {str(e)}")
+
+@router.get("/images/export")
+async def export_images(export_params: ExportParams = Depends()):
+    """Streams every matching image as a ZIP or tar, with manifest.jsonl as the last entry"""
+    filters = ExportFilters(
+        model=export_params.model,
+        task_id=export_params.task_id,
+        created_after=export_params.created_after,
+        created_before=export_params.created_before
+    )
+    media_type, extension = FORMATS[export_params.format]
+    stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+
+    async def body():
+        chunks = export_archive(export_params.format, filters)
+        try:
+            while True:
+                # not cancellable: on a disconnect the current chunk is finished before the generator stops
+                chunk = await run_in_threadpool(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # closing releases the server-side cursor, which can mean reading the rest of it; keep that off
+            # the loop, and shielded so a disconnect does not end the response before the cursor is released
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(chunks.close)
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="images-{stamp}.{extension}"'}
+    )
+
+@router.get("/images/{image_id}/similar", response_model=SimilarImagesResponse)
+def get_similar_images(
+    request: Request,
+    image_id: int,
+    limit: int = Query(default=12, ge=1, le=100),
+    max_distance: Optional[int] = Query(default=None, ge=0, le=64),
+    db: Session = Depends(get_db)
+):
+    max_distance = settings.SIMILAR_MAX_DISTANCE if max_distance is None else max_distance
+    found = similar_images(image_id, limit, max_distance, db)
+    if found is None:
+        raise HTTPException(status_code=404, detail={"message": f"No hashed image with id {image_id}"})
+
+    rows, distances = found
+    content_url = content_url_template(request)
+    return JSONBytesResponse(serialize_similar_images(image_id, max_distance, rows, distances, content_url))
+
+@router.get(IMAGE_CONTENT_PATH)
+def get_image_content(image_id: int, db: Session = Depends(get_db)):
+    image = get_image_location(image_id, db)
+    headers = {"Cache-Control": "public, max-age=86400, immutable"}
+
+    if image and image.archive_key:
+        content = read_archived_image(image.archive_key, image.archive_offset, image.archive_length, image.archive_codec)
+        return Response(content=content, media_type=image.content_type or "image/png", headers=headers)
+
+    if not image or not image_store.exists(image.image_path):
+        raise HTTPException(status_code=404, detail={"message": f"No stored image with id {image_id}"})
+
+    return FileResponse(
+        image.image_path,
+        media_type=image.content_type or "image/png",
+        headers=headers
+    )
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.metrics import render_latest
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    payload, content_type = render_latest()
+    return Response(content=payload, media_type=content_type)
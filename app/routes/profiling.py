@@ -0,0 +1,45 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import Response
+
+from app.core.config import settings
+from app.core.profiler import PROFILE_ROUTE, SamplingProfiler, token_matches
+
+router = APIRouter()
+_profile_lock = asyncio.Lock()
+
+@router.get(PROFILE_ROUTE, include_in_schema=False)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0),
+    output_format: str = Query("speedscope", alias="format", pattern="^(speedscope|collapsed)$"),
+    x_profile_token: Optional[str] = Header(None)
+):
+    """Sample every thread of this worker for ``seconds`` and return the profile"""
+    if not token_matches(x_profile_token):
+        raise HTTPException(status_code=403, detail={"message": "Invalid profiling token"})
+
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": f"Profiles are limited to {settings.PROFILE_MAX_SECONDS} seconds"}
+        )
+
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail={"message": "A profile is already running on this worker"})
+
+    async with _profile_lock:
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+
+    body, content_type = profiler.export(f"worker profile ({seconds}s)", output_format)
+    extension = "txt" if output_format == "collapsed" else "speedscope.json"
+    return Response(
+        content=body,
+        media_type=content_type,
+        headers={"Content-Disposition": f'attachment; filename="profile.{extension}"'}
+    )
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.drain import drainer
+from app.core.warmup import warmup_state
+
+router = APIRouter()
+
+@router.get("/ready")
+async def readiness():
+    """Readiness probe: 503 until the worker's connection pools are warm, and again once it drains"""
+    content = warmup_state.as_dict()
+    content["ready"] = warmup_state.ready and not drainer.draining
+    content["drain"] = drainer.as_dict()
+    return JSONResponse(
+        status_code=200 if content["ready"] else 503,
+        content=content
+    )
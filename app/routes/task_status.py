@@ -1,33 +1,31 @@
 
 from fastapi import APIRouter, Depends, HTTPException
-from requests import Session
-from app.events.db_events import  get_task_info
-from app.models.db_models import TaskStatus
+from sqlalchemy.orm import Session
+from app.events.db_events import get_task_row
 from app.schemas.schemas import TaskStatusResponse
+from app.schemas.serializers import JSONBytesResponse, serialize_task_status
 from app.core.database import get_db
+from app.core.logging_setup import get_logger
+
+logger = get_logger(__name__)
 
 router = APIRouter()
 
 @router.get("/status/{task_id}", response_model=TaskStatusResponse)
-async def get_generation_status(task_id: str, db: Session = Depends(get_db)):
+def get_generation_status(task_id: str, db: Session = Depends(get_db)):
     try:
-        task_info = get_task_info(task_id, db)
-
-        task_data = {
-            'task_id': task_id,
-            'status': task_info.status,
-            'progress': task_info.progress,
-            'created_at': task_info.created_at,
-            'cancelled': task_info.status == TaskStatus.CANCELLED,
-            'prompt': task_info.prompt
-        }
-    
-        return TaskStatusResponse(**task_data)
-
+        row = get_task_row(task_id, db)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Failed to fetch task status", task_id=task_id)
         raise HTTPException(
             status_code=500,
             detail={"message": f"Failed to fetch task status: {str(e)}"}
-        )
\ No newline at end of file
+        )
+
+    if row is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"message": f"No task found with ID: {task_id}"}
+        )
+
+    return JSONBytesResponse(serialize_task_status(row))
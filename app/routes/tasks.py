@@ -1,43 +1,41 @@
-from fastapi import APIRouter, Depends
-from app.schemas.schemas import TaskData, TasksResponse
-from app.events.db_events import get_all_tasks
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.schemas.schemas import TaskStatsResponse, TasksResponse
+from app.schemas.serializers import JSONBytesResponse, serialize_tasks
+from app.events.db_events import get_task_rows
+from app.events.task_stats import get_task_stats
+from app.core.config import settings
 from app.core.database import get_db
 from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.get("/tasks", response_model=TasksResponse)
-def get_tasks(db: Session = Depends(get_db)):
-    all_tasks = get_all_tasks(db)
+def get_tasks(active: bool = False, db: Session = Depends(get_db)):
+    """All tasks; ``active=true`` lists only tasks_active, without reading the history"""
+    try:
+        rows = get_task_rows(db, active_only=active)
+    except Exception as e:
+        logger.error(f"❌ Error retrieving tasks: {e}")
+        rows = []
 
-    if not all_tasks:
-        return TasksResponse(
-            total_tasks=0,
-            tasks=None  
-        )
-    
-    
-    task_list = []
-    
-    for task_id, task_data in all_tasks.items():
-        status = task_data['status']
-        progress = task_data['progress']
-        prompt = task_data['prompt']
-        created_at = task_data['created_at']
-        updated_at = task_data['updated_at']
+    return JSONBytesResponse(serialize_tasks(rows))
 
-        task_response = TaskData(
-            task_id=task_id, 
-            progress=int(progress),
-            status=status,
-            prompt=prompt,
-            created_at=created_at,
-            updated_at=updated_at
+@router.get("/tasks/stats", response_model=TaskStatsResponse)
+def get_tasks_stats(hours: int = Query(default=24, ge=1), db: Session = Depends(get_db)):
+    """Counts per status, finished tasks per bucket and inference time percentiles, from the statistics tables"""
+    if hours > settings.STATS_RETENTION_DAYS * 24:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": f"Statistics are kept for {settings.STATS_RETENTION_DAYS} days"}
         )
-        
-        task_list.append(task_response)
+    try:
+        stats = get_task_stats(hours, db)
+    except Exception as e:
+        logger.error(f"❌ Error retrieving task statistics: {e}")
+        raise HTTPException(status_code=500, detail={"message": "Failed to retrieve task statistics"})
 
-    return TasksResponse(
-        total_tasks=len(task_list),
-        tasks=task_list
-    )
+    return JSONBytesResponse(orjson.dumps(stats))
@@ -0,0 +1,24 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from app.schemas.serializers import JSONBytesResponse, serialize_webhook_deliveries
+from app.events.db_events import get_webhook_deliveries
+from app.events.webhooks import deliveries_token_matches
+from app.core.database import get_db
+from sqlalchemy.orm import Session
+
+router = APIRouter()
+
+@router.get("/webhooks/deliveries")
+def get_deliveries(
+    task_id: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    x_webhooks_token: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Logged deliveries with their callback URLs; requires WEBHOOK_DELIVERIES_TOKEN in X-Webhooks-Token"""
+    if not deliveries_token_matches(x_webhooks_token):
+        raise HTTPException(status_code=403, detail={"message": "Invalid webhooks token"})
+
+    rows = get_webhook_deliveries(db, task_id=task_id, status=status, limit=limit)
+    return JSONBytesResponse(serialize_webhook_deliveries(rows))
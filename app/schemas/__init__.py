@@ -1,14 +1,16 @@
-from .schemas import GenerateRequest, ImagesParams, GenerationStatus, GenerationResult, GenerationResponse, ImageResponse, TaskData, TasksResponse, DeletionResponse
-from .errors import SpaceAPIError
+from .schemas import GenerateRequest, ImagesParams, GenerationStatus, GenerationResult, GenerationResponse, BatchGenerationResponse, ImageResponse, TaskData, TasksResponse, DeletionResponse
+from .errors import SpaceAPIError, CircuitOpenError
 
 __all__ = [
     'GenerateRequest',
     'GenerationResponse',
+    'BatchGenerationResponse',
     'ImagesParams',
     'GenerationStatus',
     'GenerationResult',
     'ImageResponse',
     'SpaceAPIError',
+    'CircuitOpenError',
     'TaskData',
     'TasksResponse',
     'DeletionResponse'
@@ -1,3 +1,9 @@
 class SpaceAPIError(Exception):
     """Custom exception for Space API errors"""
-    pass
\ No newline at end of file
+    pass
+
+class CircuitOpenError(SpaceAPIError):
+    """Raised without calling the Space while its circuit breaker is open"""
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -1,6 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime
 
 class GenerateRequest(BaseModel):
@@ -12,12 +11,27 @@ class GenerateRequest(BaseModel):
     width: int = 512
     height: int = 512
     seed: Optional[int] = None
+    callback_url: Optional[str] = None
 
 
 class ImagesParams(BaseModel):
     page: int = 1
     limit: int = 12 
     task_id: Optional[str] = None
+    model: Optional[str] = None
+    # full-text search over prompts; ranked, paged with cursor instead of page
+    q: Optional[str] = None
+    cursor: Optional[str] = None
+    # hide images recorded as near-duplicates of an earlier one
+    collapse: bool = False
+
+
+class ExportParams(BaseModel):
+    format: Literal["zip", "tar"] = "zip"
+    model: Optional[str] = None
+    task_id: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
 
 
 class GenerationStatus(BaseModel):
@@ -39,11 +53,15 @@ class GenerationStatus(BaseModel):
 
 class GenerationResult(BaseModel):
     task_id: str
-    image_data: str        
+    image_data: Optional[str] = None
+    image_path: Optional[str] = None
+    content_type: Optional[str] = None
     prompt: str
     total_inference_time: Optional[float] = None
     completed_at: Optional[str] = None
     model_used: Optional[str] = None
+    phash: Optional[int] = None
+    duplicate_of: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -66,6 +84,17 @@ class ImagesSliceResponse(BaseModel):
     length: int
     slice: Optional[list[ImageResponse]] = None
 
+class ImageSearchResponse(ImagesSliceResponse):
+    next_cursor: Optional[str] = None
+
+class SimilarImageResponse(ImageResponse):
+    distance: int
+
+class SimilarImagesResponse(BaseModel):
+    image_id: int
+    max_distance: int
+    slice: list[SimilarImageResponse]
+
 class TaskData(BaseModel):
     task_id: str
     progress: int
@@ -86,6 +115,29 @@ class TasksResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class TaskStatsBucket(BaseModel):
+    bucket_start: datetime
+    completed: int
+    cancelled: int
+    failed: int
+    error: int
+
+class InferenceTimeStats(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+
+class TaskStatsResponse(BaseModel):
+    statuses: Dict[str, int]
+    total_tasks: int
+    window_hours: int
+    bucket_seconds: int
+    buckets: list[TaskStatsBucket]
+    inference_time: InferenceTimeStats
+
 class TaskStatusResponse(BaseModel):
     task_id: str
     status: str
@@ -112,6 +164,13 @@ class GenerationResponse(BaseModel):
             datetime: lambda v: v.isoformat()  
         }
 
+class BatchGenerationResponse(BaseModel):
+    status: str
+    batch_id: str
+    task_ids: list[str]
+    message: str
+    created_at: datetime
+
 class CancellationResponse(BaseModel):
     success: bool
     message: str
@@ -119,4 +178,28 @@ class CancellationResponse(BaseModel):
 
 class DeletionResponse(BaseModel):
     success: bool
-    message: str
\ No newline at end of file
+    message: str
+    job_id: Optional[str] = None
+
+class DeletionJobRequest(BaseModel):
+    """Tasks matching every given filter are deleted with their images"""
+    statuses: Optional[List[Literal["pending", "processing", "completed", "cancelled", "failed", "error"]]] = None
+    older_than_seconds: Optional[int] = Field(default=None, ge=0)
+    created_before: Optional[datetime] = None
+    prompt_contains: Optional[str] = Field(default=None, min_length=1)
+    task_ids: Optional[List[str]] = Field(default=None, min_length=1, max_length=1000)
+    # required to delete every task, so an empty body never does
+    all: bool = False
+
+class DeletionJobResponse(BaseModel):
+    job_id: str
+    status: str  # 'pending', 'running', 'completed', 'failed'
+    filters: Dict[str, Any]
+    phase: Optional[str] = None
+    tasks_deleted: int
+    images_deleted: int
+    files_deleted: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
\ No newline at end of file
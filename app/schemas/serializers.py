@@ -0,0 +1,96 @@
+"""
+Lean serializers for the list and status endpoints.
+
+They take plain column rows (tuples selected with ``db.query(Model.col, ...)``)
+and go straight to JSON bytes, skipping ORM instances and pydantic models.
+The output matches ``TasksResponse``, ``ImagesSliceResponse``,
+``SimilarImagesResponse`` and ``TaskStatusResponse``, which stay declared
+as ``response_model`` for the docs.
+"""
+from typing import Iterable, Optional, Sequence
+import orjson
+from fastapi.responses import Response
+
+from app.models.db_models import TaskStatus
+
+
+class JSONBytesResponse(Response):
+    """Response for bodies that are already serialized JSON bytes"""
+    media_type = "application/json"
+
+
+def serialize_tasks(rows: Sequence[tuple]) -> bytes:
+    tasks = [
+        {
+            "task_id": task_id,
+            "progress": int(progress or 0),
+            "prompt": prompt,
+            "status": status,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+        for task_id, status, progress, prompt, created_at, updated_at in rows
+    ]
+    return orjson.dumps({"total_tasks": len(tasks), "tasks": tasks or None})
+
+
+def _image_items(rows: Iterable[tuple], content_url: str) -> list:
+    return [
+        {
+            "id": image_id,
+            "task_id": task_id,
+            "image_url": content_url.format(id=image_id) if image_path or archive_key else image_data,
+            "prompt": prompt,
+            "model_used": model_used,
+            "created_at": created_at
+        }
+        for image_id, task_id, prompt, image_path, image_data, model_used, created_at, archive_key in rows
+    ]
+
+
+def serialize_images_slice(total: int, rows: Iterable[tuple], content_url: str) -> bytes:
+    """``content_url`` is a format string with an ``{id}`` field for file backed and archived images"""
+    return orjson.dumps({"length": total, "slice": _image_items(rows, content_url)})
+
+
+def serialize_image_search(total: int, rows: Iterable[tuple], content_url: str, next_cursor: Optional[str]) -> bytes:
+    return orjson.dumps({"length": total, "slice": _image_items(rows, content_url), "next_cursor": next_cursor})
+
+
+def serialize_similar_images(image_id: int, max_distance: int, rows: Sequence[tuple], distances: Sequence[int], content_url: str) -> bytes:
+    items = _image_items(rows, content_url)
+    for item, distance in zip(items, distances):
+        item["distance"] = distance
+    return orjson.dumps({"image_id": image_id, "max_distance": max_distance, "slice": items})
+
+
+def serialize_task_status(row: tuple) -> bytes:
+    task_id, status, progress, prompt, created_at, _updated_at = row
+    return orjson.dumps({
+        "task_id": task_id,
+        "status": status,
+        "progress": int(progress or 0),
+        "created_at": created_at,
+        "cancelled": status == TaskStatus.CANCELLED.value,
+        "prompt": prompt
+    })
+
+
+def serialize_webhook_deliveries(rows: Sequence[tuple]) -> bytes:
+    deliveries = [
+        {
+            "id": delivery_id,
+            "task_id": task_id,
+            "event": event,
+            "url": url,
+            "status": status,
+            "attempts": attempts,
+            "last_status_code": last_status_code,
+            "last_error": last_error,
+            "created_at": created_at,
+            "delivered_at": delivered_at
+        }
+        for (delivery_id, task_id, event, url, status, attempts,
+             last_status_code, last_error, created_at, delivered_at) in rows
+    ]
+    return orjson.dumps({"total": len(deliveries), "deliveries": deliveries})
@@ -0,0 +1,91 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Cold import time of app.main, median of RUNS fresh interpreters. The default budget is relative
+# to a bare `import fastapi` timed the same way, so it holds on slow and fast machines alike;
+# IMPORT_BUDGET_MS sets an absolute budget instead.
+IMPORT_BUDGET_RATIO = float(os.getenv("IMPORT_BUDGET_RATIO", "2.5"))
+IMPORT_BUDGET_MS = float(os.environ["IMPORT_BUDGET_MS"]) if os.getenv("IMPORT_BUDGET_MS") else None
+BASELINE_MODULE = "fastapi"
+RUNS = int(os.getenv("IMPORT_BUDGET_RUNS", "5"))
+
+# Loaded on first use only; importing app.main must not pull these in.
+LAZY_MODULES = [
+    "aiohttp",
+    "requests",
+    "uvicorn",
+    "pyodbc",
+    "PIL",
+    "numpy",
+    "prometheus_client",
+    "apscheduler",
+    "alembic",
+    "app.events.sse_decoder",
+]
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def import_profile(module: str = "app.main"):
+    """Runs `python -X importtime -c "import <module>"`, returns {module: (self_us, cumulative_us, depth)}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        env={**os.environ, "PYTHONPATH": ROOT_DIR},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            profile[module] = (int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+    return profile
+
+
+def test_import_budget():
+    profiles = [import_profile() for _ in range(RUNS)]
+    cold_ms = statistics.median(p["app.main"][1] for p in profiles) / 1000
+    baseline_ms = statistics.median(import_profile(BASELINE_MODULE)[BASELINE_MODULE][1] for _ in range(RUNS)) / 1000
+    budget_ms = IMPORT_BUDGET_MS or IMPORT_BUDGET_RATIO * baseline_ms
+
+    print(
+        f"⏱️  import app.main: {cold_ms:.0f} ms, import {BASELINE_MODULE}: {baseline_ms:.0f} ms "
+        f"(budget {budget_ms:.0f} ms, median of {RUNS})"
+    )
+    top_level = sorted(
+        ((cumulative, module) for module, (_, cumulative, depth) in profiles[-1].items() if depth == 1),
+        reverse=True,
+    )
+    for cumulative, module in top_level[:10]:
+        print(f"   {cumulative / 1000:8.1f} ms  {module}")
+
+    assert cold_ms <= budget_ms, f"Cold import of app.main took {cold_ms:.0f} ms, budget is {budget_ms:.0f} ms"
+
+
+def test_heavy_modules_are_lazy():
+    loaded = set(import_profile())
+    eager = [module for module in LAZY_MODULES if module in loaded]
+
+    assert not eager, f"Imported eagerly by app.main: {', '.join(eager)}"
+
+
+if __name__ == "__main__":
+    failed = False
+    for test in (test_heavy_modules_are_lazy, test_import_budget):
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+            failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,153 @@
+import os
+import re
+from collections import Counter
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+# Runs against a throwaway SQLite database migrated to head; the dbo schema is SQL Server only.
+os.environ["APP_ENV"] = "production"
+DB_PATH = os.path.join(tempfile.mkdtemp(), "query_budget.db")
+os.environ["SEARCH_INDEX_PATH"] = os.path.join(os.path.dirname(DB_PATH), "search.db")
+
+import pytest
+from sqlalchemy import create_engine
+import app.core.database as database
+
+ENGINE = create_engine(f"sqlite:///{DB_PATH}")
+database.engine = ENGINE
+
+from fastapi.testclient import TestClient
+from app.core import migrations
+from app.core.query_stats import instrument_engine, max_queries, track_queries
+from app.core.config import settings
+from app.core.search import search_images
+from app.core.similarity import similarity_index
+from app.events.db_events import (
+    get_task_status, save_image_to_db, save_task_to_db, save_tasks_to_db, select_tasks, update_task_in_db
+)
+from app.events.task_stats import get_task_stats
+from app.main import app
+from app.schemas.schemas import GenerationResult
+
+# Max statements per endpoint; raise one only together with the change that needs it.
+ENDPOINT_BUDGETS = {
+    "/tasks": 1,
+    "/tasks?active=true": 1,
+    "/tasks/stats": 3,
+    "/images?page=1&limit=10": 2,
+    "/images?q=prompt&limit=10": 2,
+    "/images?collapse=true&limit=10": 2,
+    "/images/1/similar": 3,
+    "/status/budget-0": 1,
+    "/webhooks/deliveries": 1,
+}
+
+def seed():
+    db = database.get_session()
+    try:
+        save_tasks_to_db([
+            {"task_id": f"budget-{i}", "status": "completed", "progress": 100, "prompt": f"prompt {i}"}
+            for i in range(20)
+        ], db)
+        for i in range(20):
+            save_image_to_db(GenerationResult(
+                task_id=f"budget-{i}", image_data="data:image/png;base64,AAAA", prompt=f"prompt {i}",
+                model_used="sdxl-turbo", total_inference_time=1.0, completed_at="2024-01-01T00:00:00",
+                phash=i, duplicate_of=1 if i % 2 else None
+            ), db)
+        # the one-off backfill of a new search sidecar is not part of the /images?q= budget
+        search_images("prompt", None, 1, None, db)
+        # nor is the first load of the similarity index
+        similarity_index.current(db)
+    finally:
+        db.close()
+
+def setup_database():
+    # other test modules in the same pytest run bind their own database
+    database.engine, database.SessionLocal = ENGINE, None
+    migrations.upgrade()
+    instrument_engine(database.engine)
+    seed()
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded_database():
+    setup_database()
+
+def queries_of(response) -> int:
+    """Statement count reported by QueryStatsMiddleware; TestClient runs the app in another thread"""
+    match = re.search(r'desc="(\d+) queries"', response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else 0
+
+def test_endpoint_budgets(monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_DELIVERIES_TOKEN", "query-budget")
+    client = TestClient(app, headers={"X-Webhooks-Token": "query-budget"})
+    for path, budget in ENDPOINT_BUDGETS.items():
+        response = client.get(path)
+        assert response.status_code == 200, f"{path}: {response.status_code}"
+        count = queries_of(response)
+        assert 0 < count <= budget, f"{path}: expected at most {budget} queries, ran {count}"
+        print(f"✅ {path}: {count}/{budget} queries")
+
+def test_write_budgets():
+    db = database.get_session()
+    try:
+        # the insert and the pending count of task_status_counts
+        with max_queries(2):
+            save_task_to_db({"task_id": "budget-single", "status": "pending", "progress": 0, "prompt": "p"}, db)
+        with max_queries(2):
+            save_tasks_to_db([
+                {"task_id": f"budget-batch-{i}", "status": "pending", "progress": 0, "prompt": "p"}
+                for i in range(settings.BATCH_MAX_SIZE)
+            ], db)
+        with max_queries(1):
+            save_image_to_db(GenerationResult(
+                task_id="budget-single", image_data="data:image/png;base64,AAAA", prompt="p",
+                model_used="sdxl-turbo", total_inference_time=1.0, completed_at="2024-01-01T00:00:00",
+                phash=12345
+            ), db)
+    finally:
+        db.close()
+    print("✅ task writes: 2 queries, image writes: 1 query")
+
+def test_progress_updates():
+    db = database.get_session()
+    try:
+        update_task_in_db("budget-single", {"status": "processing", "progress": 10}, db)
+        with max_queries(1):
+            update_task_in_db("budget-single", {"status": "processing", "progress": 20}, db)
+    finally:
+        db.close()
+    print("✅ progress update without a status change: 1 query")
+
+def test_stats_counters():
+    db = database.get_session()
+    try:
+        stats = get_task_stats(24, db)
+        rows = db.execute(select_tasks("status")).all()
+    finally:
+        db.close()
+    expected = Counter(status for status, in rows)
+    assert {k: v for k, v in stats["statuses"].items() if v} == dict(expected), (stats["statuses"], expected)
+    print(f"✅ task_status_counts match the task tables: {dict(expected)}")
+
+def test_n_plus_one_detection():
+    db = database.get_session()
+    try:
+        with track_queries() as stats:
+            for i in range(settings.DB_N_PLUS_ONE_THRESHOLD):
+                get_task_status(f"budget-{i}", db)
+    finally:
+        db.close()
+    repeated = stats.repeated_selects(settings.DB_N_PLUS_ONE_THRESHOLD)
+    assert len(repeated) == 1 and repeated[0][1] == settings.DB_N_PLUS_ONE_THRESHOLD, repeated
+    print(f"✅ N+1 flagged: {repeated[0][1]} × {stats.statements[repeated[0][0]]}")
+
+if __name__ == "__main__":
+    setup_database()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        test_endpoint_budgets(monkeypatch)
+    test_write_budgets()
+    test_progress_updates()
+    test_stats_counters()
+    test_n_plus_one_detection()
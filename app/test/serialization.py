@@ -0,0 +1,75 @@
+import sys
+import os
+import time
+import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.schemas.schemas import TaskData, TasksResponse, ImagesSliceResponse
+from app.schemas.serializers import serialize_tasks, serialize_images_slice
+
+ROW_COUNTS = [1_000, 10_000]
+REPEAT = 5
+
+def make_task_rows(n):
+    now = datetime.datetime.now()
+    return [
+        (f"{1700000000 + i}", "completed", 100, f"a red cow number {i} in a field", now, now)
+        for i in range(n)
+    ]
+
+def make_image_rows(n):
+    now = datetime.datetime.now()
+    return [
+        (i, f"{1700000000 + i}", f"a red cow number {i} in a field", f"./data/generated/{i}.png", None, "sdxl-turbo", now, None)
+        for i in range(n)
+    ]
+
+def pydantic_tasks(rows):
+    tasks = [
+        TaskData(task_id=t, status=s, progress=int(p), prompt=pr, created_at=c, updated_at=u)
+        for t, s, p, pr, c, u in rows
+    ]
+    response = TasksResponse(total_tasks=len(tasks), tasks=tasks)
+    return JSONResponse(jsonable_encoder(response)).body
+
+def pydantic_images(rows):
+    images = [
+        {"id": i, "task_id": t, "prompt": pr, "image_url": f"http://localhost/images/{i}/content",
+         "model_used": m, "created_at": c.isoformat()}
+        for i, t, pr, _path, _data, m, c, _archive in rows
+    ]
+    response = ImagesSliceResponse(length=len(images), slice=images)
+    return JSONResponse(jsonable_encoder(response)).body
+
+def lean_tasks(rows):
+    return serialize_tasks(rows)
+
+def lean_images(rows):
+    return serialize_images_slice(len(rows), rows, "http://localhost/images/{id}/content")
+
+def per_item_us(fn, rows):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+def run_benchmark():
+    print("📊 Per-item serialization cost (best of %d, µs/item)" % REPEAT)
+    print("=" * 60)
+    print(f"{'payload':<10}{'rows':>8}{'pydantic':>14}{'orjson':>12}{'speedup':>10}")
+
+    for name, make_rows, slow, fast in (
+        ("tasks", make_task_rows, pydantic_tasks, lean_tasks),
+        ("images", make_image_rows, pydantic_images, lean_images),
+    ):
+        for n in ROW_COUNTS:
+            rows = make_rows(n)
+            slow_us = per_item_us(slow, rows)
+            fast_us = per_item_us(fast, rows)
+            print(f"{name:<10}{n:>8}{slow_us:>14.2f}{fast_us:>12.2f}{slow_us / fast_us:>9.1f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
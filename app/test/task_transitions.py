@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+# Runs against a throwaway SQLite database migrated to head; the dbo schema is SQL Server only.
+os.environ["APP_ENV"] = "production"
+DB_PATH = os.path.join(tempfile.mkdtemp(), "task_transitions.db")
+os.environ["SEARCH_INDEX_PATH"] = os.path.join(os.path.dirname(DB_PATH), "search.db")
+
+import pytest
+from sqlalchemy import create_engine
+import app.core.database as database
+
+ENGINE = create_engine(f"sqlite:///{DB_PATH}")
+database.engine = ENGINE
+
+from app.core import migrations
+from app.events.db_events import (
+    cancel_task_in_db, fail_stale_tasks, get_task_status, save_task_to_db, update_task_in_db
+)
+from app.events.ingestion import process_message
+from app.events.task_stats import get_task_stats
+
+def setup_database():
+    # other test modules in the same pytest run bind their own database
+    database.engine, database.SessionLocal = ENGINE, None
+    migrations.upgrade()
+
+@pytest.fixture(scope="module", autouse=True)
+def database_at_head():
+    setup_database()
+
+def counts(db) -> dict:
+    return {status: tasks for status, tasks in get_task_stats(1, db)["statuses"].items() if tasks}
+
+def test_cancel_is_final():
+    db = database.get_session()
+    try:
+        save_task_to_db({"task_id": "cancelled-task", "status": "pending", "progress": 0, "prompt": "p"}, db)
+        assert update_task_in_db("cancelled-task", {"status": "processing", "progress": 10}, db)
+        assert cancel_task_in_db("cancelled-task", db)
+        before = counts(db)
+
+        # frames the Space sent before it saw the cancel
+        assert not update_task_in_db("cancelled-task", {"status": "processing", "progress": 60}, db)
+        assert not update_task_in_db("cancelled-task", {"status": "completed", "progress": 100}, db, inference_time=1.0)
+        assert not process_message("cancelled-task", {"status": "processing", "progress": 80}, db)
+
+        assert get_task_status("cancelled-task", db) == "cancelled"
+        assert counts(db) == before, (counts(db), before)
+    finally:
+        db.close()
+    print("✅ late progress and completion frames leave a cancelled task cancelled")
+
+def test_reaped_task_is_final():
+    import datetime
+
+    db = database.get_session()
+    try:
+        save_task_to_db({"task_id": "reaped-task", "status": "pending", "progress": 0, "prompt": "p"}, db)
+        assert update_task_in_db("reaped-task", {"status": "processing", "progress": 10}, db)
+        failed, _ = fail_stale_tasks("processing", datetime.datetime.now() + datetime.timedelta(seconds=1), 10, db)
+        assert failed == 1
+        before = counts(db)
+
+        assert not update_task_in_db("reaped-task", {"status": "completed", "progress": 100}, db)
+        assert get_task_status("reaped-task", db) == "failed"
+        assert counts(db) == before, (counts(db), before)
+    finally:
+        db.close()
+    print("✅ a late completion leaves a reaped task failed")
+
+if __name__ == "__main__":
+    setup_database()
+    test_cancel_is_final()
+    test_reaped_task_is_final()
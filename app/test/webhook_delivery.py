@@ -0,0 +1,221 @@
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+# Runs against a throwaway SQLite database migrated to head; the dbo schema is SQL Server only.
+os.environ["APP_ENV"] = "production"
+DB_PATH = os.path.join(tempfile.mkdtemp(), "webhook_delivery.db")
+os.environ["SEARCH_INDEX_PATH"] = os.path.join(os.path.dirname(DB_PATH), "search.db")
+
+import pytest
+from aiohttp import web
+from sqlalchemy import create_engine, update
+import app.core.database as database
+
+ENGINE = create_engine(f"sqlite:///{DB_PATH}")
+database.engine = ENGINE
+
+from app.core import migrations
+from app.core.config import settings
+from app.core.http_client import close_upstream_sessions
+from app.events.db_events import get_webhook_deliveries, save_task_to_db, update_task_in_db
+from app.events.webhooks import WebhookTargetError, WebhookWorker, check_callback_target, sign_payload
+from app.models.db_models import WebhookDelivery
+
+
+def setup_database():
+    # other test modules in the same pytest run bind their own database
+    database.engine, database.SessionLocal = ENGINE, None
+    migrations.upgrade()
+
+def local_receiver_settings(monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "WEBHOOK_BACKOFF_MAX", 0.05)
+    # the receiver listens on 127.0.0.1
+    monkeypatch.setattr(settings, "WEBHOOK_ALLOW_PRIVATE_TARGETS", True)
+
+@pytest.fixture(scope="module", autouse=True)
+def database_at_head():
+    setup_database()
+
+@pytest.fixture(autouse=True)
+def webhook_settings(monkeypatch):
+    local_receiver_settings(monkeypatch)
+
+
+class Receiver:
+    """Webhook endpoint answering with ``statuses`` in turn, then 200"""
+
+    def __init__(self, *statuses: int):
+        self.statuses = list(statuses)
+        self.requests = []
+
+    async def handle(self, request: web.Request):
+        body = await request.read()
+        self.requests.append((dict(request.headers), body))
+        return web.Response(status=self.statuses.pop(0) if self.statuses else 200)
+
+    async def run(self, scenario):
+        """Serve while ``scenario(url)`` runs"""
+        app = web.Application()
+        app.router.add_post("/webhook", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            await scenario(f"http://127.0.0.1:{port}/webhook")
+        finally:
+            await close_upstream_sessions()
+            await runner.cleanup()
+
+
+def completed_task(task_id: str, url: str):
+    db = database.get_session()
+    try:
+        save_task_to_db({"task_id": task_id, "status": "pending", "progress": 0, "prompt": "p", "callback_url": url}, db)
+        assert update_task_in_db(task_id, {"status": "completed", "progress": 100}, db)
+    finally:
+        db.close()
+
+def deliveries(task_id: str):
+    db = database.get_session()
+    try:
+        return get_webhook_deliveries(db, task_id=task_id)
+    finally:
+        db.close()
+
+def test_retries_503():
+    receiver = Receiver(503)
+
+    async def scenario(url):
+        completed_task("retried-task", url)
+        await WebhookWorker().deliver("retried-task")
+
+    asyncio.run(receiver.run(scenario))
+
+    assert len(receiver.requests) == 2
+    headers, body = receiver.requests[-1]
+    assert headers["X-Webhook-Signature"] == sign_payload(body, headers["X-Webhook-Timestamp"])
+    assert json.loads(body)["event"] == "task.completed"
+    [delivery] = deliveries("retried-task")
+    assert (delivery.status, delivery.attempts, delivery.last_status_code) == ("delivered", 2, 200)
+    print("✅ a 503 is retried and the delivery logged as delivered")
+
+def test_gives_up_on_4xx():
+    receiver = Receiver(410)
+
+    async def scenario(url):
+        completed_task("rejected-task", url)
+        await WebhookWorker().deliver("rejected-task")
+
+    asyncio.run(receiver.run(scenario))
+
+    assert len(receiver.requests) == 1
+    [delivery] = deliveries("rejected-task")
+    assert (delivery.status, delivery.attempts, delivery.last_status_code) == ("failed", 1, 410)
+    print("✅ a 4xx is not retried")
+
+def test_delivers_once():
+    receiver = Receiver()
+
+    async def scenario(url):
+        completed_task("deduped-task", url)
+        worker = WebhookWorker()
+        await asyncio.gather(worker.deliver("deduped-task"), worker.deliver("deduped-task"))
+        await worker.deliver("deduped-task")
+
+    asyncio.run(receiver.run(scenario))
+
+    assert len(receiver.requests) == 1
+    assert len(deliveries("deduped-task")) == 1
+    print("✅ repeated notifications deliver a status once")
+
+def test_redelivers_abandoned():
+    receiver = Receiver()
+
+    async def scenario(url):
+        completed_task("abandoned-task", url)
+        worker = WebhookWorker()
+
+        # the worker logged the delivery, then stopped before posting it
+        async def stopped(*args, **kwargs):
+            pass
+        worker._send = stopped
+        await worker.deliver("abandoned-task")
+        assert deliveries("abandoned-task")[0].status == "pending"
+
+        worker = WebhookWorker()
+        assert await worker.redeliver_stale() == 0
+        db = database.get_session()
+        try:
+            stale = datetime.datetime.now() - datetime.timedelta(seconds=settings.WEBHOOK_STALE_AFTER + 1)
+            db.execute(update(WebhookDelivery).where(WebhookDelivery.task_id == "abandoned-task").values(updated_at=stale))
+            db.commit()
+        finally:
+            db.close()
+        assert await worker.redeliver_stale() == 1
+        assert await worker.redeliver_stale() == 0
+
+    asyncio.run(receiver.run(scenario))
+
+    assert len(receiver.requests) == 1
+    [delivery] = deliveries("abandoned-task")
+    assert (delivery.status, delivery.attempts) == ("delivered", 1)
+    print("✅ a delivery abandoned as pending is sent again once")
+
+def test_refuses_private_targets(monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_ALLOW_PRIVATE_TARGETS", False)
+
+    async def refused(url):
+        try:
+            await check_callback_target(url)
+        except WebhookTargetError:
+            return True
+        return False
+
+    for url in ("http://127.0.0.1/x", "http://localhost/x", "http://169.254.169.254/latest/meta-data",
+                "http://10.0.0.7/x", "http://[::1]/x", "http://[::ffff:192.168.0.1]/x"):
+        assert asyncio.run(refused(url)), url
+    assert not asyncio.run(refused("https://93.184.216.34/hook"))
+
+    receiver = Receiver()
+
+    async def scenario(url):
+        completed_task("private-task", url)
+        await WebhookWorker().deliver("private-task")
+
+    asyncio.run(receiver.run(scenario))
+
+    assert not receiver.requests
+    [delivery] = deliveries("private-task")
+    assert delivery.status == "failed" and "non-public" in delivery.last_error, delivery
+    print("✅ callbacks to loopback, private and link-local hosts are refused")
+
+def test_deliveries_need_token(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    assert client.get("/webhooks/deliveries").status_code == 403
+    monkeypatch.setattr(settings, "WEBHOOK_DELIVERIES_TOKEN", "secret-token")
+    assert client.get("/webhooks/deliveries", headers={"X-Webhooks-Token": "wrong"}).status_code == 403
+    response = client.get("/webhooks/deliveries", headers={"X-Webhooks-Token": "secret-token"})
+    assert response.status_code == 200 and response.json(), response.text
+    print("✅ /webhooks/deliveries requires its token")
+
+if __name__ == "__main__":
+    setup_database()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        local_receiver_settings(monkeypatch)
+        test_retries_503()
+        test_gives_up_on_4xx()
+        test_delivers_once()
+        test_redelivers_abandoned()
+        test_refuses_private_targets(monkeypatch)
+        test_deliveries_need_token(monkeypatch)
@@ -0,0 +1,81 @@
+"""
+Local webhook receiver for trying out completion callbacks.
+
+Run it, start the API with WEBHOOK_ALLOW_PRIVATE_TARGETS=true (the receiver
+is on localhost), then create a task pointing at it:
+
+    python app/test/webhook_receiver.py
+    curl -X POST localhost:8000/generate -H 'Content-Type: application/json' \
+        -d '{"prompt": "a lighthouse", "model": "...", "callback_url": "http://localhost:9000/webhook"}'
+
+Every delivery is printed with the result of the signature check. Set
+WEBHOOK_SECRET (or SECRET_KEY) to the value the API uses and
+RECEIVER_FAIL_FIRST=N to answer the first N deliveries with a 503, which
+exercises the API's retries.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from aiohttp import web
+
+SECRET = os.getenv("WEBHOOK_SECRET") or os.getenv("SECRET_KEY", "change-this-in-production-to-a-secure-random-string")
+PORT = int(os.getenv("RECEIVER_PORT", "9000"))
+FAIL_FIRST = int(os.getenv("RECEIVER_FAIL_FIRST", "0"))
+MAX_SKEW_SECONDS = 300
+
+received = []
+
+
+def verify_signature(body: bytes, timestamp: str, signature: str, secret: str = SECRET) -> bool:
+    if not timestamp or abs(time.time() - int(timestamp)) > MAX_SKEW_SECONDS:
+        return False
+    expected = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={expected}", signature or "")
+
+
+async def webhook(request: web.Request):
+    body = await request.read()
+    valid = verify_signature(
+        body,
+        request.headers.get("X-Webhook-Timestamp", ""),
+        request.headers.get("X-Webhook-Signature", "")
+    )
+    received.append(body)
+
+    print(f"\n📨 {request.headers.get('X-Webhook-Event')} delivery {request.headers.get('X-Webhook-Delivery')}")
+    print(f"Signature valid: {valid}")
+    print(json.dumps(json.loads(body), indent=2))
+
+    if len(received) <= FAIL_FIRST:
+        print("Answering 503 to test retries")
+        return web.Response(status=503)
+    return web.Response(status=200 if valid else 401)
+
+
+def test_signature_roundtrip():
+    body = b'{"event": "task.completed"}'
+    timestamp = str(int(time.time()))
+    digest = hmac.new(SECRET.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    assert verify_signature(body, timestamp, f"sha256={digest}")
+    assert not verify_signature(body + b" ", timestamp, f"sha256={digest}")
+    assert not verify_signature(body, str(int(time.time()) - 3600), f"sha256={digest}")
+    print("✅ test_signature_roundtrip")
+
+
+async def run_receiver():
+    app = web.Application()
+    app.router.add_post("/webhook", webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", PORT).start()
+    print(f"Listening on http://localhost:{PORT}/webhook")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    test_signature_roundtrip()
+    asyncio.run(run_receiver())